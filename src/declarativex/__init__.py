@@ -1,5 +1,11 @@
 from .auth import BasicAuth, BearerAuth, HeaderAuth, QueryParamsAuth
+from .backends import FileBackend, RedisBackend
+from .batch import BatchResult, batch
+from .cache import cache
+from .circuit_breaker import circuit_breaker, CircuitState
 from .client import BaseClient
+from .codecs import Codec, JsonCodec, OrjsonCodec, MsgspecCodec, CustomCodec
+from .deadline import deadline
 from .dependencies import (
     Path,
     JsonField,
@@ -22,10 +28,21 @@ from .exceptions import (
     TimeoutException,
     UnprocessableEntityException,
     RateLimitExceeded,
+    CircuitBreakerOpen,
+)
+from .hedging import Hedging
+from .http_cache import (
+    HttpCache,
+    CacheStorage,
+    MemoryStorage,
+    FileStorage,
+    SQLiteStorage,
 )
 from .methods import http, gql
 from .middlewares import Middleware
-from .rate_limiter import rate_limiter
-from .retry import retry
+from .rate_limiter import rate_limiter, RateLimiterBackend, MemoryBackend
+from .retry import retry, Jitter, RetryBudget
+from .single_flight import SingleFlight
+from .streaming import ServerSentEvent
 
 __version__ = "v1.0.0"
@@ -0,0 +1,315 @@
+import contextlib
+import hashlib
+import inspect
+import mmap
+import os
+import struct
+import threading
+from typing import Any, Iterator, Optional, Tuple
+
+from .exceptions import MisconfiguredException, RateLimitExceeded
+from .rate_limiter import Bucket, RateLimiterBackend
+
+try:  # pragma: no cover
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None  # type: ignore[assignment]
+
+# Slot of the bucket: hash of the key, tokens left in the bucket and
+# the time they were counted at
+_SLOT = struct.Struct("=Qdd")
+
+
+class _SharedFile:
+    """
+    Memory-mapped file of the bucket slots, opened lazily on the first
+    call. A new file is filled with zeros, all slots are free then.
+    """
+
+    def __init__(self, path: str, slots: int):
+        self._path = path
+        self._size = slots * _SLOT.size
+        self._file: Optional[Tuple[int, mmap.mmap]] = None
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def locked(self, offset: int) -> Iterator[mmap.mmap]:
+        """Lock the slot at the offset for the processes and threads."""
+        # fcntl locks are held by the process, the threads of the process
+        # are serialized by the lock of the file.
+        with self._lock:
+            if self._file is None:
+                fd = os.open(self._path, os.O_RDWR | os.O_CREAT, 0o600)
+                if os.fstat(fd).st_size < self._size:
+                    os.ftruncate(fd, self._size)
+                self._file = fd, mmap.mmap(fd, self._size)
+            fd, state = self._file
+            fcntl.lockf(fd, fcntl.LOCK_EX, _SLOT.size, offset)
+            try:
+                yield state
+            finally:
+                fcntl.lockf(fd, fcntl.LOCK_UN, _SLOT.size, offset)
+
+
+class FileBucket(Bucket):
+    """
+    Token bucket kept in a slot of the memory-mapped file. The processes
+    map the same file and update the slot under an exclusive fcntl lock,
+    so all of them share one quota. The time is taken from the monotonic
+    clock, which is shared by the processes of the machine.
+
+    The slot is chosen by the hash of the key. Keys hashed to the same
+    slot share its tokens, so the colliding keys are limited stricter,
+    never looser.
+    """
+
+    def __init__(
+        self,
+        file: _SharedFile,
+        slots: int,
+        key: str,
+        max_calls: int,
+        interval: float,
+    ):
+        super().__init__(max_calls, interval)
+        self._file = file
+        # Python's hash() differs between processes, blake2b doesn't
+        self._key_hash = int.from_bytes(
+            hashlib.blake2b(key.encode(), digest_size=8).digest(), "little"
+        )
+        self._offset = self._key_hash % slots * _SLOT.size
+
+    def refill(self):
+        with self._file.locked(self._offset) as state:
+            _SLOT.pack_into(
+                state, self._offset, self._key_hash, self.max_calls, 0.0
+            )
+
+    def reserve(
+        self, now: float, reject: bool, max_wait: Optional[float] = None
+    ) -> float:
+        with self._file.locked(self._offset) as state:
+            key_hash, token_bucket, last_time_token_added = _SLOT.unpack_from(
+                state, self._offset
+            )
+            if key_hash == 0:
+                # The slot of the new file is free, the bucket is full
+                token_bucket, last_time_token_added = self.max_calls, now
+            token_bucket, left_to_wait = self.take(
+                token_bucket, last_time_token_added, now, reject, max_wait
+            )
+            _SLOT.pack_into(
+                state, self._offset, self._key_hash, token_bucket, now
+            )
+            return left_to_wait
+
+
+class FileBackend(RateLimiterBackend):
+    """
+    Backend that shares the buckets between the processes of the machine,
+    e.g. the workers of gunicorn or celery, without a network service.
+    The buckets are kept in the file, rate limiters with the same file
+    share the same quota.
+
+    Parameters:
+        path: Path to the file of the buckets, it's created if missing.
+        slots: Number of the bucket slots in the file, the processes
+            must use the same number. Keys of the per-key rate limiters
+            are hashed to the slots.
+    """
+
+    def __init__(self, path: str, slots: int = 4096):
+        if fcntl is None:  # pragma: no cover
+            raise MisconfiguredException(
+                "FileBackend requires fcntl, it's not available on Windows"
+            )
+        if slots < 1:
+            raise MisconfiguredException("slots must be a positive number")
+        self._slots = slots
+        self._file = _SharedFile(path, slots)
+
+    def create_bucket(
+        self, max_calls: int, interval: float, key: str = ""
+    ) -> Bucket:
+        return FileBucket(self._file, self._slots, key, max_calls, interval)
+
+
+# Generic cell rate algorithm: the key keeps the theoretical arrival time
+# (TAT) of the next token, the bucket is full when it's in the past.
+# Up to the requested number of tokens available right now are granted,
+# if there are none, one token is reserved in advance and the caller
+# waits for it. The time of the server is used, it's shared by all the
+# clients. Wait times are returned as strings, Redis truncates numbers.
+GCRA_SCRIPT = """
+local emission_interval = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local requested = tonumber(ARGV[3])
+local max_wait = tonumber(ARGV[4])
+local time = redis.call("TIME")
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local tat = tonumber(redis.call("GET", KEYS[1]) or "0")
+if tat < now then
+    tat = now
+end
+local available = math.floor(
+    (now - tat) / emission_interval + burst + 1e-9
+)
+local granted = math.min(requested, available)
+local wait = 0
+if granted < 1 then
+    granted = 1
+    wait = tat - now - (burst - 1) * emission_interval
+    if max_wait >= 0 and wait >= max_wait then
+        return {0, tostring(wait)}
+    end
+end
+tat = tat + granted * emission_interval
+local ttl = math.ceil((tat - now) * 1000) + 1
+redis.call("SET", KEYS[1], tostring(tat), "PX", ttl)
+return {granted, tostring(wait)}
+"""
+
+
+class RedisBucket(Bucket):
+    """
+    Token bucket kept in Redis and updated atomically by the GCRA script,
+    so all the clients of the fleet share one quota.
+
+    With `batch` greater than one, up to `batch` tokens are taken from
+    Redis in one round trip and leased to the next calls of the process,
+    so most of the calls don't wait for the network. Leased tokens expire
+    after the time the fleet takes to earn them back, so the rate can't
+    be exceeded by more than one batch.
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        key: str,
+        max_calls: int,
+        interval: float,
+        batch: int = 1,
+    ):
+        super().__init__(max_calls, interval)
+        self._client = client
+        self._key = key
+        self._batch = batch
+        self._script = client.register_script(GCRA_SCRIPT)
+        self._leased = 0
+        self._lease_expires_at = 0.0
+
+    def _lease(self, now: float) -> bool:
+        """Take a leased token, False if there are none."""
+        with self._lock:
+            if self._leased and now < self._lease_expires_at:
+                self._leased -= 1
+                return True
+            return False
+
+    def _script_args(self, reject: bool, max_wait: Optional[float]) -> list:
+        if reject:
+            max_wait = 0.0
+        elif max_wait is None:
+            max_wait = -1.0
+        return [
+            1 / self.token_fill_rate if self.token_fill_rate else 0.0,
+            self.max_calls,
+            self._batch,
+            max_wait,
+        ]
+
+    def _grant(self, now: float, reply: Any) -> float:
+        """Lease the extra tokens of the reply and return the wait."""
+        granted, left_to_wait = int(reply[0]), float(reply[1])
+        if not granted:
+            raise RateLimitExceeded()
+        if granted > 1:
+            with self._lock:
+                self._leased += granted - 1
+                self._lease_expires_at = (
+                    now + (granted - 1) / self.token_fill_rate
+                )
+        return left_to_wait
+
+    def refill(self):
+        """Empty the lease and reset the bucket in Redis."""
+        with self._lock:
+            self._leased = 0
+        # The coroutine of the async client is returned to be awaited
+        return self._client.delete(self._key)
+
+    def reserve(
+        self, now: float, reject: bool, max_wait: Optional[float] = None
+    ) -> float:
+        if self._lease(now):
+            return 0.0
+        if self.max_calls < 1:
+            raise RateLimitExceeded()
+        reply = self._script(
+            keys=[self._key], args=self._script_args(reject, max_wait)
+        )
+        if inspect.iscoroutine(reply):
+            reply.close()
+            raise MisconfiguredException(
+                "Async Redis client can be used with async functions only"
+            )
+        return self._grant(now, reply)
+
+    async def areserve(
+        self, now: float, reject: bool, max_wait: Optional[float] = None
+    ) -> float:
+        if self._lease(now):
+            return 0.0
+        if self.max_calls < 1:
+            raise RateLimitExceeded()
+        reply = self._script(
+            keys=[self._key], args=self._script_args(reject, max_wait)
+        )
+        if inspect.isawaitable(reply):
+            reply = await reply
+        return self._grant(now, reply)
+
+
+class RedisBackend(RateLimiterBackend):
+    """
+    Backend that shares the bucket between the clients of the fleet.
+    It works with any client implementing `register_script` and `delete`
+    of redis-py, e.g. `redis.Redis`, `redis.asyncio.Redis` or a fake
+    client in tests. The async client keeps the event loop free while
+    the token is reserved, but it can't be used by sync functions.
+
+    Parameters:
+        client: The Redis client.
+        key: Key of the bucket, rate limiters with the same key share
+            the same quota. Keys of the per-key rate limiters are
+            appended to it.
+        batch: Number of tokens taken from Redis in one round trip
+            and leased to the next calls of the process.
+    """
+
+    def __init__(self, client: Any, key: str, batch: int = 1):
+        if batch < 1:
+            raise MisconfiguredException("batch must be a positive number")
+        self._client = client
+        self._key = key
+        self._batch = batch
+
+    def create_bucket(
+        self, max_calls: int, interval: float, key: str = ""
+    ) -> Bucket:
+        return RedisBucket(
+            self._client,
+            f"{self._key}:{key}" if key else self._key,
+            max_calls,
+            interval,
+            batch=self._batch,
+        )
+
+
+__all__ = [
+    "FileBackend",
+    "FileBucket",
+    "GCRA_SCRIPT",
+    "RedisBackend",
+    "RedisBucket",
+]
@@ -0,0 +1,276 @@
+import asyncio
+import concurrent.futures
+import contextvars
+import dataclasses
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Generic,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+    overload,
+)
+
+from .exceptions import MisconfiguredException
+from .utils import ReturnType
+
+DEFAULT_CONCURRENCY = 64
+
+
+@dataclasses.dataclass
+class BatchResult(Generic[ReturnType]):
+    """
+    Result of a single call of the batch.
+
+    Parameters:
+        index: Position of the item in the batch.
+        item: The arguments of the call.
+        result: The value returned by the call, if it succeeded.
+        error: The exception raised by the call, if it failed.
+    """
+
+    index: int
+    item: Any
+    result: Optional[ReturnType] = None
+    error: Optional[BaseException] = None
+
+    @property
+    def ok(self) -> bool:
+        """Whether the call succeeded."""
+        return self.error is None
+
+
+def _arguments(item: Any) -> Tuple[tuple, Dict[str, Any]]:
+    """
+    Get the call arguments of the item: mappings are keyword arguments,
+    tuples are positional arguments, anything else is a single
+    positional argument.
+    """
+    if isinstance(item, dict):
+        return (), item
+    if isinstance(item, tuple):
+        return item, {}
+    return (item,), {}
+
+
+class _Ordering:
+    """
+    Reorders the results completed out of order, so they are yielded
+    in the order of the items. Items are started only within the window
+    past the oldest result not yielded yet, so a slow call at the head
+    doesn't make the completed results pile up.
+    """
+
+    def __init__(self, ordered: bool, window: int):
+        self._ordered = ordered
+        self._window = window
+        self._completed: Dict[int, BatchResult] = {}
+        self._next_index = 0
+
+    def admits(self, index: int) -> bool:
+        """Whether the item at the index can be started."""
+        return not self._ordered or index < self._next_index + self._window
+
+    def push(self, result: BatchResult) -> List[BatchResult]:
+        """Add the completed result, return the results ready to yield."""
+        if not self._ordered:
+            return [result]
+        self._completed[result.index] = result
+        ready = []
+        while self._next_index in self._completed:
+            ready.append(self._completed.pop(self._next_index))
+            self._next_index += 1
+        return ready
+
+
+class _Items:
+    """
+    Items of the batch, consumed lazily. Only the items the ordering
+    admits are taken, the first one it doesn't is held back.
+    """
+
+    def __init__(self, items: Iterable[Any], ordering: _Ordering):
+        self._items = enumerate(items)
+        self._ordering = ordering
+        self._held: Optional[Tuple[int, Any]] = None
+
+    def take(self, count: int) -> List[Tuple[int, Any]]:
+        taken: List[Tuple[int, Any]] = []
+        while len(taken) < count:
+            if self._held is None:
+                self._held = next(self._items, None)
+                if self._held is None:
+                    break
+            if not self._ordering.admits(self._held[0]):
+                break
+            taken.append(self._held)
+            self._held = None
+        return taken
+
+
+async def _abatch(
+    func: Callable[..., Awaitable[ReturnType]],
+    items: Iterable[Any],
+    concurrency: int,
+    ordered: bool,
+) -> AsyncIterator[BatchResult[ReturnType]]:
+    async def call(index: int, item: Any) -> BatchResult[ReturnType]:
+        args, kwargs = _arguments(item)
+        try:
+            result = await func(*args, **kwargs)
+        except Exception as e:  # pylint: disable=broad-except
+            return BatchResult(index=index, item=item, error=e)
+        return BatchResult(index=index, item=item, result=result)
+
+    def start() -> None:
+        for index, item in items_.take(concurrency - len(pending)):
+            pending[asyncio.ensure_future(call(index, item))] = index, item
+
+    def complete(task: asyncio.Task) -> BatchResult[ReturnType]:
+        index, item = pending.pop(task)
+        if task.cancelled():
+            # The call was cancelled from the inside, e.g. by wait_for
+            # of the function, it fails alone like the other calls
+            return BatchResult(
+                index=index, item=item, error=asyncio.CancelledError()
+            )
+        return task.result()
+
+    ordering = _Ordering(ordered, window=concurrency)
+    # Items are consumed lazily, only the calls in flight are kept
+    items_ = _Items(items, ordering)
+    pending: Dict[asyncio.Task, Tuple[int, Any]] = {}
+    start()
+    try:
+        while pending:
+            done, _ = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            results = sorted(
+                (complete(task) for task in done), key=lambda r: r.index
+            )
+            ready = [r for result in results for r in ordering.push(result)]
+            start()
+            for result in ready:
+                yield result
+    finally:
+        # The consumer stopped early, the calls in flight are cancelled
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.wait(pending)
+
+
+def _sync_batch(
+    func: Callable[..., ReturnType],
+    items: Iterable[Any],
+    concurrency: int,
+    ordered: bool,
+) -> Iterator[BatchResult[ReturnType]]:
+    def call(index: int, item: Any) -> BatchResult[ReturnType]:
+        args, kwargs = _arguments(item)
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:  # pylint: disable=broad-except
+            return BatchResult(index=index, item=item, error=e)
+        return BatchResult(index=index, item=item, result=result)
+
+    def submit() -> None:
+        for index, item in items_.take(concurrency - len(pending)):
+            # Threads don't inherit the context, it is copied for every
+            # call, so the calls share the deadline of the caller.
+            pending.add(
+                executor.submit(context.copy().run, call, index, item)
+            )
+
+    context = contextvars.copy_context()
+    executor = concurrent.futures.ThreadPoolExecutor(
+        max_workers=concurrency, thread_name_prefix="declarativex-batch"
+    )
+    ordering = _Ordering(ordered, window=concurrency)
+    items_ = _Items(items, ordering)
+    pending: Set[concurrent.futures.Future] = set()
+    submit()
+    try:
+        while pending:
+            done, pending = concurrent.futures.wait(
+                pending, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            results = sorted(
+                (future.result() for future in done), key=lambda r: r.index
+            )
+            ready = [r for result in results for r in ordering.push(result)]
+            submit()
+            yield from ready
+    finally:
+        # Calls that are not started yet are cancelled
+        # when the consumer stops early.
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+@overload
+def batch(  # type: ignore[overload-overlap]
+    func: Callable[..., Awaitable[ReturnType]],
+    items: Iterable[Any],
+    *,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    ordered: bool = True,
+) -> AsyncIterator[BatchResult[ReturnType]]:
+    ...  # pragma: no cover
+
+
+@overload
+def batch(
+    func: Callable[..., ReturnType],
+    items: Iterable[Any],
+    *,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    ordered: bool = True,
+) -> Iterator[BatchResult[ReturnType]]:
+    ...  # pragma: no cover
+
+
+def batch(
+    func: Callable[..., Any],
+    items: Iterable[Any],
+    *,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    ordered: bool = True,
+) -> Union[Iterator[BatchResult], AsyncIterator[BatchResult]]:
+    """
+    Call the declared function for every item of the batch, running at most
+    `concurrency` calls at the same time. Calls of the same client share
+    its connection pool.
+
+    Results are yielded as they are ready, in the order of the items or in
+    the order of completion if `ordered` is False. Errors of the calls are
+    collected in the results, they don't stop the batch.
+
+    Async functions return an async iterator, the calls run as tasks of the
+    running event loop. Sync functions return an iterator, the calls run in
+    a pool of `concurrency` threads.
+
+    Parameters:
+        func: The declared function, bound to the client if it's a method.
+        items: Arguments of the calls. Dictionaries are passed as keyword
+            arguments, tuples as positional arguments, anything else as
+            a single positional argument.
+        concurrency: Maximum number of calls in flight.
+        ordered: Whether to yield the results in the order of the items.
+    """
+    if concurrency < 1:
+        raise MisconfiguredException("concurrency must be a positive number")
+    if asyncio.iscoroutinefunction(func):
+        return _abatch(func, items, concurrency, ordered)
+    return _sync_batch(func, items, concurrency, ordered)
+
+
+__all__ = ["BatchResult", "batch"]
@@ -0,0 +1,420 @@
+import asyncio
+import contextvars
+import dataclasses
+import inspect
+import json
+import math
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
+
+from .exceptions import (
+    HTTPException,
+    MisconfiguredException,
+    TimeoutException,
+)
+from .utils import ReturnType, SupportDecorator
+
+
+def _normalize(value: Any) -> Any:
+    """Make the argument JSON-serializable for the key."""
+    if hasattr(value, "model_dump"):
+        return value.model_dump()
+    if hasattr(value, "dict") and callable(value.dict):
+        return value.dict()
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return dataclasses.asdict(value)
+    if isinstance(value, (set, frozenset)):
+        return sorted(value, key=repr)
+    return repr(value)
+
+
+@dataclasses.dataclass
+class _Entry:
+    """
+    Cached value. It's fresh until `fresh_until`, then it's stale and can
+    be served in the grace windows until `expires_at`.
+    """
+
+    value: Any
+    fresh_until: float = math.inf
+    expires_at: float = math.inf
+
+
+class _Entries:
+    """
+    Cached values in the order of the last use. The least recently used
+    values are evicted above `maxsize`, expired values are dropped when
+    they are looked up.
+    """
+
+    def __init__(self, maxsize: int):
+        self._maxsize = maxsize
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str, now: float) -> Optional[_Entry]:
+        """Get the entry of the key, None if it's missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires_at <= now:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key: str, entry: _Entry) -> None:
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(
+        self, key: Optional[str] = None, prefix: Optional[str] = None
+    ) -> int:
+        """Delete the key or all keys with the prefix, returns the count."""
+        with self._lock:
+            if key is not None:
+                keys = [key] if key in self._entries else []
+            else:
+                keys = [
+                    k for k in self._entries if k.startswith(prefix or "")
+                ]
+            for k in keys:
+                del self._entries[k]
+            return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class cache(SupportDecorator):
+    """
+    Cache the return values of the calls in memory, for the servers that
+    send no cache headers but whose data is known to be stable.
+
+    Values are cached by the endpoint name and the bound arguments of the
+    call, e.g. `get_user:{"user_id": 1}`. The validated return value is
+    kept and returned as is, so don't modify it. Exceptions are not cached.
+    Every instance of the client class keeps its own values, so clients
+    with different base URLs or credentials never share them.
+
+    Stale values can be served in two grace windows after the TTL, like
+    the Cache-Control extensions of RFC 5861:
+
+    - stale-while-revalidate: the stale value is returned at once and the
+      value is refreshed in the background, on the event loop for async
+      endpoints and in a worker thread for sync ones. Only one refresh
+      of the key runs at a time.
+    - stale-if-error: the stale value is returned if the call fails with
+      HTTPException or TimeoutException.
+
+    Parameters:
+        ttl: Seconds the value is fresh for, forever by default.
+        maxsize: Maximum number of cached values of the client instance,
+            the least recently used are evicted.
+        key: Function of the bound arguments of the call that gives
+            the key, it's prefixed with the endpoint name.
+        stale_while_revalidate: Seconds after the TTL the stale value is
+            returned while it's refreshed in the background.
+        stale_if_error: Seconds after the TTL the stale value is returned
+            if the call fails.
+    """
+
+    STALE_IF_ERROR_EXCEPTIONS = (HTTPException, TimeoutException)
+
+    def __init__(
+        self,
+        ttl: Optional[float] = None,
+        maxsize: int = 1024,
+        key: Optional[Callable[[Dict[str, Any]], str]] = None,
+        stale_while_revalidate: float = 0.0,
+        stale_if_error: float = 0.0,
+    ):
+        if ttl is not None and ttl <= 0:
+            raise MisconfiguredException("ttl must be a positive number")
+        if maxsize < 1:
+            raise MisconfiguredException("maxsize must be a positive number")
+        if stale_while_revalidate < 0 or stale_if_error < 0:
+            raise MisconfiguredException(
+                "stale_while_revalidate and stale_if_error must be "
+                "non-negative numbers"
+            )
+        if ttl is None and (stale_while_revalidate or stale_if_error):
+            # Values without TTL never get stale
+            raise MisconfiguredException(
+                "stale_while_revalidate and stale_if_error require ttl"
+            )
+        self._ttl = ttl
+        self._key = key
+        self._stale_while_revalidate = stale_while_revalidate
+        self._stale_if_error = stale_if_error
+        self._maxsize = maxsize
+        # Values of the declared functions, and of every client instance
+        self._entries = _Entries(maxsize)
+        self._instances: weakref.WeakKeyDictionary[Any, _Entries] = (
+            weakref.WeakKeyDictionary()
+        )
+        self._signatures: Dict[Callable, inspect.Signature] = {}
+        self._refreshing: Set[Tuple[int, str]] = set()
+        self._tasks: Set[asyncio.Future] = set()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return sum(len(entries) for entries in self._all_entries())
+
+    def _all_entries(self) -> List[_Entries]:
+        with self._lock:
+            return [self._entries, *self._instances.values()]
+
+    def _entries_of(self, instance: Any) -> _Entries:
+        """Get the values of the client instance, created if missing."""
+        if instance is None:
+            return self._entries
+        with self._lock:
+            entries = self._instances.get(instance)
+            if entries is None:
+                entries = self._instances[instance] = _Entries(self._maxsize)
+            return entries
+
+    def _bind(
+        self, func: Callable, *args, **kwargs
+    ) -> Tuple[Any, Dict[str, Any]]:
+        """Bind the arguments, returns the client instance and the rest."""
+        signature = self._signatures.get(func)
+        if signature is None:
+            signature = self._signatures[func] = inspect.signature(func)
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        arguments = dict(bound.arguments)
+        instance = arguments.pop("self", None)
+        instance = arguments.pop("cls", instance)
+        return instance, arguments
+
+    def _lookup(self, func: Callable, *args, **kwargs) -> Tuple[_Entries, str]:
+        instance, arguments = self._bind(func, *args, **kwargs)
+        return self._entries_of(instance), self._format_key(func, arguments)
+
+    def make_key(self, func: Callable, *args, **kwargs) -> str:
+        """Get the key of the call from the bound arguments."""
+        _, arguments = self._bind(func, *args, **kwargs)
+        return self._format_key(func, arguments)
+
+    def _format_key(self, func: Callable, arguments: Dict[str, Any]) -> str:
+        # The qualified name tells apart the functions of the same name
+        # of different clients and modules
+        name = f"{func.__module__}.{func.__qualname__}"
+        if self._key is not None:
+            return f"{name}:{self._key(arguments)}"
+        return f"{name}:" + json.dumps(
+            arguments, sort_keys=True, default=_normalize
+        )
+
+    def _store(self, entries: _Entries, key: str, value: Any) -> None:
+        if self._ttl is None:
+            entries.set(key, _Entry(value))
+            return
+        fresh_until = time.monotonic() + self._ttl
+        grace = max(self._stale_while_revalidate, self._stale_if_error)
+        entries.set(key, _Entry(value, fresh_until, fresh_until + grace))
+
+    def _claim_refresh(
+        self, entries: _Entries, key: str, entry: _Entry, now: float
+    ) -> Optional[bool]:
+        """
+        Claim the refresh of the stale value. None if it's past the
+        stale-while-revalidate window, False if the refresh of the key
+        is already scheduled, True if the caller must schedule it.
+        """
+        if now >= entry.fresh_until + self._stale_while_revalidate:
+            return None
+        with self._lock:
+            if (id(entries), key) in self._refreshing:
+                return False
+            self._refreshing.add((id(entries), key))
+            return True
+
+    def _is_stale_if_error(self, entry: Optional[_Entry]) -> bool:
+        return entry is not None and (
+            time.monotonic() < entry.fresh_until + self._stale_if_error
+        )
+
+    def _refreshed(self, entries: _Entries, key: str) -> None:
+        with self._lock:
+            self._refreshing.discard((id(entries), key))
+
+    async def _refresh_async(
+        self,
+        entries: _Entries,
+        key: str,
+        func: Callable[..., Awaitable[Any]],
+        *args,
+        **kwargs,
+    ) -> None:
+        try:
+            self._store(entries, key, await func(*args, **kwargs))
+        except Exception:  # pylint: disable=broad-except
+            # The stale value is served until the next refresh
+            pass
+        finally:
+            self._refreshed(entries, key)
+
+    def _refresh_sync(
+        self,
+        entries: _Entries,
+        key: str,
+        func: Callable[..., Any],
+        *args,
+        **kwargs,
+    ) -> None:
+        try:
+            self._store(entries, key, func(*args, **kwargs))
+        except Exception:  # pylint: disable=broad-except
+            # The stale value is served until the next refresh
+            pass
+        finally:
+            self._refreshed(entries, key)
+
+    def _schedule_async(
+        self,
+        entries: _Entries,
+        key: str,
+        func: Callable[..., Awaitable[Any]],
+        *args,
+        **kwargs,
+    ) -> None:
+        # The refresh runs in an empty context, so it doesn't inherit the
+        # deadline of the call that scheduled it
+        task = contextvars.Context().run(
+            asyncio.ensure_future,
+            self._refresh_async(entries, key, func, *args, **kwargs),
+        )
+        # The loop keeps weak references to the tasks only
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _schedule_sync(
+        self,
+        entries: _Entries,
+        key: str,
+        func: Callable[..., Any],
+        *args,
+        **kwargs,
+    ) -> None:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    thread_name_prefix="declarativex-cache"
+                )
+            executor = self._executor
+        executor.submit(
+            contextvars.Context().run,
+            self._refresh_sync,
+            entries,
+            key,
+            func,
+            *args,
+            **kwargs,
+        )
+
+    async def _decorate_async(
+        self, func: Callable[..., Awaitable[ReturnType]], *args, **kwargs
+    ) -> ReturnType:
+        entries, key = self._lookup(func, *args, **kwargs)
+        now = time.monotonic()
+        entry = entries.get(key, now)
+        if entry is not None:
+            if now < entry.fresh_until:
+                return entry.value
+            refresh = self._claim_refresh(entries, key, entry, now)
+            if refresh is not None:
+                if refresh:
+                    self._schedule_async(
+                        entries, key, func, *args, **kwargs
+                    )
+                return entry.value
+        try:
+            value = await func(*args, **kwargs)
+        except self.STALE_IF_ERROR_EXCEPTIONS:
+            if self._is_stale_if_error(entry):
+                return entry.value  # type: ignore[union-attr]
+            raise
+        self._store(entries, key, value)
+        return value
+
+    def _decorate_sync(
+        self, func: Callable[..., ReturnType], *args, **kwargs
+    ) -> ReturnType:
+        entries, key = self._lookup(func, *args, **kwargs)
+        now = time.monotonic()
+        entry = entries.get(key, now)
+        if entry is not None:
+            if now < entry.fresh_until:
+                return entry.value
+            refresh = self._claim_refresh(entries, key, entry, now)
+            if refresh is not None:
+                if refresh:
+                    self._schedule_sync(
+                        entries, key, func, *args, **kwargs
+                    )
+                return entry.value
+        try:
+            value = func(*args, **kwargs)
+        except self.STALE_IF_ERROR_EXCEPTIONS:
+            if self._is_stale_if_error(entry):
+                return entry.value  # type: ignore[union-attr]
+            raise
+        self._store(entries, key, value)
+        return value
+
+    def invalidate(
+        self, key: Optional[str] = None, prefix: Optional[str] = None
+    ) -> int:
+        """
+        Invalidate the cached value of the key, or the values of all keys
+        starting with the prefix, e.g. the endpoint name. Everything is
+        invalidated if neither is given. The values of all client
+        instances are invalidated. Returns the number of the invalidated
+        values.
+        """
+        count = 0
+        for entries in self._all_entries():
+            if key is None and prefix is None:
+                count += len(entries)
+                entries.clear()
+            else:
+                count += entries.delete(key=key, prefix=prefix)
+        return count
+
+    def _decorate_class(self, cls: type) -> type:
+        cls = super()._decorate_class(cls)
+        setattr(cls, "invalidate", self.invalidate)
+        return cls
+
+    def __call__(
+        self, func_or_class: Union[Callable[..., ReturnType], type]
+    ) -> Union[Callable[..., ReturnType], type]:
+        inner = super().__call__(func_or_class)
+        setattr(inner, "invalidate", self.invalidate)
+        return inner
@@ -0,0 +1,244 @@
+import collections
+import enum
+import threading
+import time
+from typing import Callable, Deque, Optional, Tuple
+
+from .exceptions import CircuitBreakerOpen, MisconfiguredException
+from .utils import SupportDecorator
+
+
+class CircuitState(str, enum.Enum):
+    """
+    States of the circuit breaker.
+
+    - CLOSED: calls pass through, their outcomes are recorded.
+    - OPEN: calls fail fast with CircuitBreakerOpen.
+    - HALF_OPEN: a few trial calls pass through to probe the server.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class _Window:
+    """
+    Rolling window of the outcomes of the last calls. Failed and slow
+    calls are counted on the fly, so the rates are computed in O(1).
+    """
+
+    def __init__(self, size: int):
+        self._outcomes: Deque[Tuple[bool, bool]] = collections.deque(
+            maxlen=size
+        )
+        self.failures = 0
+        self.slow_calls = 0
+
+    @property
+    def calls(self) -> int:
+        return len(self._outcomes)
+
+    def record(self, failed: bool, slow: bool) -> None:
+        if len(self._outcomes) == self._outcomes.maxlen:
+            old_failed, old_slow = self._outcomes[0]
+            self.failures -= old_failed
+            self.slow_calls -= old_slow
+        self._outcomes.append((failed, slow))
+        self.failures += failed
+        self.slow_calls += slow
+
+    def clear(self) -> None:
+        self._outcomes.clear()
+        self.failures = self.slow_calls = 0
+
+
+class circuit_breaker(SupportDecorator):
+    """
+    Circuit breaker of the calls. When too many of the recent calls fail
+    or are slow, the circuit opens and the calls fail fast with
+    CircuitBreakerOpen, instead of waiting for a dead server. After
+    `open_duration` a few trial calls are let through: if they succeed,
+    the circuit closes, otherwise it opens again.
+
+    When applied to a class, the circuit is shared by all its endpoints.
+
+    Parameters:
+        exceptions: Exceptions counted as failures. Other exceptions
+            are counted as successful calls.
+        failure_rate_threshold: Share of failed calls that opens the circuit.
+        slow_call_duration: Duration in seconds from which the call is slow.
+            Slow calls are not tracked if not set.
+        slow_call_rate_threshold: Share of slow calls that opens the circuit.
+        window_size: Number of the last calls the rates are computed from.
+        minimum_calls: Minimum number of calls in the window before the
+            rates are checked.
+        open_duration: Seconds the circuit stays open.
+        half_open_calls: Number of trial calls in the half-open state.
+    """
+
+    def __init__(
+        self,
+        exceptions: tuple,
+        failure_rate_threshold: float = 0.5,
+        slow_call_duration: Optional[float] = None,
+        slow_call_rate_threshold: float = 1.0,
+        window_size: int = 100,
+        minimum_calls: int = 10,
+        open_duration: float = 30.0,
+        half_open_calls: int = 5,
+    ):
+        if not 0 < failure_rate_threshold <= 1:
+            raise MisconfiguredException(
+                "failure_rate_threshold must be in (0, 1]"
+            )
+        if not 0 < slow_call_rate_threshold <= 1:
+            raise MisconfiguredException(
+                "slow_call_rate_threshold must be in (0, 1]"
+            )
+        if window_size < 1 or minimum_calls < 1 or half_open_calls < 1:
+            raise MisconfiguredException(
+                "window_size, minimum_calls and half_open_calls "
+                "must be positive numbers"
+            )
+        self._exceptions = exceptions
+        self._failure_rate_threshold = failure_rate_threshold
+        self._slow_call_duration = slow_call_duration
+        self._slow_call_rate_threshold = slow_call_rate_threshold
+        self._minimum_calls = min(minimum_calls, window_size)
+        self._open_duration = open_duration
+        self._half_open_calls = half_open_calls
+
+        self._lock = threading.Lock()
+        self._window = _Window(window_size)
+        self._state = CircuitState.CLOSED
+        self._opened_at = 0.0
+        self._half_open_permits = 0
+        # Changed on every transition, so permits of the calls started in
+        # another state are not returned
+        self._generation = 0
+
+    @property
+    def state(self) -> CircuitState:
+        """The current state of the circuit."""
+        with self._lock:
+            if (
+                self._state is CircuitState.OPEN
+                and time.monotonic() - self._opened_at >= self._open_duration
+            ):
+                return CircuitState.HALF_OPEN
+            return self._state
+
+    def reset(self) -> None:
+        """Close the circuit and forget the recorded calls."""
+        with self._lock:
+            self._transition(CircuitState.CLOSED)
+
+    def _transition(self, state: CircuitState) -> None:
+        self._state = state
+        self._window.clear()
+        self._half_open_permits = 0
+        self._generation += 1
+        if state is CircuitState.OPEN:
+            self._opened_at = time.monotonic()
+
+    def _thresholds_exceeded(self) -> bool:
+        calls = self._window.calls
+        return (
+            self._window.failures >= self._failure_rate_threshold * calls
+            or self._window.slow_calls
+            >= self._slow_call_rate_threshold * calls
+        )
+
+    def _acquire(self) -> int:
+        """
+        Let the call through or raise CircuitBreakerOpen. Returns the
+        generation of the state the call is started in.
+        """
+        with self._lock:
+            if self._state is CircuitState.OPEN:
+                if time.monotonic() - self._opened_at < self._open_duration:
+                    raise CircuitBreakerOpen()
+                self._transition(CircuitState.HALF_OPEN)
+            if self._state is CircuitState.HALF_OPEN:
+                if self._half_open_permits >= self._half_open_calls:
+                    # Enough trial calls are in flight already
+                    raise CircuitBreakerOpen()
+                self._half_open_permits += 1
+            return self._generation
+
+    def _release(self, generation: int) -> None:
+        """
+        Return the trial permit of the call that was cancelled, without
+        recording an outcome.
+        """
+        with self._lock:
+            if (
+                self._state is CircuitState.HALF_OPEN
+                and self._generation == generation
+                and self._half_open_permits > 0
+            ):
+                self._half_open_permits -= 1
+
+    def _record(self, failed: bool, started: float) -> None:
+        """Record the outcome of the call and update the state."""
+        slow = (
+            self._slow_call_duration is not None
+            and time.monotonic() - started >= self._slow_call_duration
+        )
+        with self._lock:
+            if self._state is CircuitState.OPEN:
+                # The call started before the circuit opened
+                return
+            self._window.record(failed, slow)
+            if self._state is CircuitState.HALF_OPEN:
+                if self._window.calls >= self._half_open_calls:
+                    self._transition(
+                        CircuitState.OPEN
+                        if self._thresholds_exceeded()
+                        else CircuitState.CLOSED
+                    )
+            elif (
+                self._window.calls >= self._minimum_calls
+                and self._thresholds_exceeded()
+            ):
+                self._transition(CircuitState.OPEN)
+
+    async def _decorate_async(self, func: Callable, *args, **kwargs):
+        generation = self._acquire()
+        started = time.monotonic()
+        try:
+            result = await func(*args, **kwargs)
+        except self._exceptions:
+            self._record(True, started)
+            raise
+        except Exception:
+            self._record(False, started)
+            raise
+        except BaseException:
+            # Cancelled calls have no outcome, the permit is returned
+            self._release(generation)
+            raise
+        self._record(False, started)
+        return result
+
+    def _decorate_sync(self, func: Callable, *args, **kwargs):
+        generation = self._acquire()
+        started = time.monotonic()
+        try:
+            result = func(*args, **kwargs)
+        except self._exceptions:
+            self._record(True, started)
+            raise
+        except Exception:
+            self._record(False, started)
+            raise
+        except BaseException:
+            # Cancelled calls have no outcome, the permit is returned
+            self._release(generation)
+            raise
+        self._record(False, started)
+        return result
+
+
+__all__ = ["CircuitState", "circuit_breaker"]
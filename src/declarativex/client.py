@@ -1,11 +1,29 @@
-from typing import Dict, Optional, Sequence, Type, Union
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    Optional,
+    Sequence,
+    Type,
+    Union,
+)
 
 import httpx
 
 from .auth import Auth
+from .codecs import Codec
 from .exceptions import MisconfiguredException
+from .http_cache import HttpCache
 from .middlewares import Middleware
-from .utils import ProxiesType
+from .pool import ClientPool
+from .single_flight import SingleFlight
+from .utils import ProxiesType, ReturnType
 
 
 class BaseClient:
@@ -19,6 +37,14 @@ class BaseClient:
         middlewares: List of middlewares for the client.
         error_mappings: Mapping of status codes to exceptions.
         proxies: Proxy configuration for the client.
+        limits: Connection pool limits for the client.
+        codec: JSON codec for request and response bodies.
+        cache: HTTP cache of the responses of the client.
+        single_flight: Coalescing of the identical requests in flight.
+        max_workers: Maximum number of threads used by `map`.
+
+    Connections are pooled and kept alive between calls. Use the client
+    as a context manager or call `close()`/`aclose()` to release them.
     """
 
     base_url: str = ""
@@ -28,6 +54,11 @@ class BaseClient:
     middlewares: Sequence[Middleware] = []
     error_mappings: Dict[int, Type] = {}
     proxies: ProxiesType = None
+    limits: Optional[httpx.Limits] = None
+    codec: Optional[Codec] = None
+    cache: Optional[HttpCache] = None
+    single_flight: Optional[SingleFlight] = None
+    max_workers: Optional[int] = None
 
     def __init__(
         self,
@@ -38,6 +69,11 @@ class BaseClient:
         middlewares: Optional[Sequence[Middleware]] = None,
         error_mappings: Optional[Dict[int, Type]] = None,
         proxies: ProxiesType = None,
+        limits: Optional[httpx.Limits] = None,
+        codec: Optional[Codec] = None,
+        cache: Optional[HttpCache] = None,
+        single_flight: Optional[SingleFlight] = None,
+        max_workers: Optional[int] = None,
     ) -> None:
         self.base_url = base_url or self.base_url
         if not self.base_url:
@@ -50,6 +86,94 @@ class BaseClient:
         self.middlewares = middlewares or self.middlewares
         self.error_mappings = error_mappings or self.error_mappings
         self.proxies = proxies or self.proxies
+        self.limits = limits or self.limits
+        self.codec = codec or self.codec
+        self.cache = cache or self.cache
+        self.single_flight = single_flight or self.single_flight
+        self.max_workers = max_workers or self.max_workers
+        self._pool = ClientPool()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """Get the thread pool of the client, it is created on first use."""
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_workers,
+                        thread_name_prefix=f"{self.__class__.__name__}-map",
+                    )
+        return self._executor
+
+    def map(
+        self,
+        func: Callable[..., ReturnType],
+        *iterables: Iterable[Any],
+        timeout: Optional[float] = None,
+    ) -> Iterator[ReturnType]:
+        """
+        Call the sync declared function with the arguments taken from the
+        iterables, like the builtin `map`, in the thread pool of the client.
+        The calls share the pooled connections of the client and go through
+        the decorators of the function, like retry and rate_limiter.
+
+        Results are returned in the order of the arguments. If a call fails,
+        its exception is raised when its result is retrieved.
+
+        Parameters:
+            func: The sync declared function, bound to this client.
+            iterables: Positional arguments of the calls.
+            timeout: Maximum number of seconds to wait for the results.
+        """
+        if asyncio.iscoroutinefunction(func):
+            raise MisconfiguredException(
+                "map supports only sync functions, use batch instead"
+            )
+        context = contextvars.copy_context()
+
+        def call(*args: Any) -> ReturnType:
+            # Threads don't inherit the context, it is copied for every
+            # call, so the calls share the deadline of the caller.
+            return context.copy().run(func, *args)
+
+        return self._get_executor().map(call, *iterables, timeout=timeout)
+
+    def _pop_executor(self) -> Optional[ThreadPoolExecutor]:
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        return executor
+
+    def close(self) -> None:
+        """
+        Close the pooled connections and the thread pool of the client.
+        """
+        executor = self._pop_executor()
+        if executor is not None:
+            executor.shutdown(wait=True)
+        self._pool.close()
+
+    async def aclose(self) -> None:
+        """
+        Close the pooled connections and the thread pool of the client.
+        The calls of `map` in flight are waited for in a worker thread.
+        """
+        executor = self._pop_executor()
+        if executor is not None:
+            await asyncio.to_thread(executor.shutdown, wait=True)
+        await self._pool.aclose()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        await self.aclose()
 
 
 __all__ = ["BaseClient"]
@@ -0,0 +1,141 @@
+import abc
+import json
+from typing import Any, Callable, Union
+
+# Check if orjson and msgspec are installed to enable fast codecs
+try:  # pragma: no cover
+    import orjson  # type: ignore[import]
+except ImportError:  # pragma: no cover
+    orjson = None  # type: ignore[assignment]
+
+try:  # pragma: no cover
+    import msgspec  # type: ignore[import]
+except ImportError:  # pragma: no cover
+    msgspec = None
+
+
+class Codec(abc.ABC):
+    """
+    Base class for JSON codecs. Codecs are used to encode request bodies
+    and decode response bodies. They work with bytes directly, so the
+    body doesn't have to be decoded to str first.
+
+    `decode` must raise ValueError when the data is not valid JSON.
+    Codecs that parse JSON exactly like pydantic does set
+    `standard_json`, it allows pydantic to validate response bytes
+    directly, skipping the codec. Other codecs always decode the body.
+    """
+
+    content_type = "application/json"
+    standard_json = False
+
+    @abc.abstractmethod
+    def encode(self, obj: Any) -> bytes:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def decode(self, data: Union[bytes, str]) -> Any:
+        raise NotImplementedError
+
+    def __repr__(self):  # pragma: no cover
+        return f"{self.__class__.__name__}()"
+
+
+class JsonCodec(Codec):
+    """Codec based on the json module of the standard library."""
+
+    standard_json = True
+
+    def encode(self, obj: Any) -> bytes:
+        # Same options as httpx uses to encode the json body
+        return json.dumps(
+            obj, ensure_ascii=False, separators=(",", ":"), allow_nan=False
+        ).encode("utf-8")
+
+    def decode(self, data: Union[bytes, str]) -> Any:
+        return json.loads(data)
+
+
+class OrjsonCodec(Codec):
+    """Codec based on orjson. Requires `pip install orjson`."""
+
+    def __init__(self, option: int = 0):
+        if orjson is None:  # pragma: no cover
+            raise ImportError(
+                "Please install orjson using 'pip install orjson' "
+                "to use OrjsonCodec"
+            )
+        self._option = option
+
+    def encode(self, obj: Any) -> bytes:
+        # pylint can't see the members of the compiled module
+        return orjson.dumps(  # pylint: disable=no-member
+            obj, option=self._option
+        )
+
+    def decode(self, data: Union[bytes, str]) -> Any:
+        # orjson.JSONDecodeError is a subclass of json.JSONDecodeError
+        return orjson.loads(data)  # pylint: disable=no-member
+
+
+class MsgspecCodec(Codec):
+    """Codec based on msgspec. Requires `pip install msgspec`."""
+
+    def __init__(self):
+        if msgspec is None:  # pragma: no cover
+            raise ImportError(
+                "Please install msgspec using 'pip install msgspec' "
+                "to use MsgspecCodec"
+            )
+        self._encoder = msgspec.json.Encoder()
+        self._decoder = msgspec.json.Decoder()
+
+    def encode(self, obj: Any) -> bytes:
+        return self._encoder.encode(obj)
+
+    def decode(self, data: Union[bytes, str]) -> Any:
+        try:
+            return self._decoder.decode(data)
+        except msgspec.DecodeError as exc:
+            raise ValueError(str(exc)) from exc
+
+
+class CustomCodec(Codec):
+    """
+    Codec built from a custom encoder and decoder.
+
+    Parameters:
+        encoder: Callable that serializes an object to bytes or str.
+        decoder: Callable that parses bytes to an object. It must raise
+            ValueError when the data is not valid JSON.
+    """
+
+    def __init__(
+        self,
+        encoder: Callable[[Any], Union[bytes, str]],
+        decoder: Callable[[Union[bytes, str]], Any],
+    ):
+        self._encoder = encoder
+        self._decoder = decoder
+
+    def encode(self, obj: Any) -> bytes:
+        encoded = self._encoder(obj)
+        if isinstance(encoded, str):
+            return encoded.encode("utf-8")
+        return encoded
+
+    def decode(self, data: Union[bytes, str]) -> Any:
+        return self._decoder(data)
+
+
+DEFAULT_CODEC: Codec = JsonCodec()
+
+
+__all__ = [
+    "Codec",
+    "JsonCodec",
+    "OrjsonCodec",
+    "MsgspecCodec",
+    "CustomCodec",
+    "DEFAULT_CODEC",
+]
@@ -1,13 +1,18 @@
+import functools
+import json
 import warnings
-from typing import Any, Type, TypeVar, Union
+from typing import Any, Generic, Type, TypeVar, Union
 
 import pydantic
 from pydantic import BaseModel
+from pydantic.version import VERSION
 
 
 M = TypeVar("M", bound=BaseModel)
 T = TypeVar("T")
 
+PYDANTIC_V2 = VERSION.startswith("2.")
+
 
 def parse_obj(pydantic_model: Type[M], obj: Any) -> M:
     with warnings.catch_warnings():  # pragma: no cover
@@ -31,3 +36,49 @@ def parse_obj_as(type_: Type[T], obj: Any) -> T:
     with warnings.catch_warnings():  # pragma: no cover
         warnings.simplefilter("ignore", category=DeprecationWarning)
         return pydantic.parse_obj_as(type_, obj)
+
+
+class TypeParser(Generic[T]):
+    """
+    Parser of a single type. On pydantic v2 it holds the TypeAdapter,
+    so the schema and the validator are built only once. On pydantic v1
+    it falls back to parse_obj_as.
+    """
+
+    def __init__(self, type_: Type[T]):
+        self.type_ = type_
+        if PYDANTIC_V2:
+            self._adapter = pydantic.TypeAdapter(type_)
+
+    def parse_obj(self, obj: Any) -> T:
+        """Validate the python object against the type."""
+        if PYDANTIC_V2:
+            return self._adapter.validate_python(obj)
+        return parse_obj_as(self.type_, obj)  # pragma: no cover
+
+    def parse_json(self, data: Union[str, bytes]) -> T:
+        """
+        Validate the JSON data against the type. On pydantic v2 the
+        intermediate python object is skipped.
+        """
+        if PYDANTIC_V2:
+            return self._adapter.validate_json(data)
+        return parse_obj_as(self.type_, json.loads(data))  # pragma: no cover
+
+
+@functools.lru_cache(maxsize=1024)
+def _cached_type_parser(type_: Any) -> TypeParser:
+    return TypeParser(type_)
+
+
+def get_type_parser(type_: Type[T]) -> TypeParser[T]:
+    """
+    Get the parser of the type. Parsers are cached per type, so they are
+    built once and reused by every response.
+    """
+    try:
+        hash(type_)
+    except TypeError:
+        # Unhashable type hints can't be cached
+        return TypeParser(type_)
+    return _cached_type_parser(type_)  # type: ignore[arg-type]
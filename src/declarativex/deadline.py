@@ -0,0 +1,106 @@
+import contextvars
+import time
+from typing import Any, Callable, Optional, Tuple
+
+from .exceptions import MisconfiguredException
+from .utils import SupportDecorator
+
+# Absolute deadline of the current call on the time.monotonic() clock
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar(
+    "declarativex_deadline", default=None
+)
+# Deadlines replaced by the entered context managers, innermost last
+_outer_deadlines: contextvars.ContextVar[
+    Tuple[Optional[float], ...]
+] = contextvars.ContextVar("declarativex_outer_deadlines", default=())
+
+
+class deadline(SupportDecorator):
+    """
+    Deadline of the whole call: every retry, rate limiter wait, middleware
+    and request shares the same time budget. The deadline is kept in a
+    context variable, so nested declarativex calls get the remaining
+    budget automatically, and it can only be shortened by inner deadlines.
+
+    It can be used as a decorator of the declared function or class, and
+    as a context manager around any code:
+
+        @deadline(2.0)
+        @retry(max_retries=3, exceptions=(TimeoutException,))
+        @http("GET", "/users")
+        def get_users() -> List[User]:
+            ...
+
+        with deadline(2.0):
+            users = get_users()
+
+    Parameters:
+        timeout: The time budget in seconds.
+    """
+
+    def __init__(self, timeout: float):
+        if timeout < 0:
+            raise MisconfiguredException(
+                "timeout must be a non-negative number"
+            )
+        self._timeout = timeout
+
+    @staticmethod
+    def remaining() -> Optional[float]:
+        """
+        Seconds left before the deadline of the current call, it can be
+        negative if the deadline has passed. None if there is no deadline.
+        """
+        current = _deadline.get()
+        if current is None:
+            return None
+        return current - time.monotonic()
+
+    @staticmethod
+    def limit(timeout: Optional[float]) -> Optional[float]:
+        """
+        Shorten the timeout to the time left before the deadline.
+        Returns the timeout as is if there is no deadline.
+        """
+        remaining = deadline.remaining()
+        if remaining is None:
+            return timeout
+        if timeout is None:
+            return remaining
+        return min(timeout, remaining)
+
+    def _set(self) -> contextvars.Token:
+        current = _deadline.get()
+        value = time.monotonic() + self._timeout
+        if current is not None:
+            value = min(value, current)
+        return _deadline.set(value)
+
+    def __enter__(self) -> "deadline":
+        # The replaced deadline is kept in the context, not on the
+        # instance, so the same instance can be entered concurrently.
+        _outer_deadlines.set(_outer_deadlines.get() + (_deadline.get(),))
+        self._set()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        outer_deadlines = _outer_deadlines.get()
+        _deadline.set(outer_deadlines[-1])
+        _outer_deadlines.set(outer_deadlines[:-1])
+
+    async def _decorate_async(self, func: Callable, *args, **kwargs) -> Any:
+        token = self._set()
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            _deadline.reset(token)
+
+    def _decorate_sync(self, func: Callable, *args, **kwargs) -> Any:
+        token = self._set()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _deadline.reset(token)
+
+
+__all__ = ["deadline"]
@@ -0,0 +1,168 @@
+import dataclasses
+import threading
+import types
+import typing
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    List,
+    Mapping,
+    Tuple,
+    TypeVar,
+    Union,
+    get_args,
+    get_origin,
+)
+
+Decoder = Callable[[Any], Any]
+
+_decoders: Dict[Any, Decoder] = {}
+# Decoders being compiled, published to _decoders all at once
+_pending: Dict[Any, Decoder] = {}
+_lock = threading.RLock()
+
+
+def _identity(value: Any) -> Any:
+    return value
+
+
+def _substitute(type_hint: Any, mapping: Mapping[TypeVar, Any]) -> Any:
+    """
+    Replace TypeVars in the type hint with concrete types. TypeVars
+    missing in the mapping are replaced with Any.
+    """
+    if isinstance(type_hint, TypeVar):
+        return mapping.get(type_hint, Any)
+    parameters = getattr(type_hint, "__parameters__", ())
+    if parameters and get_origin(type_hint) is not None:
+        return type_hint[tuple(mapping.get(p, Any) for p in parameters)]
+    return type_hint
+
+
+def _type_hints(cls: type) -> Dict[str, Any]:
+    """Resolved type hints of the class, string annotations included."""
+    try:
+        return typing.get_type_hints(cls)
+    except Exception:  # pylint: disable=broad-except
+        # Unresolvable forward references, raw field types are used
+        return {}
+
+
+def _compile_list(type_hint: Any) -> Decoder:
+    args = get_args(type_hint)
+    item_decoder = compile_decoder(args[0]) if args else _identity
+    if item_decoder is _identity:
+        return _identity
+
+    def decode(data: Any) -> Any:
+        return [item_decoder(item) for item in data]
+
+    return decode
+
+
+def _compile_dict(type_hint: Any) -> Decoder:
+    args = get_args(type_hint)
+    value_decoder = compile_decoder(args[1]) if len(args) == 2 else _identity
+    if value_decoder is _identity:
+        return _identity
+
+    def decode(data: Any) -> Any:
+        return {key: value_decoder(value) for key, value in data.items()}
+
+    return decode
+
+
+def _compile_optional(type_hint: Any) -> Decoder:
+    args = [arg for arg in get_args(type_hint) if arg is not types.NoneType]
+    if len(args) != 1:
+        # Unions of several types are ambiguous, values are kept as is
+        return _identity
+    decoder = compile_decoder(args[0])
+    if decoder is _identity:
+        return _identity
+
+    def decode(data: Any) -> Any:
+        return None if data is None else decoder(data)
+
+    return decode
+
+
+def _compile_dataclass(
+    type_hint: Any, cls: type, args: Tuple[Any, ...]
+) -> Decoder:
+    mapping = dict(zip(getattr(cls, "__parameters__", ()), args))
+    passthrough: List[str] = []
+    decoded: List[Tuple[str, Decoder]] = []
+
+    def decode(data: Any) -> Any:
+        # New objects are built, the parsed payload is never modified
+        kwargs = {name: data[name] for name in passthrough if name in data}
+        for name, decoder in decoded:
+            if name in data:
+                kwargs[name] = decoder(data[name])
+        return cls(**kwargs)
+
+    # Registered before the fields are compiled,
+    # so recursive dataclasses resolve to this decoder
+    _pending[type_hint] = decode
+    hints = _type_hints(cls)
+    for field in dataclasses.fields(cls):  # type: ignore[arg-type]
+        if not field.init:
+            continue
+        field_type = _substitute(hints.get(field.name, field.type), mapping)
+        decoder = compile_decoder(field_type)
+        if decoder is _identity:
+            passthrough.append(field.name)
+        else:
+            decoded.append((field.name, decoder))
+    return decode
+
+
+def _compile(type_hint: Any) -> Decoder:
+    origin = get_origin(type_hint)
+    if dataclasses.is_dataclass(type_hint) and isinstance(type_hint, type):
+        return _compile_dataclass(type_hint, type_hint, ())
+    if dataclasses.is_dataclass(origin):
+        return _compile_dataclass(
+            type_hint, origin, get_args(type_hint)  # type: ignore[arg-type]
+        )
+    if origin is list:
+        return _compile_list(type_hint)
+    if origin is dict:
+        return _compile_dict(type_hint)
+    if origin is Union or origin is types.UnionType:
+        return _compile_optional(type_hint)
+    return _identity
+
+
+def compile_decoder(type_hint: Any) -> Decoder:
+    """
+    Get the decoder of the type hint. Decoders convert parsed JSON into
+    dataclasses, including nested dataclasses, lists, dicts, optionals
+    and generic dataclasses. They are compiled once per type hint and
+    cached, so fields and type variables are resolved only once.
+    """
+    try:
+        decoder = _decoders.get(type_hint)
+    except TypeError:
+        # Unhashable type hints can't be cached
+        return _identity
+    if decoder is not None:
+        return decoder
+    with _lock:
+        decoder = _decoders.get(type_hint) or _pending.get(type_hint)
+        if decoder is not None:
+            return decoder
+        is_outermost = not _pending
+        decoder = _compile(type_hint)
+        _pending[type_hint] = decoder
+        if is_outermost:
+            # Nested decoders may refer to the ones still being compiled,
+            # so they are published only when everything is compiled.
+            _decoders.update(_pending)
+            _pending.clear()
+    return decoder
+
+
+__all__ = ["Decoder", "compile_decoder"]
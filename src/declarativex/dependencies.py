@@ -1,34 +1,25 @@
 import abc
 import dataclasses
 import enum
-import inspect
-import json
-from string import Formatter
 from typing import (
     Any,
-    Callable,
-    List,
     Optional,
     TYPE_CHECKING,
     Type,
     TypeVar,
     Union,
-    get_args,
 )
 
 from pydantic import BaseModel
 
 from .compatibility import to_dict
-from .exceptions import (
-    AnnotationException,
-    DependencyValidationError,
-    MisconfiguredException,
-)
+from .exceptions import DependencyValidationError, MisconfiguredException
 from .validation import _validate_type_hint
 from .warnings import warn_no_type_hint
 
 if TYPE_CHECKING:
-    from .models import RawRequest, GraphQLConfiguration
+    from .models import RawRequest
+    from .plan import EndpointPlan
 
 
 Value = TypeVar("Value")
@@ -59,7 +50,6 @@ class Dependency(abc.ABC):
     _http_method_whitelist = ["GET", "POST", "PUT", "PATCH", "DELETE"]
     location: Location
     _field_name: str
-    _value: Any
     _type_hint: Optional[Type] = None
 
     def __init__(
@@ -102,16 +92,6 @@ class Dependency(abc.ABC):
         """Set the name of the field to modify."""
         self._field_name = value
 
-    @property
-    def value(self) -> Any:
-        """The value to set the field to."""
-        return self._value
-
-    @value.setter
-    def value(self, value: Any) -> None:
-        """Set the value to set the field to."""
-        self._value = self.validate(value)
-
     def validate(self, value: Any) -> Any:
         """
         Validate the value against the type hint.
@@ -125,14 +105,18 @@ class Dependency(abc.ABC):
         warn_no_type_hint(self.field_name)
         return value
 
-    def modify_request(self, request: "RawRequest") -> "RawRequest":
+    def modify_request(
+        self, request: "RawRequest", value: Any
+    ) -> "RawRequest":
         """
-        Modify the request.
+        Modify the request. The value is passed explicitly, because the
+        dependency is shared by all calls of the declared function.
         :param request: The request to modify.
+        :param value: The validated value to set the field to.
         :return: The modified request.
         """
         data = getattr(request, self.location.value)
-        data[self.field_name] = self.value
+        data[self.field_name] = value
         setattr(request, self.location.value, data)
         return request
 
@@ -203,29 +187,32 @@ class FullReplacementDependency(Dependency):
         """Field name is unused for Json."""
         super().__init__()
 
-    def modify_request(self, request: "RawRequest") -> "RawRequest":
+    def modify_request(
+        self, request: "RawRequest", value: Any
+    ) -> "RawRequest":
         """
         Modify the request. If the value is a BaseModel or a dataclass, the
         fields of the value are merged with the JSON data.
         :param request: The request to modify.
+        :param value: The validated value to merge.
         :return: The modified request.
         """
         data = getattr(request, self.location.value)
-        if isinstance(self.value, BaseModel):
+        if isinstance(value, BaseModel):
             # If the value is a BaseModel, we convert it to
             # a dict and merge it with the JSON data.
-            data = {**data, **to_dict(self.value)}
-        elif dataclasses.is_dataclass(self.value):
+            data = {**data, **to_dict(value)}
+        elif dataclasses.is_dataclass(value):
             # If the value is a dataclass, we convert it to
             # a dict and merge it with the JSON data.
-            data = {**data, **dataclasses.asdict(self.value)}
-        elif isinstance(self.value, dict):
+            data = {**data, **dataclasses.asdict(value)}  # type: ignore
+        elif isinstance(value, dict):
             # If the value is a dict, we merge it with the JSON data.
-            data = {**data, **self.value}
-        elif isinstance(self.value, str):
+            data = {**data, **value}
+        elif isinstance(value, str):
             # If the value is a JSON string, we merge it with the JSON data.
             try:
-                data = {**data, **json.loads(self.value)}
+                data = {**data, **request.codec.decode(value)}
             except ValueError as exc:
                 # If the value is not a valid JSON string, we raise a
                 # DependencyValidationError.
@@ -249,8 +236,10 @@ class Files(Dependency):
     location = Location.files
     _http_method_whitelist = ["POST", "PUT", "PATCH"]
 
-    def modify_request(self, request: "RawRequest") -> "RawRequest":
-        setattr(request, self.location.value, self.value)
+    def modify_request(
+        self, request: "RawRequest", value: Any
+    ) -> "RawRequest":
+        setattr(request, self.location.value, value)
         return request
 
 
@@ -261,13 +250,16 @@ class Timeout(Dependency):
 
     location = Location.timeout
 
-    def modify_request(self, request: "RawRequest") -> "RawRequest":
+    def modify_request(
+        self, request: "RawRequest", value: Any
+    ) -> "RawRequest":
         """
         Modify the request.
         :param request: The request to modify.
+        :param value: The timeout in seconds.
         :return: The modified request.
         """
-        setattr(request, self.location.value, self.value)
+        setattr(request, self.location.value, value)
         return request
 
 
@@ -277,98 +269,30 @@ class RequestModifier:
     declarativex.
     """
 
-    @staticmethod
-    def __extract_variables_from_url_template(url_template: str) -> List[str]:
-        """
-        Extract variables from a URL template.
-        :param url_template: The URL template.
-        :return: The variables in the URL template.
-        """
-        return [
-            field[1] for field in Formatter().parse(url_template) if field[1]
-        ]
-
     @classmethod
     def prepare_request(
         cls,
         request: "RawRequest",
-        func: Callable,
-        gql: Optional["GraphQLConfiguration"] = None,
+        plan: "EndpointPlan",
         **values,
     ) -> "RawRequest":
         """
         Prepare a request for sending. This method is used internally by
         declarativex. It is called before the request is sent. It modifies the
-        request according to the dependencies. It also validates the values
-        against the type hints.
+        request according to the dependencies of the compiled endpoint plan.
+        It also validates the values against the type hints.
         :param request: The request to prepare.
-        :param func: The function that is called.
-        :param gql: The GraphQL configuration.
+        :param plan: The compiled plan of the called function.
         :param values: The values to set the dependencies to.
         :return: The prepared request.
         """
-        signature = inspect.signature(func)
-        if gql:
-            from .graphql import extract_variables_from_gql_query
-
-            url_template_variables = extract_variables_from_gql_query(
-                gql.query
-            )
-        else:
-            url_template_variables = cls.__extract_variables_from_url_template(
-                request.url_template
+        plan.check()
+        for parameter in plan.parameters:
+            dependency = parameter.dependency
+            value = dependency.validate(
+                values.get(parameter.name, parameter.default)
             )
-        dependencies = []
-        for key, val in signature.parameters.items():
-            if key in ["self", "cls"]:
-                # We don't need the self or cls parameter.
-                continue
-
-            # We check if the parameter is annotated.
-            annotation = func.__annotations__.get(key, None)
-            if hasattr(annotation, "__metadata__"):
-                # Extracting the type hint and the dependency from the
-                # Annotated type.
-                type_hint, dependency = get_args(annotation)
-                if not isinstance(dependency, Dependency):
-                    if inspect.isclass(dependency) and issubclass(
-                        dependency, Dependency
-                    ):
-                        # If the dependency is a class, we instantiate it.
-                        dependency = dependency()
-                        dependency.type_hint = type_hint
-                    else:
-                        # If the dependency is not an instance of Dependency,
-                        # we raise an AnnotationException.
-                        raise AnnotationException(annotation)
-                else:
-                    # If the dependency is already an instance of Dependency,
-                    # we are setting only the type hint.
-                    dependency.type_hint = type_hint
-            elif key in url_template_variables:
-                # If the parameter is in the URL template and not annotated,
-                # we assume it is a Path dependency.
-                if gql:
-                    dependency = JsonField()
-                else:
-                    dependency = Path()
-                dependency.type_hint = annotation
-            else:
-                # If the parameter is not annotated and not in the URL
-                # template, we assume it is a Query dependency.
-                dependency = Query()
-                dependency.type_hint = annotation
-
-            dependency.is_available_for_method(request.method)
-
-            # We set the field name and the value of the dependency.
-            dependency.field_name = key
-            dependency.value = values.get(key, val.default)
-            dependencies.append(dependency)
-
-        # Modifying the request according to the dependencies in loop.
-        for dependency in dependencies:
-            request = dependency.modify_request(request)
+            request = dependency.modify_request(request, value)
         return request
 
 
@@ -1,9 +1,11 @@
+import email.utils
 from collections.abc import Iterable
+from datetime import datetime, timezone
 from typing import Type, Sequence, Union, Mapping, Optional, TYPE_CHECKING, Any
 
 import httpx
 
-from .compatibility import parse_obj_as
+from .compatibility import get_type_parser
 
 if TYPE_CHECKING:  # pragma: no cover
     from .models import RawRequest
@@ -126,14 +128,40 @@ class HTTPException(DeclarativeException):
     def response(self):
         """
         The response that was received. If a model is specified, the response
-        will be parsed and returned as an instance of that model.
+        will be parsed and returned as an instance of that model. The parser
+        of the model is cached, so it is built only once.
         :return: httpx.Response or Instance of self._model
         """
         response = self._response
         if self._model:
-            return parse_obj_as(self._model, response.json())
+            return get_type_parser(self._model).parse_json(response.content)
         return response
 
+    @property
+    def retry_after(self) -> Optional[float]:
+        """
+        Seconds to wait before retrying the request, taken from the
+        Retry-After header of 429 and 503 responses. The header can be
+        either a non-negative integer number of seconds or an HTTP date
+        (RFC 9110, section 10.2.3).
+        :return: float or None if the header is missing or invalid
+        """
+        if self.status_code not in (429, 503):
+            return None
+        value = self._response.headers.get("retry-after")
+        if value is None:
+            return None
+        value = value.strip()
+        if value.isascii() and value.isdigit():
+            return float(value)
+        try:
+            date = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if date.tzinfo is None:
+            date = date.replace(tzinfo=timezone.utc)
+        return max((date - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
 
 class UnprocessableEntityException(DeclarativeException):
     """
@@ -157,6 +185,12 @@ class RateLimitExceeded(DeclarativeException):
     """
 
 
+class CircuitBreakerOpen(DeclarativeException):
+    """
+    Raised when a request is rejected because the circuit breaker is open.
+    """
+
+
 __all__ = [
     "DeclarativeException",
     "MisconfiguredException",
@@ -166,4 +200,5 @@ __all__ = [
     "HTTPException",
     "UnprocessableEntityException",
     "RateLimitExceeded",
+    "CircuitBreakerOpen",
 ]
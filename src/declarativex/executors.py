@@ -1,59 +1,156 @@
 # pylint: disable=invalid-overridden-method
 import abc
 import asyncio
-import inspect
-import threading
+import dataclasses
+import functools
+import time
 from asyncio import (
     wait_for,
     CancelledError,
     TimeoutError as AsyncioTimeoutError,
 )
-from queue import Empty, Queue
-from typing import Any, Callable, Dict, Optional, Tuple
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterator,
+    Optional,
+    Sequence,
+    Tuple,
+)
 
 import httpx
 
 from . import BaseClient
+from .deadline import deadline
 from .exceptions import HTTPException, TimeoutException, MisconfiguredException
+from .hedging import Hedging
+from .http_cache import CachedResponse, HttpCache
+from .middlewares import Middleware
 from .models import (
     EndpointConfiguration,
     ClientConfiguration,
     RawRequest,
     Response,
 )
+from .plan import EndpointPlan
+from .pool import ClientPool
+from .single_flight import SingleFlight
+from .streaming import StreamReader
 from .utils import ReturnType
 
-# Check if h2 is installed to enable http2 support
-try:  # pragma: no cover
-    import h2  # type: ignore[import]
-except ImportError:  # pragma: no cover
-    h2 = None
 
+@dataclasses.dataclass
+class CallContext:
+    """
+    State of a single call. Executors are shared by all concurrent calls
+    of the declared function, so everything that belongs to one call
+    lives here and is never written to the executor.
 
-class Executor(abc.ABC):
+    Parameters:
+        client_configuration: Configuration merged for this call.
+        raw_request: The request prepared from the call arguments.
+    """
+
+    client_configuration: ClientConfiguration
     raw_request: RawRequest
-    _func: Callable
 
-    def __init__(self, endpoint_configuration: EndpointConfiguration):
-        self.endpoint_configuration = endpoint_configuration
+    @property
+    def error_mappings(self):
+        """The error mappings of the merged client configuration."""
+        return self.client_configuration.error_mappings
 
     @property
-    def func(self) -> Callable:
-        return self._func
-
-    @func.setter
-    def func(self, func: Callable) -> None:
-        for middleware in self._middlewares:
-            is_async = asyncio.iscoroutinefunction(func)
-            if getattr(middleware, "_async") is not is_async:
-                mw_type = ["sync", "async"]
-                raise MisconfiguredException(
-                    f"Cannot use {mw_type[not is_async]} middleware"
-                    f"({middleware.__class__.__name__}) with "
-                    f"{mw_type[is_async]} function"
-                )
+    def middlewares(self) -> Sequence[Middleware]:
+        """The middlewares of the merged client configuration."""
+        return self.client_configuration.middlewares
+
+    @property
+    def pool(self) -> ClientPool:
+        """The pool of httpx clients of the merged client configuration."""
+        pool = self.client_configuration.pool
+        if pool is None:
+            raise MisconfiguredException(
+                "Client configuration has no connection pool"
+            )
+        return pool
+
+
+class _RemainingTimeouts(dict):
+    """
+    httpx timeouts of the request phases (pool, connect, write and read)
+    counted down to the time the request expires at. httpcore looks the
+    timeout up when the phase starts, so every phase gets only the time
+    left of the whole request.
+    """
+
+    # Socket timeout of zero makes the socket non-blocking, the phases
+    # started after the expiry time out almost at once instead
+    MIN_TIMEOUT = 0.001
+
+    def __init__(self, expires_at: float):
+        super().__init__(connect=None, read=None, write=None, pool=None)
+        self._expires_at = expires_at
+
+    def get(self, key, default=None):
+        if key not in self:
+            return default
+        return max(self._expires_at - time.monotonic(), self.MIN_TIMEOUT)
+
+
+class _DeadlineStream(httpx.SyncByteStream):
+    """
+    Stream of the response body that raises httpx.ReadTimeout once the
+    request has expired. The reads of the body are bounded by the time
+    left when the body started, so the body can't be read past the
+    expiry for longer than one read.
+    """
+
+    def __init__(
+        self,
+        stream: httpx.SyncByteStream,
+        expires_at: float,
+        request: httpx.Request,
+    ):
+        self._stream = stream
+        self._expires_at = expires_at
+        self._request = request
+
+    @staticmethod
+    def check(expires_at: float, request: httpx.Request) -> None:
+        """Raise httpx.ReadTimeout if the request has expired."""
+        if time.monotonic() > expires_at:
+            raise httpx.ReadTimeout(
+                "Deadline exceeded while reading the response",
+                request=request,
+            )
+
+    def __iter__(self) -> Iterator[bytes]:
+        for chunk in self._stream:
+            self.check(self._expires_at, self._request)
+            yield chunk
 
-        self._func = func
+    def close(self) -> None:
+        self._stream.close()
+
+
+class Executor(abc.ABC):
+    """
+    Executor of the declared function. It is created once per declaration
+    and holds only immutable data, so it is safe to call it from many
+    coroutines or threads at the same time.
+    """
+
+    _async: bool
+
+    def __init__(
+        self,
+        endpoint_configuration: EndpointConfiguration,
+        plan: EndpointPlan,
+    ):
+        self.endpoint_configuration = endpoint_configuration
+        self.plan = plan
 
     def merge_args_and_kwargs(
         self, *args, **kwargs
@@ -63,74 +160,266 @@ class Executor(abc.ABC):
         dictionary. It also returns the self and cls objects if they are
         present in the kwargs.
         """
-        signature = inspect.signature(self.func)
-        param_names = list(signature.parameters.keys())
-        kwargs.update(dict(zip(param_names, args)))
+        kwargs.update(zip(self.plan.parameter_names, args))
         # Remove self and cls from kwargs, it will be used
-        # later to get and update the client configuration
+        # later to get the client configuration
         self_, cls_ = kwargs.pop("self", None), kwargs.pop("cls", None)
         return kwargs, self_, cls_
 
     @abc.abstractmethod
-    def wait_for(self, client, request: httpx.Request):
+    def wait_for(
+        self, client, request: httpx.Request, timeout, stream: bool = False
+    ):
         """
         This method is used to wait for a function to finish, especially
         for timeout handling.
         """
         raise NotImplementedError
 
-    def update_configuration(
+    def get_configuration(
         self, self_: Optional[BaseClient], cls_: Optional[BaseClient]
-    ) -> None:
+    ) -> ClientConfiguration:
         """
-        This method is used to update the client configuration with the
-        configuration from the self and cls objects.
-        If the self or cls objects are not present, this method does nothing.
+        This method is used to get the client configuration of the call.
+        The configuration from the self and cls objects is merged with
+        the configuration of the endpoint. The configuration of the
+        endpoint itself is never modified.
         """
         class_config = ClientConfiguration.extract_from_func_kwargs(
             self_=self_, cls_=cls_
         )
         if class_config:
-            client_configuration = class_config.merge(
+            return class_config.merge(
                 self.endpoint_configuration.client_configuration
             )
-            self.endpoint_configuration.client_configuration = (
-                client_configuration
-            )
+        return self.endpoint_configuration.client_configuration
+
+    def check_middlewares(self, middlewares: Sequence[Middleware]) -> None:
+        """
+        This method is used to check that the middlewares can be used with
+        the declared function: async middlewares with async functions and
+        sync middlewares with sync functions only.
+        """
+        for middleware in middlewares:
+            if getattr(middleware, "_async") is not self._async:
+                mw_type = ["sync", "async"]
+                raise MisconfiguredException(
+                    f"Cannot use {mw_type[not self._async]} middleware"
+                    f"({middleware.__class__.__name__}) with "
+                    f"{mw_type[self._async]} function"
+                )
+
+    def prepare_context(self, *args, **kwargs) -> CallContext:
+        """
+        This method is used to prepare the context of the call: the merged
+        client configuration and the raw request.
+        """
+        kwargs, self_, cls_ = self.merge_args_and_kwargs(*args, **kwargs)
+        client_configuration = self.get_configuration(self_, cls_)
+        self.check_middlewares(client_configuration.middlewares)
+        raw_request = RawRequest.initialize(
+            self.endpoint_configuration,
+            client_configuration=client_configuration,
+        ).prepare(self.plan, **kwargs)
+        return CallContext(
+            client_configuration=client_configuration,
+            raw_request=raw_request,
+        )
 
-    def prepare_request(self, **kwargs) -> None:
+    def get_timeout(self, request: RawRequest) -> Optional[float]:
         """
-        This method is used to prepare the raw request.
-        It also applies the middlewares to the raw request.
+        This method is used to get the timeout of the request. The timeout
+        of the request takes precedence over the timeout of the endpoint.
+        It is shortened to the time left before the deadline of the call.
         """
-        self.raw_request = RawRequest.initialize(
-            self.endpoint_configuration
-        ).prepare(self.func, gql=self.endpoint_configuration.gql, **kwargs)
+        timeout = request.timeout or self.endpoint_configuration.timeout
+        return deadline.limit(timeout or None)
+
+    @staticmethod
+    def check_timeout(
+        timeout: Optional[float], httpx_request: httpx.Request
+    ) -> None:
+        """
+        This method is used to fail the request without sending it,
+        if the deadline of the call has already passed.
+        """
+        if timeout is not None and timeout <= 0:
+            raise TimeoutException(timeout=0.0, request=httpx_request)
 
     def parse_response(
         self,
+        context: CallContext,
+        request: RawRequest,
         httpx_request: httpx.Request,
         httpx_response: httpx.Response,
     ):
         """
         This method is used to parse the httpx response into the
         return type of the function.
-        It also applies the middlewares to the response.
+        """
+        self.raise_for_status(
+            context=context,
+            request=request,
+            httpx_request=httpx_request,
+            httpx_response=httpx_response,
+        )
+        return Response(response=httpx_response, codec=request.codec).as_type(
+            self.plan.return_type
+        )
+
+    def raise_for_status(
+        self,
+        context: CallContext,
+        request: RawRequest,
+        httpx_request: httpx.Request,
+        httpx_response: httpx.Response,
+    ) -> None:
+        """
+        This method is used to raise HTTPException if the response
+        has an error status code.
         """
         try:
-            return Response(response=httpx_response).as_type_for_func(
-                self.func
-            )
+            httpx_response.raise_for_status()
         except httpx.HTTPStatusError as e:
             raise HTTPException(
                 request=httpx_request,
                 response=httpx_response,
-                raw_request=self.raw_request,
-                error_mappings=self._error_mappings,
+                raw_request=request,
+                error_mappings=context.error_mappings,
             ) from e
 
+    def get_cache(self, context: CallContext) -> Optional[HttpCache]:
+        """
+        This method is used to get the HTTP cache of the call. Streamed
+        responses are never cached.
+        """
+        if self.plan.stream:
+            return None
+        return context.client_configuration.cache
+
+    def get_single_flight(
+        self, context: CallContext
+    ) -> Optional[SingleFlight]:
+        """
+        This method is used to get the coalescing of the identical requests
+        of the call. Streamed responses are read by one caller only, so
+        they are never coalesced.
+        """
+        if self.plan.stream:
+            return None
+        return context.client_configuration.single_flight
+
+    @staticmethod
+    def lookup_cache(
+        context: CallContext,
+        cache: Optional[HttpCache],
+        httpx_request: httpx.Request,
+    ) -> Tuple[Optional[CachedResponse], bool]:
+        """
+        This method is used to look up the stored response of the request
+        and tell whether it's fresh. The request of a stale response is
+        made conditional, so the server can answer 304 Not Modified.
+        """
+        if cache is None:
+            return None, False
+        cached = cache.lookup(
+            httpx_request, auth=context.client_configuration.auth
+        )
+        if cached is None:
+            return None, False
+        if cache.is_fresh(cached, httpx_request):
+            return cached, True
+        cache.add_validators(httpx_request, cached)
+        return cached, False
+
+    def cached_result(
+        self,
+        context: CallContext,
+        request: RawRequest,
+        httpx_request: httpx.Request,
+        cached: CachedResponse,
+    ):
+        """
+        This method is used to return the stored response. The parsed
+        response of the previous call is reused if the return type is the
+        same, so the body isn't decoded and validated again.
+        """
+        if cached.parsed is not None and (
+            cached.parsed[0] == self.plan.return_type
+        ):
+            return cached.parsed[1]
+        result = self.parse_response(
+            context=context,
+            request=request,
+            httpx_request=httpx_request,
+            httpx_response=cached.to_httpx_response(httpx_request),
+        )
+        cached.parsed = (self.plan.return_type, result)
+        return result
+
+    def parse_cached_response(
+        self,
+        context: CallContext,
+        cache: HttpCache,
+        cached: Optional[CachedResponse],
+        request: RawRequest,
+        httpx_request: httpx.Request,
+        httpx_response: httpx.Response,
+        request_time: float,
+    ):
+        """
+        This method is used to parse the response with the HTTP cache.
+        304 Not Modified response freshens the stored response and returns
+        it, other responses are stored if they are cacheable.
+        """
+        response_time = time.time()
+        if httpx_response.status_code == 304 and cached is not None:
+            cached = cache.update(
+                httpx_request,
+                cached,
+                httpx_response,
+                request_time=request_time,
+                response_time=response_time,
+                auth=context.client_configuration.auth,
+            )
+            return self.cached_result(
+                context=context,
+                request=request,
+                httpx_request=httpx_request,
+                cached=cached,
+            )
+        stored = cache.store(
+            httpx_request,
+            httpx_response,
+            request_time=request_time,
+            response_time=response_time,
+            auth=context.client_configuration.auth,
+        )
+        result = self.parse_response(
+            context=context,
+            request=request,
+            httpx_request=httpx_request,
+            httpx_response=httpx_response,
+        )
+        if stored is not None:
+            stored.parsed = (self.plan.return_type, result)
+        return result
+
+    def stream_reader(
+        self, request: RawRequest, httpx_response: httpx.Response
+    ) -> StreamReader:
+        """
+        This method is used to create the reader of the streamed response.
+        """
+        return StreamReader(
+            response=httpx_response,
+            stream_type=self.plan.stream,  # type: ignore[arg-type]
+            codec=request.codec,
+        )
+
+    @staticmethod
     def _chain_middlewares(
-        self, execute: Callable[[RawRequest], ReturnType]
+        context: CallContext, execute: Callable[[RawRequest], ReturnType]
     ) -> ReturnType:
         """
         This method is used to chain the middlewares together. It uses
@@ -138,7 +427,7 @@ class Executor(abc.ABC):
         the execute function.
         """
         execute_func = execute
-        for mw in reversed(self._middlewares):
+        for mw in reversed(context.middlewares):
 
             def wrap(middleware, prev_func):
                 def _wrapped(request: RawRequest):
@@ -147,136 +436,388 @@ class Executor(abc.ABC):
                 return _wrapped
 
             execute_func = wrap(mw, execute_func)
-        return execute_func(self.raw_request)
+        return execute_func(context.raw_request)
 
-    def execute(self, func, *args, **kwargs):
-        self.func = func
-        kwargs, self_, cls_ = self.merge_args_and_kwargs(*args, **kwargs)
-        self.update_configuration(self_, cls_)
-        self.prepare_request(**kwargs)
-        if self._middlewares:
-            return self._chain_middlewares(self._execute)
-        return self._execute(self.raw_request)
+    def execute(self, *args, **kwargs):
+        context = self.prepare_context(*args, **kwargs)
+        execute = functools.partial(self._execute, context)
+        if context.middlewares:
+            return self._chain_middlewares(context, execute)
+        return execute(context.raw_request)
 
     @abc.abstractmethod
-    def _execute(self, request: RawRequest):
+    def _execute(self, context: CallContext, request: RawRequest):
         raise NotImplementedError
 
-    @property
-    def _error_mappings(self):
-        """
-        This property is used to get the error mappings from the client
-        configuration.
-        """
-        return self.endpoint_configuration.client_configuration.error_mappings
-
-    @property
-    def _middlewares(self):
-        """
-        This property is used to get the middlewares from the client
-        configuration.
-        """
-        return self.endpoint_configuration.client_configuration.middlewares
-
-    def _get_httpx_auth(self):
-        """
-        Get httpx-compatible auth if it exists. Returns None if auth is
-        a declarativex Auth (which is applied via apply_auth method).
-        """
-        auth = self.endpoint_configuration.client_configuration.auth
-        if auth and isinstance(auth, httpx.Auth):
-            return auth
-        return None
-
 
 class AsyncExecutor(Executor):
+    _async = True
+
     async def wait_for(
-        self, client: httpx.AsyncClient, request: httpx.Request
+        self,
+        client: httpx.AsyncClient,
+        request: httpx.Request,
+        timeout: Optional[float],
+        stream: bool = False,
     ):
         """
         This method is used to wait for a function to finish, especially
         for timeout handling. It uses asyncio.wait_for to wait for the
         function to finish. Due to httpx timeouts not working properly,
-        this method is used to handle it.
+        this method is used to handle it. httpx timeouts are set as
+        well, so the reads of streamed responses are bounded too.
         """
-        timeout = (
-            self.raw_request.timeout or self.endpoint_configuration.timeout
-        )
-
         if timeout:
+            request.extensions["timeout"] = httpx.Timeout(timeout).as_dict()
             try:
                 return await wait_for(
-                    client.send(request),
+                    client.send(request, stream=stream),
                     timeout=timeout,
                 )
-            except (TimeoutError, CancelledError, AsyncioTimeoutError) as e:
+            except (
+                TimeoutError,
+                CancelledError,
+                AsyncioTimeoutError,
+                httpx.TimeoutException,
+            ) as e:
                 raise TimeoutException(
                     timeout=timeout,
                     request=request,
                 ) from e
-        return await client.send(request)
-
-    async def _execute(self, request: RawRequest):
-        async with httpx.AsyncClient(
-            follow_redirects=True,
-            http2=bool(h2),
-            proxy=self.endpoint_configuration.client_configuration.proxies,
-            auth=self._get_httpx_auth(),
-        ) as client:
-            httpx_request = request.to_httpx_request()
-            httpx_response = await self.wait_for(
-                client=client, request=httpx_request
+        return await client.send(request, stream=stream)
+
+    async def send_hedged(
+        self,
+        hedging: Hedging,
+        client: httpx.AsyncClient,
+        httpx_request: httpx.Request,
+        timeout: Optional[float],
+        stream: bool = False,
+    ) -> httpx.Response:
+        """
+        This method is used to send the request with hedging. If the
+        response doesn't arrive within the hedging delay, an identical
+        request is sent over the same client. The first response wins,
+        the other request is cancelled and its response is closed.
+        Errors are not hedged, the error of the first request is raised
+        if none of the requests succeeded.
+        """
+        delay = hedging.get_delay()
+        started = time.monotonic()
+
+        def send(
+            httpx_request: httpx.Request, timeout: Optional[float]
+        ) -> asyncio.Task:
+            return asyncio.ensure_future(
+                self.wait_for(
+                    client=client,
+                    request=httpx_request,
+                    timeout=timeout,
+                    stream=stream,
+                )
             )
-            return self.parse_response(
+
+        tasks = [send(httpx_request, timeout)]
+        winner: Optional[asyncio.Task] = None
+        try:
+            if delay is not None and (timeout is None or delay < timeout):
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if not done and hedging.withdraw():
+                    # The copy keeps the headers added to the request,
+                    # e.g. the validators of the cached response
+                    hedged_request = httpx.Request(
+                        httpx_request.method,
+                        httpx_request.url,
+                        headers=httpx_request.headers,
+                        content=httpx_request.content,
+                    )
+                    tasks.append(
+                        send(
+                            hedged_request,
+                            timeout and timeout - (time.monotonic() - started),
+                        )
+                    )
+            pending = set(tasks)
+            while winner is None:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                winner = next(
+                    (t for t in tasks if t in done and not t.exception()),
+                    None,
+                )
+                if winner is None and not pending:
+                    return tasks[0].result()
+            hedging.record(time.monotonic() - started)
+            return winner.result()
+        finally:
+            losers = [task for task in tasks if task is not winner]
+            for task in losers:
+                task.cancel()
+            if losers:
+                await asyncio.wait(losers)
+            for task in losers:
+                if not task.cancelled() and not task.exception():
+                    await task.result().aclose()
+
+    async def open_stream(
+        self,
+        context: CallContext,
+        request: RawRequest,
+        httpx_request: httpx.Request,
+        httpx_response: httpx.Response,
+    ) -> AsyncIterator[Any]:
+        """
+        This method is used to open the iterator over the items of the
+        streamed response. The body of an error response is read, so
+        the error mappings can parse it.
+        """
+        if not httpx_response.is_success:
+            await httpx_response.aread()
+            self.raise_for_status(
+                context=context,
+                request=request,
                 httpx_request=httpx_request,
                 httpx_response=httpx_response,
             )
+        return self.stream_reader(request, httpx_response).aiter_items()
 
+    @staticmethod
+    async def run_cache_io(
+        http_cache: Optional[HttpCache], func: Callable, *args, **kwargs
+    ):
+        """
+        This method is used to call the HTTP cache. The calls using
+        a blocking storage run in a worker thread, so they don't block
+        the event loop.
+        """
+        if http_cache is not None and http_cache.storage.blocking:
+            return await asyncio.to_thread(func, *args, **kwargs)
+        return func(*args, **kwargs)
+
+    async def _execute(self, context: CallContext, request: RawRequest):
+        client = context.pool.get_async_client(context.client_configuration)
+        httpx_request = request.to_httpx_request()
+        cache = self.get_cache(context)
+        cached, fresh = await self.run_cache_io(
+            cache, self.lookup_cache, context, cache, httpx_request
+        )
+        if fresh:
+            return self.cached_result(
+                context=context,
+                request=request,
+                httpx_request=httpx_request,
+                cached=cached,  # type: ignore[arg-type]
+            )
+        send = functools.partial(
+            self.send_and_parse,
+            context=context,
+            request=request,
+            client=client,
+            httpx_request=httpx_request,
+            cache=cache,
+            cached=cached,
+        )
+        single_flight = self.get_single_flight(context)
+        if single_flight is not None:
+            return await single_flight.ado(httpx_request, send)
+        return await send()
 
-class SyncExecutor(Executor):
-    def wait_for(self, client: httpx.Client, request: httpx.Request):
+    async def send_and_parse(
+        self,
+        context: CallContext,
+        request: RawRequest,
+        client: httpx.AsyncClient,
+        httpx_request: httpx.Request,
+        cache: Optional[HttpCache],
+        cached: Optional[CachedResponse],
+    ):
         """
-        This method is used to wait for a function to finish, especially
-        for timeout handling. It uses threading to wait for the function
-        to finish. Due to httpx timeouts not working properly, this
-        method is used to handle it.
+        This method is used to send the request and parse the response.
         """
-        timeout = (
-            self.raw_request.timeout or self.endpoint_configuration.timeout
+        timeout = self.get_timeout(request)
+        self.check_timeout(timeout, httpx_request)
+        request_time = time.time()
+        hedging = self.endpoint_configuration.hedging
+        if hedging is not None:
+            httpx_response = await self.send_hedged(
+                hedging=hedging,
+                client=client,
+                httpx_request=httpx_request,
+                timeout=timeout,
+                stream=self.plan.stream is not None,
+            )
+            httpx_request = httpx_response.request
+        else:
+            httpx_response = await self.wait_for(
+                client=client,
+                request=httpx_request,
+                timeout=timeout,
+                stream=self.plan.stream is not None,
+            )
+        if self.plan.stream:
+            return await self.open_stream(
+                context=context,
+                request=request,
+                httpx_request=httpx_request,
+                httpx_response=httpx_response,
+            )
+        if cache is not None:
+            return await self.run_cache_io(
+                cache,
+                self.parse_cached_response,
+                context=context,
+                cache=cache,
+                cached=cached,
+                request=request,
+                httpx_request=httpx_request,
+                httpx_response=httpx_response,
+                request_time=request_time,
+            )
+        return self.parse_response(
+            context=context,
+            request=request,
+            httpx_request=httpx_request,
+            httpx_response=httpx_response,
         )
 
-        if timeout:
-            queue: Queue = Queue()
 
-            def wrapper():
-                result = client.send(request)
-                queue.put(result)
+class SyncExecutor(Executor):
+    _async = False
 
-            thread = threading.Thread(target=wrapper)
-            thread.start()
+    def wait_for(
+        self,
+        client: httpx.Client,
+        request: httpx.Request,
+        timeout: Optional[float],
+        stream: bool = False,
+    ):
+        """
+        This method is used to wait for a function to finish, especially
+        for timeout handling. Every phase of the request (pool, connect,
+        write and read) gets only the time left of the timeout, and the
+        body is read in chunks with the expiry checked between them, so
+        the whole request is bounded without spawning a thread.
 
-            try:
-                return queue.get(timeout=timeout)
-            except Empty:
-                thread.join()
-                raise TimeoutException(
-                    timeout=timeout,
-                    request=request,
-                )
-        return client.send(request)
-
-    def _execute(self, request: RawRequest):
-        with httpx.Client(
-            follow_redirects=True,
-            http2=bool(h2),
-            proxy=self.endpoint_configuration.client_configuration.proxies,
-            auth=self._get_httpx_auth(),
-        ) as client:
-            httpx_request = request.to_httpx_request()
-            httpx_response = self.wait_for(
-                client=client, request=httpx_request
+        Streamed responses are returned as soon as the headers arrive,
+        every read of their body is bounded by the timeout.
+        """
+        if not timeout:
+            return client.send(request, stream=stream)
+        expires_at = time.monotonic() + timeout
+        request.extensions["timeout"] = _RemainingTimeouts(expires_at)
+        try:
+            response = client.send(request, stream=True)
+        except httpx.TimeoutException as e:
+            raise TimeoutException(timeout=timeout, request=request) from e
+        try:
+            if stream:
+                _DeadlineStream.check(expires_at, request)
+                # The body is read by the caller, at its own pace
+                request.extensions["timeout"] = httpx.Timeout(
+                    timeout
+                ).as_dict()
+                return response
+            response.stream = _DeadlineStream(
+                response.stream,  # type: ignore[arg-type]
+                expires_at=expires_at,
+                request=request,
             )
-            return self.parse_response(
+            response.read()
+        except httpx.TimeoutException as e:
+            response.close()
+            raise TimeoutException(timeout=timeout, request=request) from e
+        return response
+
+    def open_stream(
+        self,
+        context: CallContext,
+        request: RawRequest,
+        httpx_request: httpx.Request,
+        httpx_response: httpx.Response,
+    ) -> Iterator[Any]:
+        """
+        This method is used to open the iterator over the items of the
+        streamed response. The body of an error response is read, so
+        the error mappings can parse it.
+        """
+        if not httpx_response.is_success:
+            httpx_response.read()
+            self.raise_for_status(
+                context=context,
+                request=request,
                 httpx_request=httpx_request,
                 httpx_response=httpx_response,
             )
+        return self.stream_reader(request, httpx_response).iter_items()
+
+    def _execute(self, context: CallContext, request: RawRequest):
+        client = context.pool.get_sync_client(context.client_configuration)
+        httpx_request = request.to_httpx_request()
+        cache = self.get_cache(context)
+        cached, fresh = self.lookup_cache(context, cache, httpx_request)
+        if fresh:
+            return self.cached_result(
+                context=context,
+                request=request,
+                httpx_request=httpx_request,
+                cached=cached,  # type: ignore[arg-type]
+            )
+        send = functools.partial(
+            self.send_and_parse,
+            context=context,
+            request=request,
+            client=client,
+            httpx_request=httpx_request,
+            cache=cache,
+            cached=cached,
+        )
+        single_flight = self.get_single_flight(context)
+        if single_flight is not None:
+            return single_flight.do(httpx_request, send)
+        return send()
+
+    def send_and_parse(
+        self,
+        context: CallContext,
+        request: RawRequest,
+        client: httpx.Client,
+        httpx_request: httpx.Request,
+        cache: Optional[HttpCache],
+        cached: Optional[CachedResponse],
+    ):
+        """
+        This method is used to send the request and parse the response.
+        """
+        timeout = self.get_timeout(request)
+        self.check_timeout(timeout, httpx_request)
+        request_time = time.time()
+        httpx_response = self.wait_for(
+            client=client,
+            request=httpx_request,
+            timeout=timeout,
+            stream=self.plan.stream is not None,
+        )
+        if self.plan.stream:
+            return self.open_stream(
+                context=context,
+                request=request,
+                httpx_request=httpx_request,
+                httpx_response=httpx_response,
+            )
+        if cache is not None:
+            return self.parse_cached_response(
+                context=context,
+                cache=cache,
+                cached=cached,
+                request=request,
+                httpx_request=httpx_request,
+                httpx_response=httpx_response,
+                request_time=request_time,
+            )
+        return self.parse_response(
+            context=context,
+            request=request,
+            httpx_request=httpx_request,
+            httpx_response=httpx_response,
+        )
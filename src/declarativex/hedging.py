@@ -0,0 +1,109 @@
+import collections
+import threading
+from typing import Deque, Optional
+
+from .exceptions import MisconfiguredException
+
+
+class Hedging:
+    """
+    Hedging policy of the endpoint. If the response doesn't arrive within
+    the hedging delay, an identical request is sent, the first response
+    wins and the other request is cancelled. It cuts the tail latency of
+    idempotent GET endpoints at the cost of a few extra requests.
+
+    The delay is either static or learned: a percentile of the latencies
+    of the recent calls, so only the slowest calls are hedged. The static
+    delay is used until enough latencies are recorded, no requests are
+    hedged before that if it's not set.
+
+    Hedged requests are limited by a budget: every call deposits `ratio`
+    tokens and every hedged request withdraws one, so the hedges can't
+    exceed `ratio` of the calls, plus a burst of `max_tokens`.
+
+    The policy keeps the latencies and the budget of the endpoint, use a
+    separate instance for every endpoint.
+
+    Parameters:
+        delay: Static delay in seconds before the hedged request.
+        percentile: Percentile of the recent latencies used as the delay,
+            e.g. 0.95 to hedge the calls slower than p95.
+        ratio: Share of the calls that can be hedged, e.g. 0.1 for 10%.
+        max_tokens: Capacity of the budget, the budget starts full.
+        window_size: Number of the recent latencies the percentile is
+            computed from.
+        min_samples: Minimum number of latencies to use the percentile.
+    """
+
+    def __init__(
+        self,
+        delay: Optional[float] = None,
+        percentile: Optional[float] = None,
+        ratio: float = 0.1,
+        max_tokens: float = 10.0,
+        window_size: int = 100,
+        min_samples: int = 20,
+    ):
+        if delay is None and percentile is None:
+            raise MisconfiguredException(
+                "Either delay or percentile must be set"
+            )
+        if delay is not None and delay < 0:
+            raise MisconfiguredException(
+                "delay must be a non-negative number"
+            )
+        if percentile is not None and not 0 < percentile < 1:
+            raise MisconfiguredException("percentile must be in (0, 1)")
+        if ratio < 0 or max_tokens < 1:
+            raise MisconfiguredException(
+                "ratio must be non-negative and max_tokens at least 1"
+            )
+        if window_size < 1 or min_samples < 1:
+            raise MisconfiguredException(
+                "window_size and min_samples must be positive numbers"
+            )
+        self._delay = delay
+        self._percentile = percentile
+        self._ratio = ratio
+        self._max_tokens = max_tokens
+        self._tokens = max_tokens
+        self._min_samples = min(min_samples, window_size)
+        self._latencies: Deque[float] = collections.deque(maxlen=window_size)
+        self._lock = threading.Lock()
+
+    @property
+    def tokens(self) -> float:
+        return self._tokens
+
+    def get_delay(self) -> Optional[float]:
+        """
+        Delay before the hedged request, None if the call can't be hedged.
+        It also deposits the share of the call into the budget.
+        """
+        with self._lock:
+            self._tokens = min(self._tokens + self._ratio, self._max_tokens)
+            if (
+                self._percentile is not None
+                and len(self._latencies) >= self._min_samples
+            ):
+                latencies = sorted(self._latencies)
+                return latencies[int(self._percentile * (len(latencies) - 1))]
+            return self._delay
+
+    def withdraw(self) -> bool:
+        """Withdraw a token for the hedged request, False if spent."""
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+    def record(self, latency: float) -> None:
+        """Record the latency of the response."""
+        if self._percentile is None:
+            return
+        with self._lock:
+            self._latencies.append(latency)
+
+
+__all__ = ["Hedging"]
@@ -0,0 +1,716 @@
+import abc
+import calendar
+import dataclasses
+import email.utils
+import hashlib
+import itertools
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import httpx
+
+from .auth import Auth
+from .dependencies import Location
+from .exceptions import MisconfiguredException
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+_DIRECTIVE = re.compile(r'([\w-]+)\s*(?:=\s*("[^"]*"|[^,\s]*))?')
+
+
+def parse_cache_control(value: Optional[str]) -> Dict[str, Optional[str]]:
+    """Parse Cache-Control header into the directives and their values."""
+    if not value:
+        return {}
+    return {
+        name.lower(): argument.strip('"') if argument else None
+        for name, argument in _DIRECTIVE.findall(value)
+    }
+
+
+def _parse_seconds(value: Optional[str]) -> Optional[int]:
+    """Parse delta-seconds of the directive, None if it's invalid."""
+    try:
+        return max(int(value), 0) if value is not None else None
+    except ValueError:
+        return None
+
+
+def _parse_date(value: Optional[str]) -> Optional[float]:
+    """Parse HTTP date into a timestamp, None if it's invalid."""
+    if not value:
+        return None
+    parsed = email.utils.parsedate_tz(value)
+    if parsed is None:
+        return None
+    return float(calendar.timegm(parsed[:9]) - (parsed[9] or 0))
+
+
+@dataclasses.dataclass
+class CachedResponse:
+    """
+    Response stored in the HTTP cache.
+
+    Parameters:
+        status_code: The status code of the response.
+        headers: The headers of the response.
+        content: The raw body of the response.
+        request_time: The time the request was sent at.
+        response_time: The time the response was received at.
+        vary: The request headers selected by the Vary header.
+        parsed: The return type and the parsed response of the last call.
+            It's kept in memory only, storages that serialize the
+            response drop it.
+    """
+
+    status_code: int
+    headers: List[Tuple[str, str]]
+    content: bytes
+    request_time: float
+    response_time: float
+    vary: Dict[str, Optional[str]] = dataclasses.field(default_factory=dict)
+    parsed: Optional[Tuple[Any, Any]] = dataclasses.field(
+        default=None, compare=False, repr=False
+    )
+
+    @property
+    def size(self) -> int:
+        """Approximate size of the response in bytes."""
+        return len(self.content) + sum(
+            len(name) + len(value) for name, value in self.headers
+        )
+
+    @property
+    def httpx_headers(self) -> httpx.Headers:
+        return httpx.Headers(self.headers)
+
+    def to_httpx_response(self, request: httpx.Request) -> httpx.Response:
+        """Build httpx.Response of the stored response."""
+        return httpx.Response(
+            self.status_code,
+            headers=self.headers,
+            content=self.content,
+            request=request,
+        )
+
+    def dump_metadata(self) -> str:
+        """Serialize everything but the body to JSON."""
+        return json.dumps(
+            {
+                "status_code": self.status_code,
+                "headers": self.headers,
+                "request_time": self.request_time,
+                "response_time": self.response_time,
+                "vary": self.vary,
+            }
+        )
+
+    @classmethod
+    def load(
+        cls, metadata: Union[str, bytes], content: bytes
+    ) -> "CachedResponse":
+        """Build the response of the JSON metadata and the body."""
+        values = json.loads(metadata)
+        return cls(
+            status_code=values["status_code"],
+            headers=[tuple(header) for header in values["headers"]],
+            content=content,
+            request_time=values["request_time"],
+            response_time=values["response_time"],
+            vary=values["vary"],
+        )
+
+    def dumps(self) -> bytes:
+        """Serialize the response: JSON metadata line and the raw body."""
+        return self.dump_metadata().encode() + b"\n" + self.content
+
+    @classmethod
+    def loads(cls, data: bytes) -> "CachedResponse":
+        """Deserialize the response serialized with `dumps`."""
+        metadata, _, content = data.partition(b"\n")
+        return cls.load(metadata, content)
+
+
+class CacheStorage(abc.ABC):
+    """
+    Storage of the HTTP cache. Implementations must be thread-safe.
+    Storages doing blocking I/O set `blocking`, async calls use them from
+    a worker thread, so the event loop isn't blocked.
+    """
+
+    blocking = False
+
+    @abc.abstractmethod
+    def get(self, key: str) -> Optional[CachedResponse]:
+        """Get the stored response, None if it's missing."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def set(self, key: str, response: CachedResponse) -> None:
+        """Store the response."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def delete(self, key: str) -> None:
+        """Delete the stored response, if any."""
+        raise NotImplementedError
+
+
+class MemoryStorage(CacheStorage):
+    """
+    Storage in the memory of the process. The least recently used
+    responses are evicted when the size of the stored responses exceeds
+    `max_bytes`. Responses are kept as is, with the parsed responses.
+
+    Parameters:
+        max_bytes: Maximum size of the stored responses.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        if max_bytes < 1:
+            raise MisconfiguredException("max_bytes must be a positive number")
+        self._max_bytes = max_bytes
+        self._size = 0
+        self._responses: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def size(self) -> int:
+        """Size of the stored responses in bytes."""
+        return self._size
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        with self._lock:
+            response = self._responses.get(key)
+            if response is not None:
+                self._responses.move_to_end(key)
+            return response
+
+    def set(self, key: str, response: CachedResponse) -> None:
+        with self._lock:
+            old = self._responses.pop(key, None)
+            if old is not None:
+                self._size -= old.size
+            if response.size > self._max_bytes:
+                return
+            self._responses[key] = response
+            self._size += response.size
+            while self._size > self._max_bytes:
+                _, evicted = self._responses.popitem(last=False)
+                self._size -= evicted.size
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            response = self._responses.pop(key, None)
+            if response is not None:
+                self._size -= response.size
+
+
+class FileStorage(CacheStorage):
+    """
+    Storage in the directory, a file per response. Files are replaced
+    atomically, so the directory can be shared by several processes.
+    The parsed responses are not stored, they are parsed again.
+
+    Parameters:
+        directory: The directory of the files, it's created if missing.
+    """
+
+    blocking = True
+
+    def __init__(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        self._directory = directory
+
+    def _path(self, key: str) -> str:
+        name = hashlib.sha256(key.encode()).hexdigest()
+        return os.path.join(self._directory, name)
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        try:
+            with open(self._path(key), "rb") as file:
+                return CachedResponse.loads(file.read())
+        except FileNotFoundError:
+            return None
+        except (ValueError, KeyError):
+            # Corrupted file, it's replaced by the next response
+            return None
+
+    def set(self, key: str, response: CachedResponse) -> None:
+        fd, tmp_path = tempfile.mkstemp(dir=self._directory)
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(response.dumps())
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def delete(self, key: str) -> None:
+        try:
+            os.unlink(self._path(key))
+        except FileNotFoundError:
+            pass
+
+
+class SQLiteStorage(CacheStorage):
+    """
+    Storage in the SQLite database, it survives the restarts of the process
+    and is shared by the processes of the machine. The responses are keyed
+    by the fingerprint of the request, the raw body and the headers are
+    stored, the parsed responses are not.
+
+    The least recently used responses are evicted when the size of the
+    stored responses exceeds `max_bytes`.
+
+    Parameters:
+        path: Path to the database file, it's created if missing.
+        max_bytes: Maximum size of the stored responses.
+        timeout: Seconds to wait for the lock of another process.
+    """
+
+    # The last access time is written at most once per this many seconds,
+    # so the reads of hot responses don't turn into writes
+    ACCESS_RESOLUTION = 60.0
+
+    blocking = True
+
+    _SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS responses ("
+        "fingerprint BLOB PRIMARY KEY, metadata TEXT NOT NULL, "
+        "content BLOB NOT NULL, size INTEGER NOT NULL, "
+        "accessed REAL NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS responses_accessed "
+        "ON responses (accessed)",
+        # The running total of the sizes, kept by the triggers, so the
+        # writes don't sum up the table
+        "CREATE TABLE IF NOT EXISTS stats ("
+        "id INTEGER PRIMARY KEY CHECK (id = 0), size INTEGER NOT NULL)",
+        "INSERT OR IGNORE INTO stats "
+        "SELECT 0, COALESCE(SUM(size), 0) FROM responses",
+        "CREATE TRIGGER IF NOT EXISTS responses_insert "
+        "AFTER INSERT ON responses BEGIN "
+        "UPDATE stats SET size = size + NEW.size WHERE id = 0; END",
+        "CREATE TRIGGER IF NOT EXISTS responses_delete "
+        "AFTER DELETE ON responses BEGIN "
+        "UPDATE stats SET size = size - OLD.size WHERE id = 0; END",
+    )
+
+    def __init__(
+        self,
+        path: str,
+        max_bytes: int = 1024 * 1024 * 1024,
+        timeout: float = 5.0,
+    ):
+        if max_bytes < 1:
+            raise MisconfiguredException("max_bytes must be a positive number")
+        self._path = path
+        self._max_bytes = max_bytes
+        self._timeout = timeout
+        # sqlite3 connections can't be shared by threads and processes,
+        # every thread of every process opens its own
+        self._local = threading.local()
+        connection = self._connect()
+        connection.execute("PRAGMA journal_mode=WAL")
+        # The processes opening the database create the schema one by one
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            for statement in self._SCHEMA:
+                connection.execute(statement)
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(
+                self._path,
+                timeout=self._timeout,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    @staticmethod
+    def fingerprint(key: str) -> bytes:
+        """Fingerprint of the request key."""
+        return hashlib.sha256(key.encode()).digest()
+
+    @property
+    def size(self) -> int:
+        """Size of the stored responses in bytes."""
+        return self._size(self._connect())
+
+    @staticmethod
+    def _size(connection: sqlite3.Connection) -> int:
+        (size,) = connection.execute(
+            "SELECT size FROM stats WHERE id = 0"
+        ).fetchone()
+        return size
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        fingerprint = self.fingerprint(key)
+        now = time.time()
+        connection = self._connect()
+        row = connection.execute(
+            "SELECT metadata, content, accessed FROM responses "
+            "WHERE fingerprint = ?",
+            (fingerprint,),
+        ).fetchone()
+        if row is None:
+            return None
+        metadata, content, accessed = row
+        if now - accessed > self.ACCESS_RESOLUTION:
+            connection.execute(
+                "UPDATE responses SET accessed = ? WHERE fingerprint = ?",
+                (now, fingerprint),
+            )
+        try:
+            return CachedResponse.load(metadata, content)
+        except (ValueError, KeyError):
+            # Corrupted row, it's replaced by the next response
+            return None
+
+    def set(self, key: str, response: CachedResponse) -> None:
+        fingerprint = self.fingerprint(key)
+        size = response.size
+        connection = self._connect()
+        # The lock is taken at once, the size can't change meanwhile
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.execute(
+                "DELETE FROM responses WHERE fingerprint = ?",
+                (fingerprint,),
+            )
+            if size <= self._max_bytes:
+                connection.execute(
+                    "INSERT INTO responses VALUES (?, ?, ?, ?, ?)",
+                    (
+                        fingerprint,
+                        response.dump_metadata(),
+                        response.content,
+                        size,
+                        time.time(),
+                    ),
+                )
+                self._evict(connection)
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+    def _evict(self, connection: sqlite3.Connection) -> None:
+        """Evict the least recently used responses above `max_bytes`."""
+        total = self._size(connection)
+        if total <= self._max_bytes:
+            return
+        evicted = []
+        for fingerprint, size in connection.execute(
+            "SELECT fingerprint, size FROM responses ORDER BY accessed"
+        ):
+            if total <= self._max_bytes:
+                break
+            evicted.append((fingerprint,))
+            total -= size
+        connection.executemany(
+            "DELETE FROM responses WHERE fingerprint = ?", evicted
+        )
+
+    def delete(self, key: str) -> None:
+        connection = self._connect()
+        connection.execute(
+            "DELETE FROM responses WHERE fingerprint = ?",
+            (self.fingerprint(key),),
+        )
+
+    def close(self) -> None:
+        """Close the connection of the current thread."""
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+
+class HttpCache:
+    """
+    Private HTTP cache of the responses of GET requests, following
+    RFC 9111. Responses are stored if they are explicitly fresh
+    (Cache-Control max-age or Expires) or can be validated (ETag or
+    Last-Modified), unless `no-store` is set or they Vary by `*`.
+
+    Fresh responses are served without a request. Stale responses are
+    validated with a conditional request (If-None-Match and
+    If-Modified-Since), 304 Not Modified response freshens the stored
+    response and returns it. Successful unsafe requests invalidate the
+    stored response of the URL.
+
+    Responses are kept apart by the credentials of the request: the
+    Authorization, Proxy-Authorization and Cookie headers, the header of
+    the declarativex auth, and the httpx auth instance. The cache can be
+    shared by clients with different credentials, a response is never
+    served to the requests of other credentials.
+
+    Parameters:
+        storage: Storage of the responses, in memory by default.
+    """
+
+    CACHEABLE_STATUS_CODES = frozenset(
+        {200, 203, 204, 300, 301, 308, 404, 405, 410, 414, 501}
+    )
+    # Headers of 304 response that must not update the stored response
+    _NOT_UPDATED_HEADERS = frozenset(
+        {"content-length", "content-encoding", "transfer-encoding"}
+    )
+
+    CREDENTIAL_HEADERS = ("authorization", "proxy-authorization", "cookie")
+
+    def __init__(self, storage: Optional[CacheStorage] = None):
+        self.storage = storage or MemoryStorage()
+        # httpx auth adds the credentials when the request is sent, the
+        # instances are told apart by a number that is never reused
+        self._auth_ids: weakref.WeakKeyDictionary[httpx.Auth, int] = (
+            weakref.WeakKeyDictionary()
+        )
+        self._auth_counter = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _credentials(self, request: httpx.Request, auth: Any) -> List[str]:
+        names = list(self.CREDENTIAL_HEADERS)
+        if isinstance(auth, Auth) and auth.location == Location.headers:
+            names.append(auth.key.lower())
+        credentials = [
+            f"{name}={value}"
+            for name in names
+            for value in request.headers.get_list(name)
+        ]
+        if isinstance(auth, httpx.Auth):
+            with self._lock:
+                auth_id = self._auth_ids.get(auth)
+                if auth_id is None:
+                    auth_id = self._auth_ids[auth] = next(self._auth_counter)
+            credentials.append(f"httpx-auth={auth_id}")
+        return credentials
+
+    def key(self, request: httpx.Request, auth: Any = None) -> str:
+        """
+        Key of the stored response of the request: the URL, and the hash
+        of the credentials of the request if it has any.
+        """
+        credentials = self._credentials(request, auth)
+        if not credentials:
+            return str(request.url)
+        digest = hashlib.sha256("\n".join(credentials).encode()).hexdigest()
+        return f"{request.url} {digest}"
+
+    @staticmethod
+    def _vary(
+        response_headers: httpx.Headers, request: httpx.Request
+    ) -> Optional[Dict[str, Optional[str]]]:
+        """Request headers selected by Vary, None if it's `*`."""
+        names = [
+            name.strip().lower()
+            for value in response_headers.get_list("vary")
+            for name in value.split(",")
+            if name.strip()
+        ]
+        if "*" in names:
+            return None
+        return {name: request.headers.get(name) for name in names}
+
+    def lookup(
+        self, request: httpx.Request, auth: Any = None
+    ) -> Optional[CachedResponse]:
+        """
+        Get the stored response that can be used for the request.
+        `auth` is the auth of the client the request is sent with.
+        """
+        if request.method != "GET":
+            return None
+        directives = parse_cache_control(request.headers.get("cache-control"))
+        if "no-store" in directives:
+            return None
+        response = self.storage.get(self.key(request, auth))
+        if response is None:
+            return None
+        if any(
+            request.headers.get(name) != value
+            for name, value in response.vary.items()
+        ):
+            return None
+        return response
+
+    @staticmethod
+    def freshness_lifetime(response: CachedResponse) -> float:
+        """Freshness lifetime of the response, section 4.2.1."""
+        headers = response.httpx_headers
+        directives = parse_cache_control(headers.get("cache-control"))
+        max_age = _parse_seconds(directives.get("max-age"))
+        if max_age is not None:
+            return float(max_age)
+        expires = _parse_date(headers.get("expires"))
+        if expires is not None:
+            date = _parse_date(headers.get("date")) or response.response_time
+            return max(expires - date, 0.0)
+        return 0.0
+
+    @staticmethod
+    def current_age(response: CachedResponse, now: float) -> float:
+        """Current age of the response, section 4.2.3."""
+        headers = response.httpx_headers
+        date = _parse_date(headers.get("date")) or response.response_time
+        age = _parse_seconds(headers.get("age")) or 0
+        apparent_age = max(0.0, response.response_time - date)
+        response_delay = response.response_time - response.request_time
+        corrected_initial_age = max(apparent_age, age + response_delay)
+        return corrected_initial_age + now - response.response_time
+
+    def is_fresh(
+        self, response: CachedResponse, request: httpx.Request
+    ) -> bool:
+        """Whether the response can be served without validation."""
+        request_directives = parse_cache_control(
+            request.headers.get("cache-control")
+        )
+        if "no-cache" in request_directives or (
+            request.headers.get("pragma") == "no-cache"
+            and "cache-control" not in request.headers
+        ):
+            return False
+        directives = parse_cache_control(
+            response.httpx_headers.get("cache-control")
+        )
+        if "no-cache" in directives:
+            return False
+        lifetime = self.freshness_lifetime(response)
+        max_age = _parse_seconds(request_directives.get("max-age"))
+        if max_age is not None:
+            lifetime = min(lifetime, max_age)
+        age = self.current_age(response, time.time())
+        age += _parse_seconds(request_directives.get("min-fresh")) or 0
+        return lifetime > age
+
+    @staticmethod
+    def add_validators(
+        request: httpx.Request, response: CachedResponse
+    ) -> None:
+        """Make the request conditional on the stored response."""
+        headers = response.httpx_headers
+        etag = headers.get("etag")
+        if etag and "if-none-match" not in request.headers:
+            request.headers["If-None-Match"] = etag
+        last_modified = headers.get("last-modified")
+        if last_modified and "if-modified-since" not in request.headers:
+            request.headers["If-Modified-Since"] = last_modified
+
+    def _is_storable(
+        self, request: httpx.Request, response: httpx.Response
+    ) -> bool:
+        """Whether the response can be stored, section 3."""
+        if response.status_code not in self.CACHEABLE_STATUS_CODES:
+            return False
+        request_directives = parse_cache_control(
+            request.headers.get("cache-control")
+        )
+        directives = parse_cache_control(response.headers.get("cache-control"))
+        if "no-store" in request_directives or "no-store" in directives:
+            return False
+        return (
+            "max-age" in directives
+            or "expires" in response.headers
+            or "etag" in response.headers
+            or "last-modified" in response.headers
+        )
+
+    def store(
+        self,
+        request: httpx.Request,
+        response: httpx.Response,
+        request_time: float,
+        response_time: float,
+        auth: Any = None,
+    ) -> Optional[CachedResponse]:
+        """
+        Store the response of the request if it's storable. Successful
+        responses of unsafe requests invalidate the stored response.
+        """
+        if request.method != "GET":
+            if request.method not in ("HEAD", "OPTIONS") and (
+                response.status_code < 400
+            ):
+                self.storage.delete(self.key(request, auth))
+            return None
+        if not self._is_storable(request, response):
+            return None
+        vary = self._vary(response.headers, request)
+        if vary is None:
+            return None
+        cached = CachedResponse(
+            status_code=response.status_code,
+            headers=list(response.headers.multi_items()),
+            content=response.content,
+            request_time=request_time,
+            response_time=response_time,
+            vary=vary,
+        )
+        self.storage.set(self.key(request, auth), cached)
+        return cached
+
+    def update(
+        self,
+        request: httpx.Request,
+        cached: CachedResponse,
+        response: httpx.Response,
+        request_time: float,
+        response_time: float,
+        auth: Any = None,
+    ) -> CachedResponse:
+        """
+        Freshen the stored response with the headers of 304 Not Modified
+        response, section 4.3.4. The parsed response is kept.
+        """
+        updated_names = {
+            name.lower()
+            for name in response.headers.keys()
+            if name.lower() not in self._NOT_UPDATED_HEADERS
+        }
+        headers = [
+            (name, value)
+            for name, value in cached.headers
+            if name.lower() not in updated_names
+        ] + [
+            (name, value)
+            for name, value in response.headers.multi_items()
+            if name.lower() in updated_names
+        ]
+        updated = dataclasses.replace(
+            cached,
+            headers=headers,
+            request_time=request_time,
+            response_time=response_time,
+        )
+        updated.parsed = cached.parsed
+        self.storage.set(self.key(request, auth), updated)
+        return updated
+
+
+__all__ = [
+    "CachedResponse",
+    "CacheStorage",
+    "FileStorage",
+    "HttpCache",
+    "MemoryStorage",
+    "parse_cache_control",
+    "SQLiteStorage",
+]
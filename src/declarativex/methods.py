@@ -1,3 +1,4 @@
+import asyncio
 from typing import (
     Any,
     Callable,
@@ -7,30 +8,52 @@ from typing import (
     Sequence,
 )
 
+import httpx
+
 from .auth import Auth
-from .executors import AsyncExecutor, SyncExecutor
+from .codecs import Codec
+from .executors import AsyncExecutor, Executor, SyncExecutor
+from .hedging import Hedging
+from .http_cache import HttpCache
 from .middlewares import Middleware
 from .models import (
     ClientConfiguration,
     EndpointConfiguration,
     GraphQLConfiguration,
 )
-from .utils import Decorator, ProxiesType
+from .plan import EndpointPlan
+from .pool import ClientPool
+from .single_flight import SingleFlight
+from .utils import Decorator, DecoratorArgs, ProxiesType, ReturnType
 
 
 class _Declaration(Decorator):
     client_configuration: ClientConfiguration
     endpoint_configuration: EndpointConfiguration
 
+    def __init__(self) -> None:
+        self._executors: Dict[Callable, Executor] = {}
+
+    def __call__(
+        self, func: Callable[DecoratorArgs, ReturnType]
+    ) -> Callable[DecoratorArgs, ReturnType]:
+        # The plan is compiled once, calls only bind values against it.
+        # The executor is shared by all calls, the call state lives
+        # in the per-call context.
+        executor_cls: Type[Executor] = SyncExecutor
+        if asyncio.iscoroutinefunction(func):
+            executor_cls = AsyncExecutor
+        self._executors[func] = executor_cls(
+            endpoint_configuration=self.endpoint_configuration,
+            plan=EndpointPlan.compile(func, self.endpoint_configuration),
+        )
+        return super().__call__(func)
+
     async def _decorate_async(self, func: Callable, *args, **kwargs):
-        return await AsyncExecutor(
-            endpoint_configuration=self.endpoint_configuration
-        ).execute(func, *args, **kwargs)
+        return await self._executors[func].execute(*args, **kwargs)
 
     def _decorate_sync(self, func: Callable, *args, **kwargs):
-        return SyncExecutor(
-            endpoint_configuration=self.endpoint_configuration
-        ).execute(func, *args, **kwargs)
+        return self._executors[func].execute(*args, **kwargs)
 
 
 class http(_Declaration):
@@ -47,7 +70,13 @@ class http(_Declaration):
         middlewares: Optional[Sequence[Middleware]] = None,
         error_mappings: Optional[Dict[int, Type]] = None,
         proxies: ProxiesType = None,
+        limits: Optional[httpx.Limits] = None,
+        codec: Optional[Codec] = None,
+        hedging: Optional[Hedging] = None,
+        cache: Optional[HttpCache] = None,
+        single_flight: Optional[SingleFlight] = None,
     ):
+        super().__init__()
         self.client_configuration = ClientConfiguration.create(
             base_url=base_url,
             auth=auth,
@@ -56,6 +85,11 @@ class http(_Declaration):
             middlewares=middlewares,
             error_mappings=error_mappings,
             proxies=proxies,
+            limits=limits,
+            codec=codec,
+            cache=cache,
+            single_flight=single_flight,
+            pool=ClientPool(),
         )
 
         self.endpoint_configuration = EndpointConfiguration(
@@ -63,6 +97,7 @@ class http(_Declaration):
             path=path,
             timeout=timeout,
             client_configuration=self.client_configuration,
+            hedging=hedging,
         )
 
 
@@ -79,7 +114,10 @@ class gql(_Declaration):
         middlewares: Optional[Sequence[Middleware]] = None,
         error_mappings: Optional[Dict[int, Type]] = None,
         proxies: ProxiesType = None,
+        limits: Optional[httpx.Limits] = None,
+        codec: Optional[Codec] = None,
     ):
+        super().__init__()
         try:
             from graphql.parser import GraphQLParser  # type: ignore  # noqa: F401, E501
         except ImportError:  # pragma: no cover
@@ -96,6 +134,9 @@ class gql(_Declaration):
             middlewares=middlewares,
             error_mappings=error_mappings,
             proxies=proxies,
+            limits=limits,
+            codec=codec,
+            pool=ClientPool(),
         )
 
         self.endpoint_configuration = EndpointConfiguration(
@@ -1,7 +1,5 @@
 import dataclasses
 import inspect
-import json
-from json import JSONDecodeError
 from typing import (
     Any,
     Callable,
@@ -11,10 +9,9 @@ from typing import (
     Type,
     List,
     get_origin,
-    TypeVar,
-    get_args,
     Union,
     Tuple,
+    TYPE_CHECKING,
 )
 from urllib.parse import urljoin
 
@@ -22,10 +19,16 @@ import httpx
 
 from .auth import Auth
 from .client import BaseClient
-from .compatibility import parse_obj_as
+from .codecs import Codec, DEFAULT_CODEC
+from .compatibility import PYDANTIC_V2, get_type_parser
+from .decoders import compile_decoder
 from .dependencies import RequestModifier
 from .exceptions import MisconfiguredException, UnprocessableEntityException
+from .hedging import Hedging
+from .http_cache import HttpCache
 from .middlewares import Middleware
+from .pool import ClientPool
+from .single_flight import SingleFlight
 from .utils import (
     ReturnType,
     SUPPORTED_METHODS,
@@ -34,7 +37,8 @@ from .utils import (
 )
 from .warnings import warn_list_return_type
 
-T = TypeVar("T")
+if TYPE_CHECKING:  # pragma: no cover
+    from .plan import EndpointPlan
 
 
 @dataclasses.dataclass
@@ -45,6 +49,7 @@ class Response:
 
     Parameters:
         response: The response to wrap.
+        codec: The codec used to decode the response body.
 
     Methods:
         as_type: Convert the response to a specific type.
@@ -52,59 +57,7 @@ class Response:
     """
 
     response: httpx.Response
-
-    @staticmethod
-    def __replace_type_var(type_hint: Type, replacement: Type):
-        """
-        Replace a TypeVar with a concrete type. If the type hint is a list
-        of TypeVars, replace the TypeVar in the list with the concrete type.
-        """
-        if isinstance(type_hint, TypeVar):
-            return replacement
-        if get_origin(type_hint) is list and isinstance(
-            get_args(type_hint)[0], TypeVar
-        ):
-            return List[replacement]  # type: ignore[valid-type]
-        return type_hint
-
-    @classmethod
-    def _dataclass_from_dict(
-        cls, dataclass_type: Type[T], generic: Type, data: Dict[str, Any]
-    ) -> T:
-        """
-        Create a dataclass from a dictionary. This method will recursively
-        create dataclasses for fields that are dataclasses. If the dataclass
-        has a generic type, the generic type will be replaced with the
-        concrete type.
-        """
-        field_types = {
-            f.name: cls.__replace_type_var(f.type, generic)
-            for f in dataclasses.fields(
-                dataclass_type  # type: ignore[arg-type]
-            )
-        }
-
-        # Recursively update fields that are dataclasses
-        for name, field_type in field_types.items():
-            if "__origin__" in dir(field_type) and issubclass(
-                field_type.__origin__, list
-            ):
-                elem_type = field_type.__args__[0]
-                if dataclasses.is_dataclass(elem_type):
-                    data[name] = [
-                        cls._dataclass_from_dict(
-                            elem_type, Any, elem  # type: ignore[arg-type]
-                        )
-                        for elem in data[name]
-                    ]
-            elif dataclasses.is_dataclass(field_type):
-                data[name] = cls._dataclass_from_dict(
-                    field_type, Any, data[name]  # type: ignore[arg-type]
-                )
-
-        return dataclass_type(
-            **{k: v for k, v in data.items() if k in field_types}
-        )
+    codec: Codec = DEFAULT_CODEC
 
     def as_type(self, type_hint: Type):
         """
@@ -120,16 +73,30 @@ class Response:
             # If the type hint is None or inspect.Signature.empty, return the
             # httpx.Response as is.
             return self.response
+        outer_type = get_origin(type_hint)
+        if (
+            PYDANTIC_V2
+            and self.codec.standard_json
+            and not dataclasses.is_dataclass(outer_type)
+        ):
+            try:
+                # Validate the response bytes directly with the cached
+                # parser, skipping the intermediate python object.
+                return get_type_parser(type_hint).parse_json(
+                    self.response.content
+                )
+            except ValueError:
+                # Fall back to the decoding below. It handles list
+                # responses for non-list type hints and invalid JSON.
+                pass
         try:
-            # Try to parse the response as JSON
-            raw_response = json.loads(self.response.text)
-        except JSONDecodeError as e:
+            # Try to parse the response bytes as JSON
+            raw_response = self.codec.decode(self.response.content)
+        except ValueError as e:
             # If the response is not JSON, raise an exception
             raise UnprocessableEntityException(response=self.response) from e
         return_type = type_hint
-        outer_type = get_origin(type_hint)
         is_list = outer_type == list
-        inner_type = get_args(type_hint)[0] if is_list else type_hint
         if isinstance(raw_response, list) and not is_list:
             # If the response is a list, but the type hint is not, show a
             # warning and apply the type hint to the list.
@@ -137,18 +104,12 @@ class Response:
             return_type = List[type_hint]  # type: ignore[valid-type]
 
         if dataclasses.is_dataclass(outer_type):
-            # If the type hint is a dataclass, create a dataclass from the
-            # response.
-            generic_args = get_args(inner_type)
-            generic_type = generic_args[0] if generic_args else None
-            return self._dataclass_from_dict(
-                outer_type,  # type: ignore[arg-type]
-                generic_type,
-                data=raw_response,
-            )
+            # If the type hint is a generic dataclass, create it from the
+            # response with the decoder compiled for the type.
+            return compile_decoder(return_type)(raw_response)
 
         # In other cases, parse the response as the type hint.
-        return parse_obj_as(return_type, raw_response)
+        return get_type_parser(return_type).parse_obj(raw_response)
 
     def as_type_for_func(self, func: Callable[..., ReturnType]) -> ReturnType:
         """
@@ -176,6 +137,15 @@ class ClientConfiguration:
     middlewares: Sequence[Middleware] = dataclasses.field(default_factory=list)
     error_mappings: Dict[int, Type] = dataclasses.field(default_factory=dict)
     proxies: ProxiesType = dataclasses.field(default=None)
+    limits: Optional[httpx.Limits] = None
+    codec: Optional[Codec] = None
+    cache: Optional[HttpCache] = dataclasses.field(default=None, repr=False)
+    single_flight: Optional[SingleFlight] = dataclasses.field(
+        default=None, repr=False
+    )
+    pool: Optional[ClientPool] = dataclasses.field(
+        default=None, compare=False, repr=False
+    )
 
     def __post_init__(self):
         """
@@ -198,6 +168,36 @@ class ClientConfiguration:
         if not isinstance(self.error_mappings, dict):
             # error_mappings should be a dictionary
             raise MisconfiguredException("error_mappings must be a dictionary")
+        if self.limits is not None and not isinstance(
+            self.limits, httpx.Limits
+        ):
+            # limits should be an instance of httpx.Limits
+            raise MisconfiguredException("limits must be httpx.Limits")
+        if self.codec is not None and not isinstance(self.codec, Codec):
+            # codec should be an instance of declarativex.Codec
+            raise MisconfiguredException("codec must be an instance of Codec")
+        if self.cache is not None and not isinstance(self.cache, HttpCache):
+            # cache should be an instance of declarativex.HttpCache
+            raise MisconfiguredException(
+                "cache must be an instance of HttpCache"
+            )
+        if self.single_flight is not None and not isinstance(
+            self.single_flight, SingleFlight
+        ):
+            # single_flight should be an instance of declarativex.SingleFlight
+            raise MisconfiguredException(
+                "single_flight must be an instance of SingleFlight"
+            )
+
+    @property
+    def httpx_auth(self) -> Optional[httpx.Auth]:
+        """
+        Get httpx-compatible auth if it exists. Returns None if auth is
+        a declarativex Auth (which is applied via apply_auth method).
+        """
+        if self.auth and isinstance(self.auth, httpx.Auth):
+            return self.auth
+        return None
 
     @classmethod
     def extract_from_func_kwargs(
@@ -219,6 +219,11 @@ class ClientConfiguration:
                 middlewares=cls_instance.middlewares,
                 error_mappings=cls_instance.error_mappings,
                 proxies=cls_instance.proxies,
+                limits=cls_instance.limits,
+                codec=cls_instance.codec,
+                cache=cls_instance.cache,
+                single_flight=cls_instance.single_flight,
+                pool=getattr(cls_instance, "_pool", None),
             )
         return None
 
@@ -238,6 +243,17 @@ class ClientConfiguration:
             middlewares=other.middlewares,
             error_mappings={**other.error_mappings, **self.error_mappings},
             proxies=merge_proxies(self.proxies, other.proxies),
+            limits=other.limits if other.limits else self.limits,
+            codec=other.codec if other.codec else self.codec,
+            cache=other.cache if other.cache else self.cache,
+            single_flight=(
+                other.single_flight
+                if other.single_flight
+                else self.single_flight
+            ),
+            # Pool of the client instance takes precedence, so the
+            # connections are released when the client is closed.
+            pool=self.pool if self.pool else other.pool,
         )
 
     @classmethod
@@ -267,6 +283,7 @@ class EndpointConfiguration:
     path: str
     timeout: Optional[float] = dataclasses.field(default=5.0)
     gql: Optional[GraphQLConfiguration] = None
+    hedging: Optional[Hedging] = None
 
     @property
     def url_template(self):
@@ -292,6 +309,11 @@ class EndpointConfiguration:
             raise MisconfiguredException(
                 "timeout must be a non-negative number"
             )
+        if self.hedging is not None and self.method != "GET":
+            # Hedged requests are sent twice, only GET is safe to repeat
+            raise MisconfiguredException(
+                "hedging can be used with GET endpoints only"
+            )
 
 
 @dataclasses.dataclass
@@ -316,46 +338,51 @@ class RawRequest:
         str, Union[bytes, Tuple[str, bytes], Tuple[str, bytes, str]]
     ] = dataclasses.field(default_factory=dict)
     timeout: Optional[float] = None
+    codec: Codec = DEFAULT_CODEC
     _gql: Optional[GraphQLConfiguration] = None
 
     @classmethod
     def initialize(
         cls,
         endpoint_configuration: EndpointConfiguration,
+        client_configuration: Optional[ClientConfiguration] = None,
     ) -> "RawRequest":
         """
         Initialize a request from an endpoint configuration. The request
         will be initialized with the default query parameters and headers
-        of the client configuration.
+        of the client configuration. If the client configuration is not
+        given, the one of the endpoint configuration is used.
         """
-        q = endpoint_configuration.client_configuration.default_query_params
-        h = endpoint_configuration.client_configuration.default_headers
-        a = endpoint_configuration.client_configuration.auth
+        config = (
+            client_configuration or endpoint_configuration.client_configuration
+        )
         request = RawRequest(
             method=endpoint_configuration.method,
-            url_template=endpoint_configuration.url_template,
-            query_params=q,
-            headers=h,
+            url_template=urljoin(
+                config.base_url or "", endpoint_configuration.path
+            ),
+            # Copied, the request is modified by dependencies and auth
+            query_params=dict(config.default_query_params),
+            headers=dict(config.default_headers),
+            codec=config.codec or DEFAULT_CODEC,
             _gql=endpoint_configuration.gql,
         )
+        a = config.auth
         # Only apply auth if it's a declarativex Auth (has apply_auth method)
         # httpx.Auth will be passed directly to httpx.Client
         if a and hasattr(a, "apply_auth"):
             request = a.apply_auth(request)
         return request
 
-    def prepare(
-        self,
-        func: Callable,
-        gql: Optional[GraphQLConfiguration] = None,
-        **values,
-    ) -> "RawRequest":
+    def prepare(self, plan: "EndpointPlan", **values) -> "RawRequest":
         """
-        Prepare the request with a function and arguments. The function
-        signature is used to modify the request before it is sent.
+        Prepare the request with a compiled endpoint plan and arguments.
+        The plan is used to modify the request before it is sent.
         """
         return RequestModifier.prepare_request(
-            request=self, func=func, gql=gql, **values
+            request=self,
+            plan=plan.for_url_template(self.url_template),
+            **values,
         )
 
     def url(self):
@@ -369,13 +396,22 @@ class RawRequest:
                 _json["variables"] = self.json
         else:
             _json = self.json
+        headers = httpx.Headers(self.headers)
+        content = None
+        if _json and not self.data and not self.files:
+            # Pre-serialize the JSON body with the codec, httpx would
+            # use the json module of the standard library otherwise.
+            content = self.codec.encode(_json)
+            if "content-type" not in headers:
+                headers["content-type"] = self.codec.content_type
         return httpx.Request(
             method=self.method,
             url=self.url(),
             params=self.query_params if self.query_params else None,
-            headers=self.headers if self.headers else None,
+            headers=headers,
             cookies=self.cookies if self.cookies else None,
-            json=_json if _json else None,
+            content=content,
+            json=_json if _json and content is None else None,
             data=self.data if self.data else None,
             files=self.files if self.files else None,
         )
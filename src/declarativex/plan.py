@@ -0,0 +1,260 @@
+import asyncio
+import copy
+import dataclasses
+import inspect
+from string import Formatter
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    FrozenSet,
+    Optional,
+    Tuple,
+    get_args,
+)
+
+from .dependencies import Dependency, JsonField, Path, Query
+from .exceptions import AnnotationException, MisconfiguredException
+from .streaming import StreamType
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .models import EndpointConfiguration
+
+MAX_URL_TEMPLATE_PLANS = 128
+
+
+@dataclasses.dataclass(frozen=True)
+class ParameterPlan:
+    """
+    Compiled parameter of the declared function.
+
+    Parameters:
+        name: The name of the parameter.
+        default: The default value of the parameter.
+        dependency: The dependency with resolved field name and type hint.
+        annotated: Whether the dependency is taken from the annotation,
+            not inferred from the URL template.
+    """
+
+    name: str
+    default: Any
+    dependency: Dependency
+    annotated: bool = True
+
+    @property
+    def location(self):
+        """The location of the request the parameter is applied to."""
+        return self.dependency.location
+
+    @property
+    def type_hint(self):
+        """The type hint of the parameter."""
+        return self.dependency.type_hint
+
+
+@dataclasses.dataclass(frozen=True)
+class EndpointPlan:
+    """
+    Endpoint plan compiled once, when the declaration decorator is applied.
+    It holds everything that can be resolved from the function signature,
+    so the per-call path only binds the values against it.
+
+    Parameters:
+        parameter_names: Names of all parameters in positional order.
+        parameters: Compiled parameters, without self and cls.
+        url_template_variables: Variables of the URL template or GQL query.
+        return_type: The return annotation of the function.
+        stream: The stream type, if the function returns an iterator.
+        error: Misconfiguration found during compilation. It is raised
+            on call, to keep the error close to the place it affects.
+        is_gql: Whether the variables are taken from the GQL query.
+    """
+
+    parameter_names: Tuple[str, ...]
+    parameters: Tuple[ParameterPlan, ...]
+    url_template_variables: FrozenSet[str]
+    return_type: Any
+    stream: Optional[StreamType] = None
+    error: Optional[MisconfiguredException] = None
+    is_gql: bool = False
+    # Plans for the URL templates with the base URL of the client, which
+    # is only known on call
+    _url_template_plans: Dict[str, "EndpointPlan"] = dataclasses.field(
+        default_factory=dict, init=False, repr=False, compare=False
+    )
+
+    @staticmethod
+    def _extract_variables_from_url_template(
+        url_template: str,
+    ) -> FrozenSet[str]:
+        """
+        Extract variables from a URL template.
+        :param url_template: The URL template.
+        :return: The variables in the URL template.
+        """
+        return frozenset(
+            field[1] for field in Formatter().parse(url_template) if field[1]
+        )
+
+    @staticmethod
+    def _resolve_dependency(
+        name: str,
+        annotation: Any,
+        url_template_variables: FrozenSet[str],
+        is_gql: bool,
+    ) -> Dependency:
+        """
+        Resolve the dependency of the parameter from its annotation.
+        Dependencies taken from Annotated metadata are copied, so the
+        same instance can be safely shared between parameters.
+        """
+        if hasattr(annotation, "__metadata__"):
+            # Extracting the type hint and the dependency from the
+            # Annotated type.
+            type_hint, dependency = get_args(annotation)
+            if isinstance(dependency, Dependency):
+                dependency = copy.copy(dependency)
+            elif inspect.isclass(dependency) and issubclass(
+                dependency, Dependency
+            ):
+                # If the dependency is a class, we instantiate it.
+                dependency = dependency()
+            else:
+                # If the dependency is not an instance of Dependency,
+                # we raise an AnnotationException.
+                raise AnnotationException(annotation)
+        elif name in url_template_variables:
+            # If the parameter is in the URL template and not annotated,
+            # we assume it is a Path dependency.
+            dependency = JsonField() if is_gql else Path()
+            type_hint = annotation
+        else:
+            # If the parameter is not annotated and not in the URL
+            # template, we assume it is a Query dependency.
+            dependency = Query()
+            type_hint = annotation
+        dependency.type_hint = type_hint
+        dependency.field_name = name
+        return dependency
+
+    @classmethod
+    def compile(
+        cls,
+        func: Callable,
+        endpoint_configuration: "EndpointConfiguration",
+    ) -> "EndpointPlan":
+        """
+        Compile the plan of the function for the endpoint configuration.
+        """
+        signature = inspect.signature(func)
+        gql = endpoint_configuration.gql
+        if gql:
+            from .graphql import extract_variables_from_gql_query
+
+            url_template_variables = frozenset(
+                extract_variables_from_gql_query(gql.query)
+            )
+        else:
+            url_template_variables = cls._extract_variables_from_url_template(
+                endpoint_configuration.url_template
+            )
+
+        parameters = []
+        error = None
+        for name, parameter in signature.parameters.items():
+            if name in ["self", "cls"]:
+                # We don't need the self or cls parameter.
+                continue
+            try:
+                dependency = cls._resolve_dependency(
+                    name=name,
+                    annotation=func.__annotations__.get(name, None),
+                    url_template_variables=url_template_variables,
+                    is_gql=bool(gql),
+                )
+                dependency.is_available_for_method(
+                    endpoint_configuration.method
+                )
+            except MisconfiguredException as exc:
+                error = exc
+                break
+            parameters.append(
+                ParameterPlan(
+                    name=name,
+                    default=parameter.default,
+                    dependency=dependency,
+                    annotated=hasattr(
+                        func.__annotations__.get(name, None), "__metadata__"
+                    ),
+                )
+            )
+
+        is_async = asyncio.iscoroutinefunction(func)
+        stream = StreamType.from_return_type(signature.return_annotation)
+        if stream and stream.is_async != is_async:
+            error = error or MisconfiguredException(
+                "Use Iterator return type with sync functions "
+                "and AsyncIterator with async functions"
+            )
+        if endpoint_configuration.hedging and not is_async:
+            error = error or MisconfiguredException(
+                "hedging can be used with async functions only"
+            )
+
+        return cls(
+            parameter_names=tuple(signature.parameters.keys()),
+            parameters=tuple(parameters),
+            url_template_variables=url_template_variables,
+            return_type=signature.return_annotation,
+            stream=stream,
+            error=error,
+            is_gql=bool(gql),
+        )
+
+    def for_url_template(self, url_template: str) -> "EndpointPlan":
+        """
+        Plan for the URL template of the call. The base URL of the client
+        may have variables of its own, the parameters named after them are
+        path parameters unless annotated otherwise. The plans are cached
+        per URL template.
+        """
+        if self.is_gql:
+            return self
+        plan = self._url_template_plans.get(url_template)
+        if plan is not None:
+            return plan
+        variables = self._extract_variables_from_url_template(url_template)
+        plan = self
+        if variables - self.url_template_variables:
+            parameters = tuple(
+                ParameterPlan(
+                    name=parameter.name,
+                    default=parameter.default,
+                    dependency=self._resolve_dependency(
+                        name=parameter.name,
+                        annotation=parameter.type_hint,
+                        url_template_variables=variables,
+                        is_gql=False,
+                    ),
+                    annotated=False,
+                )
+                if not parameter.annotated and parameter.name in variables
+                else parameter
+                for parameter in self.parameters
+            )
+            plan = dataclasses.replace(
+                self, parameters=parameters, url_template_variables=variables
+            )
+        if len(self._url_template_plans) >= MAX_URL_TEMPLATE_PLANS:
+            self._url_template_plans.clear()
+        self._url_template_plans[url_template] = plan
+        return plan
+
+    def check(self) -> None:
+        """Raise the misconfiguration found during compilation, if any."""
+        if self.error is not None:
+            raise self.error.with_traceback(None)
+
+
+__all__ = ["ParameterPlan", "EndpointPlan"]
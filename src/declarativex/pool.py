@@ -0,0 +1,148 @@
+import asyncio
+import threading
+import weakref
+from typing import TYPE_CHECKING, Any, Dict, Hashable
+
+import httpx
+
+from .warnings import warn_async_clients_not_closed
+
+# Check if h2 is installed to enable http2 support
+try:  # pragma: no cover
+    import h2  # type: ignore[import]
+except ImportError:  # pragma: no cover
+    h2 = None
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .models import ClientConfiguration
+
+
+class ClientPool:
+    """
+    Pool of long-lived httpx clients. Clients are created lazily on the
+    first request and reused by every following call, so connections
+    are kept alive between requests.
+
+    Clients are keyed by the transport-related part of the client
+    configuration: base URL, proxies, httpx auth, http2 flag and limits.
+    Async clients are bound to the event loop they were created in,
+    that's why they are stored per running loop.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._sync_clients: Dict[Hashable, httpx.Client] = {}
+        self._async_clients: weakref.WeakKeyDictionary[
+            asyncio.AbstractEventLoop, Dict[Hashable, httpx.AsyncClient]
+        ] = weakref.WeakKeyDictionary()
+
+    @staticmethod
+    def _key(configuration: "ClientConfiguration") -> Hashable:
+        """
+        Build the key of the client for the configuration. httpx.Limits
+        is not hashable, so it is replaced with the tuple of its values.
+        """
+        limits = configuration.limits
+        return (
+            configuration.base_url,
+            configuration.proxies,
+            configuration.httpx_auth,
+            bool(h2),
+            (
+                limits.max_connections,
+                limits.max_keepalive_connections,
+                limits.keepalive_expiry,
+            )
+            if limits
+            else None,
+        )
+
+    @staticmethod
+    def _client_kwargs(configuration: "ClientConfiguration") -> Dict[str, Any]:
+        """Arguments used to instantiate httpx.Client/httpx.AsyncClient."""
+        kwargs: Dict[str, Any] = {
+            "follow_redirects": True,
+            "http2": bool(h2),
+            "proxy": configuration.proxies,
+            "auth": configuration.httpx_auth,
+        }
+        if configuration.limits:
+            kwargs["limits"] = configuration.limits
+        return kwargs
+
+    def get_sync_client(
+        self, configuration: "ClientConfiguration"
+    ) -> httpx.Client:
+        """
+        Get the sync client for the configuration. The client is created
+        if it doesn't exist yet.
+        """
+        key = self._key(configuration)
+        client = self._sync_clients.get(key)
+        if client is not None:
+            return client
+        with self._lock:
+            # Double-checked, another thread could create it meanwhile
+            client = self._sync_clients.get(key)
+            if client is None:
+                client = httpx.Client(**self._client_kwargs(configuration))
+                self._sync_clients[key] = client
+        return client
+
+    def get_async_client(
+        self, configuration: "ClientConfiguration"
+    ) -> httpx.AsyncClient:
+        """
+        Get the async client for the configuration bound to the running
+        event loop. The client is created if it doesn't exist yet.
+        """
+        loop = asyncio.get_running_loop()
+        key = self._key(configuration)
+        with self._lock:
+            clients = self._async_clients.setdefault(loop, {})
+            client = clients.get(key)
+            if client is None:
+                client = httpx.AsyncClient(
+                    **self._client_kwargs(configuration)
+                )
+                clients[key] = client
+        return client
+
+    def close(self) -> None:
+        """
+        Close all sync clients. Async clients can't be closed without
+        an event loop: the open ones are kept, so `aclose` can still close
+        them, and a warning is issued. The clients of the closed event
+        loops are released.
+        """
+        with self._lock:
+            sync_clients = list(self._sync_clients.values())
+            self._sync_clients.clear()
+            open_clients = 0
+            for loop, clients in list(self._async_clients.items()):
+                if loop.is_closed():
+                    del self._async_clients[loop]
+                    continue
+                open_clients += sum(
+                    not client.is_closed for client in clients.values()
+                )
+        for client in sync_clients:
+            client.close()
+        if open_clients:
+            warn_async_clients_not_closed(open_clients)
+
+    async def aclose(self) -> None:
+        """
+        Close all sync clients and the async clients of the running event
+        loop. Async clients bound to other event loops can't be closed
+        from this loop, they are kept and a warning is issued.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            async_clients = list(self._async_clients.pop(loop, {}).values())
+        for client in async_clients:
+            await client.aclose()
+        self.close()
+
+
+__all__ = ["ClientPool"]
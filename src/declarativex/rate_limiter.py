@@ -1,12 +1,34 @@
+import abc
 import asyncio
+import functools
+import inspect
+import threading
 import time
-from typing import Callable, Union, Awaitable
+from collections import OrderedDict
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Hashable,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
 
-from .exceptions import RateLimitExceeded
+from .deadline import deadline
+from .exceptions import MisconfiguredException, RateLimitExceeded
 from .utils import ReturnType, SupportDecorator
 
 
 class Bucket:
+    """
+    Token bucket of the rate limiter kept in the memory of the process.
+    Subclasses keep the state elsewhere, e.g. to share the bucket
+    between processes, and override `reserve` and `refill`.
+    """
+
     token_fill_rate: float
     last_time_token_added: float
     token_bucket: float
@@ -18,88 +40,287 @@ class Bucket:
         self.token_fill_rate = max_calls / interval
         self.last_time_token_added = 0.0
         self.token_bucket = max_calls
+        self._lock = threading.Lock()
 
     @property
     def max_calls(self):
         return self._max_calls
 
     def refill(self):
-        self.token_bucket = self._max_calls
-        self.last_time_token_added = 0.0
+        with self._lock:
+            self.token_bucket = self._max_calls
+            self.last_time_token_added = 0.0
+
+    def take(
+        self,
+        token_bucket: float,
+        last_time_token_added: float,
+        now: float,
+        reject: bool,
+        max_wait: Optional[float],
+    ) -> Tuple[float, float]:
+        """
+        Take a token from the bucket state. Returns the tokens left in the
+        bucket and how long to wait for the taken token.
+
+        The token is taken in advance, the bucket goes below zero and the
+        next callers wait for the later tokens in the order of arrival.
+        Raises RateLimitExceeded if there is no token and `reject` is set,
+        or if the wait is longer than `max_wait`.
+        """
+        elapsed = max(now - last_time_token_added, 0.0)
+        token_bucket = min(
+            token_bucket + elapsed * self.token_fill_rate, self._max_calls
+        )
+
+        # check if we have to wait for a function call
+        # (min 1 token in order to make a call)
+        left_to_wait = 0.0
+        if token_bucket < 1.0:
+            if reject:
+                raise RateLimitExceeded()
+            left_to_wait = (1 - token_bucket) / self.token_fill_rate
+            if max_wait is not None and max_wait <= left_to_wait:
+                raise RateLimitExceeded()
+        return token_bucket - 1.0, left_to_wait
+
+    def reserve(
+        self, now: float, reject: bool, max_wait: Optional[float] = None
+    ) -> float:
+        """
+        Reserve a token for the call and return how long to wait for it.
+
+        The bucket is updated in a short critical section and the caller
+        waits outside of it, so the calls run concurrently up to the rate.
+        The token is not taken if the call is rejected.
+        """
+        with self._lock:
+            self.token_bucket, left_to_wait = self.take(
+                self.token_bucket,
+                self.last_time_token_added,
+                now,
+                reject,
+                max_wait,
+            )
+            self.last_time_token_added = now
+            return left_to_wait
+
+    async def areserve(
+        self, now: float, reject: bool, max_wait: Optional[float] = None
+    ) -> float:
+        """
+        Reserve a token for the async call. Buckets that do I/O to reserve
+        the token override it, so the event loop is not blocked.
+        """
+        return self.reserve(now, reject, max_wait)
+
+
+class RateLimiterBackend(abc.ABC):
+    """
+    Storage of the token buckets of the rate limiter. The backend decides
+    where the state of the bucket lives and who shares it.
+    """
+
+    @abc.abstractmethod
+    def create_bucket(
+        self, max_calls: int, interval: float, key: str = ""
+    ) -> Bucket:
+        """
+        Create the bucket of the rate limiter. Per-key rate limiters
+        create a bucket for every key, the default bucket has no key.
+        """
+        raise NotImplementedError
+
+
+class MemoryBackend(RateLimiterBackend):
+    """
+    The default backend: the bucket lives in the memory of the process
+    and is shared by its threads and event loops.
+    """
+
+    def create_bucket(
+        self, max_calls: int, interval: float, key: str = ""
+    ) -> Bucket:
+        return Bucket(max_calls, interval)
+
+
+class _Buckets:
+    """
+    Buckets of the keys of the per-key rate limiter, in the order of
+    the last use. Memory is bounded: the least recently used buckets are
+    evicted above `max_keys`, and buckets idle for the interval are full
+    again, so they're evicted without changing the rate. Lookups and
+    evictions are O(1).
+    """
+
+    def __init__(
+        self, create: Callable[[str], Bucket], max_keys: int, interval: float
+    ):
+        self._create = create
+        self._max_keys = max_keys
+        self._interval = interval
+        self._buckets: "OrderedDict[Hashable, Tuple[Bucket, float]]" = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, now: float) -> Bucket:
+        """Get the bucket of the key, it's created if missing."""
+        with self._lock:
+            entry = self._buckets.pop(key, None)
+            bucket = self._create(str(key)) if entry is None else entry[0]
+            expires_at = now + self._interval
+            if entry is not None:
+                expires_at = max(expires_at, entry[1])
+            self._buckets[key] = (bucket, expires_at)
+            while len(self._buckets) > self._max_keys or (
+                next(iter(self._buckets.values()))[1] <= now
+            ):
+                self._buckets.popitem(last=False)
+            return bucket
+
+    def extend(self, key: Hashable, expires_at: float) -> None:
+        """Keep the bucket with the tokens reserved in advance longer."""
+        with self._lock:
+            entry = self._buckets.get(key)
+            if entry is not None and entry[1] < expires_at:
+                self._buckets[key] = (entry[0], expires_at)
+
+    def clear(self) -> List[Bucket]:
+        """Forget all buckets and return them."""
+        with self._lock:
+            buckets = [bucket for bucket, _ in self._buckets.values()]
+            self._buckets.clear()
+            return buckets
+
+
+async def _await_all(awaitables: List[Awaitable]) -> None:
+    for awaitable in awaitables:
+        await awaitable
 
 
 class rate_limiter(SupportDecorator):
-    def __init__(self, max_calls: int, interval: float, reject: bool = False):
-        self._bucket = Bucket(max_calls, interval)
+    """
+    Limit the rate of the calls with the token bucket algorithm.
+
+    Parameters:
+        max_calls: Maximum number of calls per interval.
+        interval: Interval in seconds.
+        reject: Raise RateLimitExceeded instead of waiting for a token.
+        backend: Storage of the bucket, in the memory of the process
+            by default. Use FileBackend to share the bucket between
+            the processes of the machine.
+        key: Name of the argument of the call, or a function of the bound
+            arguments of the call, that gives the key of the bucket.
+            Every key gets its own bucket, e.g. per tenant or API token.
+        max_keys: Maximum number of the buckets of the keys kept
+            in memory, the least recently used are evicted.
+    """
+
+    def __init__(
+        self,
+        max_calls: int,
+        interval: float,
+        reject: bool = False,
+        backend: Optional[RateLimiterBackend] = None,
+        key: Optional[
+            Union[str, Callable[[Dict[str, Any]], Hashable]]
+        ] = None,
+        max_keys: int = 10000,
+    ):
+        if max_keys < 1:
+            raise MisconfiguredException("max_keys must be a positive number")
+        backend = backend or MemoryBackend()
+        self._bucket = backend.create_bucket(max_calls, interval)
         self._reject = reject
-        try:
-            self._loop = asyncio.get_running_loop()
-        except RuntimeError:
-            # No event loop running, create a new one
-            self._loop = asyncio.new_event_loop()
-        self._lock = asyncio.Lock()
+        self._interval = interval
+        self._key = key
+        self._buckets = _Buckets(
+            functools.partial(backend.create_bucket, max_calls, interval),
+            max_keys=max_keys,
+            interval=interval,
+        )
+        self._signatures: Dict[Callable, inspect.Signature] = {}
+
+    def _get_key(self, func: Callable, *args, **kwargs) -> Hashable:
+        """Get the key of the bucket from the bound arguments."""
+        signature = self._signatures.get(func)
+        if signature is None:
+            signature = self._signatures[func] = inspect.signature(func)
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        if callable(self._key):
+            return self._key(bound.arguments)
+        if self._key not in bound.arguments:
+            raise MisconfiguredException(
+                f"rate_limiter key {self._key!r} is not an argument "
+                f"of {func.__name__}"
+            )
+        return bound.arguments[self._key]
+
+    def _get_bucket(self, now: float, func: Callable, *args, **kwargs):
+        if self._key is None:
+            return None, self._bucket
+        key = self._get_key(func, *args, **kwargs)
+        return key, self._buckets.get(key, now)
+
+    def _reserve(self, func: Callable, *args, **kwargs) -> float:
+        """
+        Reserve a token for the call and return how long to wait for it.
+        Sync and async calls share the bucket and the monotonic clock, so
+        one limiter can decorate both kinds of endpoints of the client,
+        and calls from many threads and event loops respect one rate.
+        The call is rejected if the wait can't finish before its deadline.
+        """
+        now = time.monotonic()
+        key, bucket = self._get_bucket(now, func, *args, **kwargs)
+        left_to_wait = bucket.reserve(
+            now, self._reject, max_wait=deadline.remaining()
+        )
+        if key is not None and left_to_wait > 0:
+            self._buckets.extend(key, now + left_to_wait + self._interval)
+        return left_to_wait
+
+    async def _areserve(self, func: Callable, *args, **kwargs) -> float:
+        """Reserve a token for the async call, see `_reserve`."""
+        now = time.monotonic()
+        key, bucket = self._get_bucket(now, func, *args, **kwargs)
+        left_to_wait = await bucket.areserve(
+            now, self._reject, max_wait=deadline.remaining()
+        )
+        if key is not None and left_to_wait > 0:
+            self._buckets.extend(key, now + left_to_wait + self._interval)
+        return left_to_wait
 
     async def _decorate_async(
         self, func: Callable[..., Awaitable[ReturnType]], *args, **kwargs
     ) -> ReturnType:
-        async with self._lock:
-            try:
-                elapsed = (
-                    self._loop.time() - self._bucket.last_time_token_added
-                )
-                self._bucket.token_bucket = min(
-                    self._bucket.token_bucket
-                    + elapsed * self._bucket.token_fill_rate,
-                    self._bucket.max_calls,
-                )
-                self._bucket.last_time_token_added = self._loop.time()
-
-                # check if we have to wait for a function call
-                # (min 1 token in order to make a call)
-                if self._bucket.token_bucket < 1.0:
-                    if self._reject:
-                        raise RateLimitExceeded()
-                    left_to_wait = (
-                        1 - self._bucket.token_bucket
-                    ) / self._bucket.token_fill_rate
-                    await asyncio.sleep(left_to_wait)
-
-                return await func(*args, **kwargs)
-            finally:
-                # for every call we can consume one token,
-                # if the bucket is empty, we have to wait
-                self._bucket.token_bucket -= 1.0
+        left_to_wait = await self._areserve(func, *args, **kwargs)
+        if left_to_wait > 0:
+            await asyncio.sleep(left_to_wait)
+        return await func(*args, **kwargs)
 
     def _decorate_sync(
         self, func: Callable[..., ReturnType], *args, **kwargs
     ) -> ReturnType:
-        try:
-            elapsed = time.perf_counter() - self._bucket.last_time_token_added
-            self._bucket.token_bucket = min(
-                self._bucket.token_bucket
-                + elapsed * self._bucket.token_fill_rate,
-                self._bucket.max_calls,
-            )
-            self._bucket.last_time_token_added = time.perf_counter()
-
-            # check if we have to wait for a function call
-            # (min 1 token in order to make a call)
-            if self._bucket.token_bucket < 1.0:
-                if self._reject:
-                    raise RateLimitExceeded()
-                left_to_wait = (
-                    1 - self._bucket.token_bucket
-                ) / self._bucket.token_fill_rate
-                time.sleep(left_to_wait)
-
-            return func(*args, **kwargs)
-        finally:
-            # for every call we can consume one token,
-            # if the bucket is empty, we have to wait
-            self._bucket.token_bucket -= 1.0
+        left_to_wait = self._reserve(func, *args, **kwargs)
+        if left_to_wait > 0:
+            time.sleep(left_to_wait)
+        return func(*args, **kwargs)
 
     def refill(self):
-        self._bucket.refill()
+        """
+        Refill the bucket and the buckets of the keys. Returns a coroutine
+        to await if the backend refills the buckets asynchronously.
+        """
+        results = [
+            bucket.refill()
+            for bucket in [self._bucket, *self._buckets.clear()]
+        ]
+        awaitables = [res for res in results if inspect.isawaitable(res)]
+        if awaitables:
+            return _await_all(awaitables)
+        return None
 
     def _decorate_class(self, cls: type) -> type:
         cls = super()._decorate_class(cls)
@@ -1,47 +1,208 @@
 import asyncio
+import enum
+import random
+import threading
 import time
-from typing import Callable
+from typing import Callable, Iterator, Optional, Union
 
+from .deadline import deadline
+from .exceptions import HTTPException, MisconfiguredException
 from .utils import SupportDecorator
 
 
+class Jitter(str, enum.Enum):
+    """
+    Jitter strategies of the retry delay. Randomized delays spread the
+    retries of many clients in time, so they don't hit the recovering
+    server all at once.
+
+    - FULL: random delay between 0 and the backoff delay.
+    - EQUAL: half of the backoff delay plus a random part of the other half.
+    - DECORRELATED: random delay between the initial delay and three
+      times the previous one.
+    """
+
+    FULL = "full"
+    EQUAL = "equal"
+    DECORRELATED = "decorrelated"
+
+
+class RetryBudget:
+    """
+    Token bucket that limits retries to a share of the calls. Every call
+    deposits `ratio` tokens and every retry withdraws one, so the retries
+    can't exceed `ratio` of the calls, plus a burst of `max_tokens`.
+
+    The budget is shared by everything decorated with the same retry,
+    e.g. all endpoints of the client class. Pass the same instance to
+    several decorators to share it between them.
+
+    Parameters:
+        ratio: Share of the calls that can be retried, e.g. 0.1 for 10%.
+        max_tokens: Capacity of the bucket, the bucket starts full.
+    """
+
+    def __init__(self, ratio: float = 0.1, max_tokens: float = 10.0):
+        if ratio < 0 or max_tokens < 1:
+            raise MisconfiguredException(
+                "ratio must be non-negative and max_tokens at least 1"
+            )
+        self._ratio = ratio
+        self._max_tokens = max_tokens
+        self._tokens = max_tokens
+        self._lock = threading.Lock()
+
+    @property
+    def tokens(self) -> float:
+        return self._tokens
+
+    def deposit(self) -> None:
+        """Deposit the share of the call."""
+        with self._lock:
+            self._tokens = min(self._tokens + self._ratio, self._max_tokens)
+
+    def withdraw(self) -> bool:
+        """Withdraw a token for the retry, False if the budget is spent."""
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
 class retry(SupportDecorator):
+    """
+    Retry the call when it raises one of the exceptions.
+
+    Parameters:
+        max_retries: Maximum number of retries.
+        exceptions: Exceptions to retry on.
+        delay: Delay before the first retry.
+        backoff_factor: Multiplier of the delay after every retry.
+        jitter: Jitter strategy of the delay, no jitter by default.
+        max_delay: Maximum delay between retries.
+        budget: Retry budget that limits retries to a share of the calls.
+
+    If HTTPException with 429 or 503 status code has Retry-After header,
+    the delay from the header is used instead. The call is not retried
+    if the server asks to wait longer than `max_delay`, or longer than
+    `MAX_RETRY_AFTER` seconds if `max_delay` is not set.
+    """
+
+    MAX_RETRY_AFTER = 60.0
+
     def __init__(
         self,
         max_retries: int,
         exceptions: tuple,
         delay: float = 0.0,
         backoff_factor: float = 1.0,
+        jitter: Optional[Union[Jitter, str]] = None,
+        max_delay: Optional[float] = None,
+        budget: Optional[RetryBudget] = None,
     ):
         self._max_retries = max_retries
         self._delay = delay
         self._backoff_factor = backoff_factor
         self._exceptions = exceptions
+        try:
+            self._jitter = Jitter(jitter) if jitter else None
+        except ValueError as e:
+            raise MisconfiguredException(
+                f"jitter must be one of {[j.value for j in Jitter]}"
+            ) from e
+        if self._jitter is Jitter.DECORRELATED and delay <= 0:
+            # The delays grow from the initial one, zero stays zero
+            raise MisconfiguredException(
+                "delay must be positive with decorrelated jitter"
+            )
+        self._max_delay = max_delay
+        self._budget = budget
+
+    @staticmethod
+    def _can_wait(delay: float) -> bool:
+        """
+        Check that the retry can start before the deadline of the call.
+        Retries that can't make it are skipped.
+        """
+        remaining = deadline.remaining()
+        return remaining is None or remaining > delay
+
+    def _cap(self, delay: float) -> float:
+        if self._max_delay is None:
+            return delay
+        return min(delay, self._max_delay)
+
+    def _backoff(self) -> Iterator[float]:
+        """Delays of the consecutive retries of a single call."""
+        current = previous = self._delay
+        while True:
+            capped = self._cap(current)
+            if self._jitter is Jitter.FULL:
+                yield random.uniform(0, capped)
+            elif self._jitter is Jitter.EQUAL:
+                yield capped / 2 + random.uniform(0, capped / 2)
+            elif self._jitter is Jitter.DECORRELATED:
+                previous = self._cap(random.uniform(self._delay, previous * 3))
+                yield previous
+            else:
+                yield capped
+            current *= self._backoff_factor
+
+    def _next_delay(
+        self, error: Exception, retries: int, backoff: Iterator[float]
+    ) -> Optional[float]:
+        """
+        Get the delay before the next retry. Returns None if the call
+        must not be retried and the error must be raised.
+        """
+        if retries >= self._max_retries:
+            return None
+        delay = next(backoff)
+        retry_after = (
+            error.retry_after if isinstance(error, HTTPException) else None
+        )
+        if retry_after is not None:
+            max_retry_after = (
+                self.MAX_RETRY_AFTER
+                if self._max_delay is None
+                else self._max_delay
+            )
+            if retry_after > max_retry_after:
+                return None
+            delay = retry_after
+        if not self._can_wait(delay):
+            return None
+        if self._budget is not None and not self._budget.withdraw():
+            return None
+        return delay
 
     async def _decorate_async(self, func: Callable, *args, **kwargs):
+        if self._budget is not None:
+            self._budget.deposit()
         retries = 0
-        current_delay = self._delay
-        while retries <= self._max_retries:
+        backoff = self._backoff()
+        while True:
             try:
                 return await func(*args, **kwargs)
             except self._exceptions as e:
-                retries += 1
-                if retries > self._max_retries:
+                delay = self._next_delay(e, retries, backoff)
+                if delay is None:
                     raise e
-                await asyncio.sleep(current_delay)
-                current_delay *= self._backoff_factor
-        return None  # pragma: no cover
+                retries += 1
+                await asyncio.sleep(delay)
 
     def _decorate_sync(self, func: Callable, *args, **kwargs):
+        if self._budget is not None:
+            self._budget.deposit()
         retries = 0
-        current_delay = self._delay
-        while retries <= self._max_retries:
+        backoff = self._backoff()
+        while True:
             try:
                 return func(*args, **kwargs)
             except self._exceptions as e:
-                retries += 1
-                if retries > self._max_retries:
+                delay = self._next_delay(e, retries, backoff)
+                if delay is None:
                     raise e
-                time.sleep(current_delay)
-                current_delay *= self._backoff_factor
-        return None  # pragma: no cover
+                retries += 1
+                time.sleep(delay)
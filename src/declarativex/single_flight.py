@@ -0,0 +1,158 @@
+import asyncio
+import concurrent.futures
+import threading
+import weakref
+from typing import (
+    Awaitable,
+    Callable,
+    Dict,
+    Hashable,
+    Optional,
+    Sequence,
+    TypeVar,
+)
+
+import httpx
+
+from .deadline import deadline
+from .exceptions import TimeoutException
+
+T = TypeVar("T")
+
+COALESCED_METHODS = frozenset({"GET", "HEAD"})
+
+
+class SingleFlight:
+    """
+    Coalescing of the identical requests in flight. While a request is in
+    flight, identical requests don't go to the server, their callers wait
+    for the request and share its parsed result or exception. It spares
+    the server the bursts of identical calls, e.g. when a popular cached
+    value expires.
+
+    Requests are identical if they have the same method, URL with the
+    query and the headers. Only GET and HEAD requests are coalesced.
+    Async calls are coalesced per event loop, sync calls across threads.
+
+    The shared result is the same object for all the callers, don't
+    modify it. Callers keep their deadlines: a caller that can't wait
+    longer fails with TimeoutException, the request isn't cancelled.
+
+    Parameters:
+        headers: Names of the headers that make the requests different,
+            e.g. ["Authorization", "Accept"]. All headers by default.
+    """
+
+    def __init__(self, headers: Optional[Sequence[str]] = None):
+        self._headers = (
+            frozenset(name.lower() for name in headers)
+            if headers is not None
+            else None
+        )
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, concurrent.futures.Future] = {}
+        self._async_calls: weakref.WeakKeyDictionary[
+            asyncio.AbstractEventLoop, Dict[Hashable, asyncio.Future]
+        ] = weakref.WeakKeyDictionary()
+        self._deduplicated = 0
+
+    @property
+    def deduplicated(self) -> int:
+        """Number of the calls that shared the request of another call."""
+        return self._deduplicated
+
+    def key(self, request: httpx.Request) -> Optional[Hashable]:
+        """Key of the identical requests, None if it's not coalesced."""
+        if request.method not in COALESCED_METHODS:
+            return None
+        headers = tuple(
+            sorted(
+                (name.lower(), value)
+                for name, value in request.headers.multi_items()
+                if self._headers is None or name.lower() in self._headers
+            )
+        )
+        return request.method, str(request.url), headers
+
+    def do(self, request: httpx.Request, func: Callable[[], T]) -> T:
+        """
+        Call the function, or wait for the result of the call of the
+        identical request already in flight.
+        """
+        key = self.key(request)
+        if key is None:
+            return func()
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if future is None:
+                future = self._calls[key] = concurrent.futures.Future()
+            else:
+                self._deduplicated += 1
+        if not leader:
+            timeout = deadline.remaining()
+            try:
+                return future.result(timeout=timeout)
+            except concurrent.futures.TimeoutError as e:
+                if future.done():
+                    raise
+                raise TimeoutException(
+                    timeout=timeout or 0.0, request=request
+                ) from e
+        try:
+            result = func()
+        except BaseException as e:
+            self._finish(key, future)
+            future.set_exception(e)
+            raise
+        self._finish(key, future)
+        future.set_result(result)
+        return result
+
+    def _finish(self, key: Hashable, future: concurrent.futures.Future):
+        with self._lock:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+
+    async def ado(
+        self, request: httpx.Request, func: Callable[[], Awaitable[T]]
+    ) -> T:
+        """
+        Await the function, or the result of the call of the identical
+        request already in flight. The request runs in a task of its own,
+        so the callers can be cancelled without failing the others.
+        """
+        key = self.key(request)
+        if key is None:
+            return await func()
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            calls = self._async_calls.setdefault(loop, {})
+            task = calls.get(key)
+            if task is not None:
+                self._deduplicated += 1
+            else:
+                task = calls[key] = asyncio.ensure_future(func())
+
+                def done(task: asyncio.Future, key: Hashable = key) -> None:
+                    with self._lock:
+                        if calls.get(key) is task:
+                            del calls[key]
+                    if not task.cancelled():
+                        # The exception is retrieved by the callers,
+                        # it's not logged if all of them are gone
+                        task.exception()
+
+                task.add_done_callback(done)
+        timeout = deadline.remaining()
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), timeout)
+        except asyncio.TimeoutError as e:
+            if task.done():
+                raise
+            raise TimeoutException(
+                timeout=timeout or 0.0, request=request
+            ) from e
+
+
+__all__ = ["SingleFlight", "COALESCED_METHODS"]
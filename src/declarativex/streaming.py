@@ -0,0 +1,427 @@
+import abc
+import collections.abc
+import dataclasses
+import re
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Iterator,
+    List,
+    Optional,
+    get_args,
+    get_origin,
+)
+
+import httpx
+
+from .codecs import Codec
+from .compatibility import PYDANTIC_V2, get_type_parser
+from .decoders import compile_decoder
+from .exceptions import UnprocessableEntityException
+
+EVENT_STREAM_CONTENT_TYPE = "text/event-stream"
+JSON_LINES_CONTENT_TYPES = frozenset(
+    {
+        "application/x-ndjson",
+        "application/ndjson",
+        "application/jsonl",
+        "application/x-jsonlines",
+        "application/json-lines",
+        "application/json-seq",
+    }
+)
+
+_STRUCTURAL = re.compile(rb'[\[\]{}",]')
+_STRING_END = re.compile(rb'["\\]')
+_NON_WHITESPACE = re.compile(rb"\S")
+_LINE_END = re.compile(rb"\r\n|\r|\n")
+
+_QUOTE, _BACKSLASH, _COMMA = ord('"'), ord("\\"), ord(",")
+_OPEN = (ord("["), ord("{"))
+_CLOSE = (ord("]"), ord("}"))
+
+
+@dataclasses.dataclass(frozen=True)
+class StreamType:
+    """
+    Streaming return type of the declared function. Functions that return
+    Iterator[Model] (or AsyncIterator[Model] for async functions) receive
+    the items of the response one by one, as they arrive.
+
+    Parameters:
+        item_type: The type of the items.
+        is_async: Whether the items are iterated asynchronously.
+    """
+
+    item_type: Any
+    is_async: bool
+
+    @classmethod
+    def from_return_type(cls, return_type: Any) -> Optional["StreamType"]:
+        """
+        Get the stream type of the return type. Returns None if the return
+        type is not a streaming one.
+        """
+        origin = get_origin(return_type) or return_type
+        if origin is collections.abc.Iterator:
+            is_async = False
+        elif origin is collections.abc.AsyncIterator:
+            is_async = True
+        else:
+            return None
+        args = get_args(return_type)
+        return cls(item_type=args[0] if args else Any, is_async=is_async)
+
+
+@dataclasses.dataclass
+class ServerSentEvent:
+    """
+    Event of the `text/event-stream` response.
+
+    Parameters:
+        event: The type of the event, "message" by default.
+        data: The data of the event, lines are joined with newlines.
+        id: The last event ID, if the server sent one.
+        retry: The reconnection time in milliseconds, if sent.
+    """
+
+    event: str = "message"
+    data: str = ""
+    id: Optional[str] = None
+    retry: Optional[int] = None
+
+
+class StreamParser(abc.ABC):
+    """
+    Incremental parser of a streamed response body. Chunks of bytes are
+    fed as they arrive and complete items are returned, so only the item
+    being received is kept in memory. JSON parsers return the items as
+    bytes, the event stream parser returns ServerSentEvent objects.
+
+    Both methods raise ValueError when the body is malformed.
+    """
+
+    @abc.abstractmethod
+    def feed(self, chunk: bytes) -> List[Any]:
+        """Feed the chunk and return the items completed by it."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def close(self) -> List[Any]:
+        """Finish parsing and return the items left in the buffer."""
+        raise NotImplementedError
+
+
+class JsonArrayParser(StreamParser):
+    """
+    Parser of a JSON array. Each element of the top-level array is
+    returned as a separate item. Strings are skipped with a regex, so
+    only structural characters are inspected one by one.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._depth = 0
+        self._in_item = False
+        self._in_string = False
+        self._escape = False
+        self._has_item = False
+        self._after_comma = False
+        self._done = False
+
+    def _take(self, chunk: bytes, start: int, stop: int) -> bytes:
+        if self._buffer:
+            # The item started in one of the previous chunks
+            self._buffer += chunk[start:stop]
+            item = bytes(self._buffer)
+            self._buffer.clear()
+            return item
+        return chunk[start:stop]
+
+    def _between_items(self, chunk: bytes, pos: int) -> int:
+        """Handle the character outside of items, return the next position."""
+        char = chunk[pos]
+        if self._done:
+            raise ValueError("Unexpected data after the JSON array")
+        if self._depth == 0:
+            if char != _OPEN[0]:
+                raise ValueError("Response body is not a JSON array")
+            self._depth = 1
+            return pos + 1
+        if char == _COMMA:
+            if not self._has_item:
+                raise ValueError("Unexpected comma in the JSON array")
+            self._has_item, self._after_comma = False, True
+            return pos + 1
+        if char == _CLOSE[0]:
+            if self._after_comma:
+                raise ValueError("Trailing comma in the JSON array")
+            self._depth, self._done = 0, True
+            return pos + 1
+        if self._has_item:
+            raise ValueError("Missing comma in the JSON array")
+        # The character is the first one of the item
+        self._in_item, self._after_comma = True, False
+        return pos
+
+    def feed(self, chunk: bytes) -> List[bytes]:
+        items: List[bytes] = []
+        # Start of the current item in this chunk
+        start, pos, end = 0, 0, len(chunk)
+        while pos < end:
+            if self._escape:
+                self._escape = False
+                pos += 1
+                continue
+            if self._in_string:
+                match = _STRING_END.search(chunk, pos)
+                if match is None:
+                    break
+                pos = match.end()
+                if chunk[match.start()] == _BACKSLASH:
+                    self._escape = True
+                else:
+                    self._in_string = False
+                continue
+            if not self._in_item:
+                match = _NON_WHITESPACE.search(chunk, pos)
+                if match is None:
+                    break
+                start = pos = self._between_items(chunk, match.start())
+                continue
+            match = _STRUCTURAL.search(chunk, pos)
+            if match is None:
+                break
+            pos = match.start()
+            char = chunk[pos]
+            if char == _QUOTE:
+                self._in_string = True
+                pos += 1
+            elif char in _OPEN:
+                self._depth += 1
+                pos += 1
+            elif self._depth > 1:
+                pos += 1
+                if char in _CLOSE:
+                    self._depth -= 1
+                    if self._depth == 1:
+                        # The object or the array item is complete
+                        items.append(self._take(chunk, start, pos))
+                        self._in_item, self._has_item = False, True
+            else:
+                # Primitive items end at the separator,
+                # it is handled between the items.
+                items.append(self._take(chunk, start, pos))
+                self._in_item, self._has_item = False, True
+        if self._in_item:
+            self._buffer += chunk[start:]
+        return items
+
+    def close(self) -> List[bytes]:
+        if not self._done:
+            raise ValueError("JSON array is incomplete")
+        return []
+
+
+class JsonLinesParser(StreamParser):
+    """
+    Parser of newline-delimited JSON (NDJSON, JSON Lines). Each non-empty
+    line is returned as a separate item. Record separators of JSON text
+    sequences are stripped, so they are parsed as well.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+
+    @staticmethod
+    def _items(lines: List[bytes]) -> List[bytes]:
+        stripped = (line.strip(b" \t\r\x1e") for line in lines)
+        return [line for line in stripped if line]
+
+    def feed(self, chunk: bytes) -> List[bytes]:
+        self._buffer += chunk
+        end = self._buffer.rfind(b"\n")
+        if end == -1:
+            return []
+        lines = bytes(self._buffer[:end]).split(b"\n")
+        del self._buffer[: end + 1]
+        return self._items(lines)
+
+    def close(self) -> List[bytes]:
+        # The last line may have no newline at the end
+        lines = [bytes(self._buffer)]
+        self._buffer.clear()
+        return self._items(lines)
+
+
+class EventStreamParser(StreamParser):
+    """
+    Parser of the `text/event-stream` response, as specified by the HTML
+    standard. Events are returned when they are complete, comments and
+    events without data are skipped.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._skip_line_feed = False
+        self._event = ServerSentEvent()
+        self._data: List[str] = []
+
+    def _dispatch(self) -> Optional[ServerSentEvent]:
+        event, data = self._event, self._data
+        # The last event ID persists between events
+        self._event, self._data = ServerSentEvent(id=event.id), []
+        if not data:
+            return None
+        event.data = "\n".join(data)
+        return event
+
+    def _process_line(self, line: str) -> Optional[ServerSentEvent]:
+        if not line:
+            return self._dispatch()
+        if line.startswith(":"):
+            return None
+        name, _, value = line.partition(":")
+        if value.startswith(" "):
+            value = value[1:]
+        if name == "data":
+            self._data.append(value)
+        elif name == "event":
+            self._event.event = value
+        elif name == "id" and "\0" not in value:
+            self._event.id = value
+        elif name == "retry" and value.isdigit():
+            self._event.retry = int(value)
+        return None
+
+    def feed(self, chunk: bytes) -> List[ServerSentEvent]:
+        if self._skip_line_feed and chunk[:1] == b"\n":
+            # The CRLF line ending was split between the chunks
+            chunk = chunk[1:]
+        self._skip_line_feed = chunk[-1:] == b"\r"
+        self._buffer += chunk
+        events = []
+        start = 0
+        for match in _LINE_END.finditer(self._buffer):
+            line = self._buffer[start:match.start()].decode("utf-8")
+            start = match.end()
+            event = self._process_line(line)
+            if event is not None:
+                events.append(event)
+        del self._buffer[:start]
+        return events
+
+    def close(self) -> List[ServerSentEvent]:
+        # Incomplete event at the end of the stream is discarded
+        return []
+
+
+def get_item_decoder(item_type: Any, codec: Codec) -> Callable[[bytes], Any]:
+    """
+    Get the decoder of the streamed items. Items are validated in the same
+    way as whole responses: pydantic validates the bytes directly if the
+    codec parses plain JSON, generic dataclasses use compiled decoders.
+    """
+    if dataclasses.is_dataclass(get_origin(item_type)):
+        decoder = compile_decoder(item_type)
+        return lambda item: decoder(codec.decode(item))
+    parser = get_type_parser(item_type)
+    if PYDANTIC_V2 and codec.standard_json:
+        return parser.parse_json
+    return lambda item: parser.parse_obj(codec.decode(item))
+
+
+class StreamReader:
+    """
+    Reader of the streamed response. It feeds the body to the parser as it
+    arrives and yields the decoded items. The response is closed when the
+    body is consumed, on error or when the iteration stops early.
+
+    The format of the body is chosen by the content type of the response:
+    `text/event-stream` is parsed as server-sent events, NDJSON and JSON
+    Lines are parsed line by line, other responses are parsed as a JSON
+    array. Items of the event stream are validated from the data of the
+    events, unless the item type is ServerSentEvent itself.
+
+    Parameters:
+        response: The streamed httpx response.
+        stream_type: The stream type of the declared function.
+        codec: The codec used to decode the items.
+    """
+
+    def __init__(
+        self,
+        response: httpx.Response,
+        stream_type: StreamType,
+        codec: Codec,
+    ):
+        self.response = response
+        self._parser: StreamParser
+        self._decode: Callable[[Any], Any]
+        content_type = response.headers.get("content-type", "")
+        content_type = content_type.partition(";")[0].strip().lower()
+        item_type = stream_type.item_type
+        if (
+            item_type is ServerSentEvent
+            or content_type == EVENT_STREAM_CONTENT_TYPE
+        ):
+            self._parser = EventStreamParser()
+            self._decode = self._event_decoder(item_type, codec)
+        else:
+            if content_type in JSON_LINES_CONTENT_TYPES:
+                self._parser = JsonLinesParser()
+            else:
+                self._parser = JsonArrayParser()
+            self._decode = get_item_decoder(item_type, codec)
+
+    @staticmethod
+    def _event_decoder(
+        item_type: Any, codec: Codec
+    ) -> Callable[[ServerSentEvent], Any]:
+        if item_type is ServerSentEvent:
+            return lambda event: event
+        decoder = get_item_decoder(item_type, codec)
+        return lambda event: decoder(event.data.encode("utf-8"))
+
+    def _feed(self, chunk: Optional[bytes]) -> List[Any]:
+        try:
+            if chunk is None:
+                return self._parser.close()
+            return self._parser.feed(chunk)
+        except ValueError as e:
+            raise UnprocessableEntityException(response=self.response) from e
+
+    def iter_items(self) -> Iterator[Any]:
+        """Iterate over the items of the response."""
+        try:
+            for chunk in self.response.iter_bytes():
+                for item in self._feed(chunk):
+                    yield self._decode(item)
+            for item in self._feed(None):
+                yield self._decode(item)
+        finally:
+            self.response.close()
+
+    async def aiter_items(self) -> AsyncIterator[Any]:
+        """Iterate over the items of the response asynchronously."""
+        try:
+            async for chunk in self.response.aiter_bytes():
+                for item in self._feed(chunk):
+                    yield self._decode(item)
+            for item in self._feed(None):
+                yield self._decode(item)
+        finally:
+            await self.response.aclose()
+
+
+__all__ = [
+    "ServerSentEvent",
+    "StreamType",
+    "StreamParser",
+    "JsonArrayParser",
+    "JsonLinesParser",
+    "EventStreamParser",
+    "StreamReader",
+    "get_item_decoder",
+]
@@ -10,6 +10,9 @@ class DeclarativeWarning(Warning):
     SUPPORT_DECORATOR_IGNORED = (
         "{d} decorator is ignored because not applied to endpoint declaration."
     )
+    ASYNC_CLIENTS_NOT_CLOSED = (
+        "{n} async client(s) left open by close(), use aclose() instead."
+    )
 
 
 def warn_list_return_type(type_hint: Type) -> None:
@@ -31,3 +34,10 @@ def warn_support_decorator_ignored(decorator_class: str):
         DeclarativeWarning.SUPPORT_DECORATOR_IGNORED.format(d=decorator_class),
         category=DeclarativeWarning,
     )
+
+
+def warn_async_clients_not_closed(count: int):
+    warnings.warn(
+        DeclarativeWarning.ASYNC_CLIENTS_NOT_CLOSED.format(n=count),
+        category=DeclarativeWarning,
+    )
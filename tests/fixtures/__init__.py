@@ -7,3 +7,4 @@ from .clients import (
     sync_dictionary_client,
     sync_pydantic_client,
 )
+from .server import FakeServer
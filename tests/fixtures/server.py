@@ -0,0 +1,82 @@
+import asyncio
+import threading
+import time
+from typing import List, Optional, Sequence, Union
+
+import httpx
+
+
+class FakeServer:
+    """
+    Fake server for the mocked `httpx.Client.send` and
+    `httpx.AsyncClient.send`. It records the requests and answers them
+    with `{"id": <number of the request>, "name": "John"}`.
+
+    Parameters:
+        latency: Seconds to wait before answering. A sequence sets the
+            latency per request, its last value is used for the rest.
+        status_code: Status code of the responses.
+        failures: Number of the first requests answered with 500.
+        headers: Headers of the responses.
+        etag: ETag of the responses, requests with the matching
+            If-None-Match header are answered with 304 Not Modified.
+    """
+
+    def __init__(
+        self,
+        latency: Union[float, Sequence[float]] = 0.0,
+        status_code: int = 200,
+        failures: int = 0,
+        headers: Optional[dict] = None,
+        etag: Optional[str] = None,
+    ):
+        self.latency = latency
+        self.status_code = status_code
+        self.failures = failures
+        self.headers = headers or {}
+        self.etag = etag
+        self.requests: List[httpx.Request] = []
+        self.cancelled = 0
+        self._lock = threading.Lock()
+
+    def _record(self, request: httpx.Request) -> int:
+        with self._lock:
+            self.requests.append(request)
+            return len(self.requests)
+
+    def _latency(self, number: int) -> float:
+        if isinstance(self.latency, (int, float)):
+            return self.latency
+        return self.latency[min(number, len(self.latency)) - 1]
+
+    def _response(self, request: httpx.Request, number: int):
+        if number <= self.failures:
+            return httpx.Response(500, request=request)
+        headers = dict(self.headers)
+        if self.etag is not None:
+            if request.headers.get("if-none-match") == self.etag:
+                return httpx.Response(
+                    304, headers={"ETag": self.etag}, request=request
+                )
+            headers["ETag"] = self.etag
+        return httpx.Response(
+            self.status_code,
+            json={"id": number, "name": "John"},
+            headers=headers,
+            request=request,
+        )
+
+    def send(self, request: httpx.Request, *args, **kwargs):
+        number = self._record(request)
+        time.sleep(self._latency(number))
+        return self._response(request, number)
+
+    async def asend(self, request: httpx.Request, *args, **kwargs):
+        number = self._record(request)
+        try:
+            await asyncio.sleep(self._latency(number))
+        except asyncio.CancelledError:
+            with self._lock:
+                self.cancelled += 1
+            raise
+        return self._response(request, number)
@@ -0,0 +1,144 @@
+import os
+import uuid
+
+import httpx
+import pytest
+from pytest_mock import MockerFixture
+
+from declarativex import (
+    MisconfiguredException,
+    RateLimitExceeded,
+    RedisBackend,
+    http,
+    rate_limiter,
+)
+from declarativex.backends import GCRA_SCRIPT
+
+
+def _call():
+    ...
+
+
+def _redis_client(asynchronous: bool = False):
+    """
+    Client of the Redis server at REDIS_URL, or of the in-process
+    fakeredis server. The GCRA script is run by the server in both cases,
+    fakeredis runs Lua with lupa.
+    """
+    url = os.environ.get("REDIS_URL")
+    if url:
+        redis = pytest.importorskip("redis")
+        if asynchronous:
+            return redis.asyncio.Redis.from_url(url)
+        return redis.Redis.from_url(url)
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa", reason="fakeredis needs lupa to run Lua")
+    server = fakeredis.FakeServer()
+    if asynchronous:
+        return fakeredis.FakeAsyncRedis(server=server)
+    return fakeredis.FakeRedis(server=server)
+
+
+@pytest.fixture
+def redis():
+    return _redis_client()
+
+
+@pytest.fixture
+def async_redis():
+    return _redis_client(asynchronous=True)
+
+
+@pytest.fixture
+def key() -> str:
+    # Keys of the real server are not shared between the tests
+    return f"declarativex:test:{uuid.uuid4().hex}"
+
+
+def test_redis_backend_shares_quota_between_clients(redis, key: str):
+    # Limiters of two hosts, each with its own client of the same server
+    limiters = [
+        rate_limiter(
+            max_calls=5,
+            interval=1000,
+            reject=True,
+            backend=RedisBackend(redis, key=key),
+        )
+        for _ in range(2)
+    ]
+    granted = 0
+    for _ in range(5):
+        for limiter in limiters:
+            try:
+                limiter._reserve(_call)
+                granted += 1
+            except RateLimitExceeded:
+                pass
+    assert granted == 5
+    limiters[0].refill()
+    limiters[1]._reserve(_call)
+
+
+def test_redis_backend_waits_for_tokens(redis, key: str):
+    limiter = rate_limiter(
+        max_calls=2,
+        interval=0.2,
+        backend=RedisBackend(redis, key=key),
+    )
+    assert limiter._reserve(_call) == 0
+    assert limiter._reserve(_call) == 0
+    assert 0.05 < limiter._reserve(_call) <= 0.1
+    # Reserved tokens are queued
+    assert 0.15 < limiter._reserve(_call) <= 0.2
+
+
+def test_redis_backend_leases_batch_of_tokens(
+    redis, key: str, mocker: MockerFixture
+):
+    limiter = rate_limiter(
+        max_calls=100,
+        interval=1,
+        backend=RedisBackend(redis, key=key, batch=10),
+    )
+    script = mocker.spy(type(redis.register_script(GCRA_SCRIPT)), "__call__")
+    for _ in range(20):
+        assert limiter._reserve(_call) == 0
+    # One round trip per batch
+    assert script.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_async_redis_backend(
+    async_redis, key: str, mocker: MockerFixture
+):
+    mocker.patch.object(
+        httpx.AsyncClient,
+        "send",
+        side_effect=lambda request, **kwargs: httpx.Response(
+            200, json={}, request=request
+        ),
+    )
+    backend = RedisBackend(async_redis, key=key)
+
+    @rate_limiter(max_calls=1, interval=1000, reject=True, backend=backend)
+    @http("GET", "users", base_url="https://example.com/")
+    async def get_users() -> dict:
+        ...
+
+    @rate_limiter(max_calls=1, interval=1000, backend=backend)
+    @http("GET", "users", base_url="https://example.com/")
+    def sync_get_users() -> dict:
+        ...
+
+    assert await get_users() == {}
+    with pytest.raises(RateLimitExceeded):
+        await get_users()
+    await get_users.refill()
+    assert await get_users() == {}
+    with pytest.raises(MisconfiguredException):
+        sync_get_users()
+
+
+def test_redis_backend_misconfigured():
+    with pytest.raises(MisconfiguredException):
+        RedisBackend(object(), key="quota", batch=0)
@@ -0,0 +1,175 @@
+import asyncio
+import threading
+import time
+
+import httpx
+import pytest
+from pytest_mock import MockerFixture
+
+from declarativex import (
+    BaseClient,
+    HTTPException,
+    MisconfiguredException,
+    batch,
+    http,
+)
+
+
+class Tracker:
+    def __init__(self):
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    def enter(self):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def exit(self):
+        with self.lock:
+            self.in_flight -= 1
+
+
+def _response(request: httpx.Request) -> httpx.Response:
+    user_id = int(request.url.path.rsplit("/", 1)[-1])
+    if user_id % 5 == 0:
+        return httpx.Response(404, json={}, request=request)
+    return httpx.Response(200, json={"id": user_id}, request=request)
+
+
+class Client(BaseClient):
+    base_url = "https://example.com/"
+
+    @http("GET", "users/{user_id}")
+    async def get_user(self, user_id: int) -> dict:
+        ...
+
+    @http("GET", "users/{user_id}")
+    def get_user_sync(self, user_id: int) -> dict:
+        ...
+
+
+@pytest.mark.asyncio
+async def test_async_batch(mocker: MockerFixture):
+    tracker = Tracker()
+
+    async def send(request, *args, **kwargs):
+        tracker.enter()
+        user_id = int(request.url.path.rsplit("/", 1)[-1])
+        # Later items complete first
+        await asyncio.sleep(0.001 * (20 - user_id % 20))
+        tracker.exit()
+        return _response(request)
+
+    mocker.patch.object(httpx.AsyncClient, "send", side_effect=send)
+    client = Client()
+    items = [{"user_id": user_id} for user_id in range(1, 41)]
+    results = [
+        result async for result in batch(client.get_user, items, concurrency=8)
+    ]
+    assert tracker.max_in_flight == 8
+    assert [result.index for result in results] == list(range(40))
+    assert [result.item for result in results] == items
+    failed = [result for result in results if not result.ok]
+    assert [result.item["user_id"] for result in failed] == list(
+        range(5, 41, 5)
+    )
+    assert all(isinstance(result.error, HTTPException) for result in failed)
+    assert results[0].result == {"id": 1}
+
+
+@pytest.mark.asyncio
+async def test_async_batch_completion_order(mocker: MockerFixture):
+    async def send(request, *args, **kwargs):
+        user_id = int(request.url.path.rsplit("/", 1)[-1])
+        await asyncio.sleep(0.05 * (4 - user_id))
+        return _response(request)
+
+    mocker.patch.object(httpx.AsyncClient, "send", side_effect=send)
+    client = Client()
+    # Warm up the pooled client, so the calls start at the same time
+    await client.get_user(4)
+    results = [
+        result.result["id"]
+        async for result in batch(
+            client.get_user, [1, 2, 3], concurrency=3, ordered=False
+        )
+    ]
+    assert results == [3, 2, 1]
+
+
+@pytest.mark.asyncio
+async def test_async_batch_early_stop(mocker: MockerFixture):
+    started = []
+
+    async def send(request, *args, **kwargs):
+        started.append(request)
+        await asyncio.sleep(0.01)
+        return _response(request)
+
+    mocker.patch.object(httpx.AsyncClient, "send", side_effect=send)
+    results = batch(Client().get_user, range(1, 100), concurrency=4)
+    async for result in results:
+        assert result.result == {"id": 1}
+        break
+    await results.aclose()
+    assert len(started) < 10
+
+
+@pytest.mark.asyncio
+async def test_ordered_batch_window():
+    head = asyncio.Event()
+    started_before_head = []
+
+    async def call(index: int) -> int:
+        if index == 0:
+            await asyncio.sleep(0.05)
+            head.set()
+        elif not head.is_set():
+            started_before_head.append(index)
+        return index
+
+    results = [
+        result.result async for result in batch(call, range(50), concurrency=4)
+    ]
+    assert results == list(range(50))
+    # The slow head blocks the items past the window, the completed
+    # results don't pile up behind it
+    assert started_before_head == [1, 2, 3]
+
+
+@pytest.mark.asyncio
+async def test_cancelled_call_fails_alone():
+    async def call(index: int) -> int:
+        if index == 1:
+            raise asyncio.CancelledError()
+        return index
+
+    results = [result async for result in batch(call, range(3))]
+    assert [result.ok for result in results] == [True, False, True]
+    assert isinstance(results[1].error, asyncio.CancelledError)
+
+
+def test_sync_batch(mocker: MockerFixture):
+    tracker = Tracker()
+
+    def send(request, *args, **kwargs):
+        tracker.enter()
+        time.sleep(0.01)
+        tracker.exit()
+        return _response(request)
+
+    mocker.patch.object(httpx.Client, "send", side_effect=send)
+    client = Client()
+    items = [(user_id,) for user_id in range(1, 21)]
+    results = list(batch(client.get_user_sync, items, concurrency=4))
+    assert tracker.max_in_flight == 4
+    assert [result.index for result in results] == list(range(20))
+    assert [result.ok for result in results].count(False) == 4
+    assert results[1].result == {"id": 2}
+
+
+def test_batch_concurrency_must_be_positive():
+    with pytest.raises(MisconfiguredException):
+        batch(Client().get_user_sync, [1], concurrency=0)
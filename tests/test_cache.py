@@ -0,0 +1,268 @@
+import asyncio
+import time
+from typing import Annotated
+
+import httpx
+import pytest
+from pydantic import BaseModel
+from pytest_mock import MockerFixture
+
+from declarativex import (
+    BaseClient,
+    HTTPException,
+    MisconfiguredException,
+    Query,
+    cache,
+    http,
+    retry,
+)
+from .fixtures import FakeServer
+
+
+class User(BaseModel):
+    id: int
+
+
+def _client(decorator: cache):
+    @decorator
+    class Client(BaseClient):
+        base_url = "https://example.com/"
+
+        @http("GET", "users/{user_id}")
+        def get_user(
+            self, user_id: int, fields: Annotated[str, Query] = "id"
+        ) -> User:
+            ...
+
+        @http("GET", "users/{user_id}")
+        async def async_get_user(self, user_id: int) -> User:
+            ...
+
+    return Client()
+
+
+def test_cache_by_arguments(mocker: MockerFixture):
+    server = FakeServer()
+    mocker.patch.object(httpx.Client, "send", side_effect=server.send)
+    client = _client(cache())
+    user = client.get_user(1)
+    # The arguments are bound, so the calls are the same
+    assert client.get_user(user_id=1) is user
+    assert client.get_user(1, "id") is user
+    assert client.get_user(1, fields="name") is not user
+    assert client.get_user(2).id == 3
+    assert len(server.requests) == 3
+
+
+@pytest.mark.asyncio
+async def test_async_cache(mocker: MockerFixture):
+    server = FakeServer()
+    mocker.patch.object(httpx.AsyncClient, "send", side_effect=server.asend)
+    client = _client(cache())
+    user = await client.async_get_user(1)
+    assert await client.async_get_user(1) is user
+    assert len(server.requests) == 1
+
+
+def test_ttl(mocker: MockerFixture):
+    server = FakeServer()
+    mocker.patch.object(httpx.Client, "send", side_effect=server.send)
+    client = _client(cache(ttl=0.05))
+    client.get_user(1)
+    client.get_user(1)
+    time.sleep(0.06)
+    assert client.get_user(1).id == 2
+
+
+def test_lru_eviction(mocker: MockerFixture):
+    server = FakeServer()
+    mocker.patch.object(httpx.Client, "send", side_effect=server.send)
+    decorator = cache(maxsize=2)
+    client = _client(decorator)
+    client.get_user(1)
+    client.get_user(2)
+    client.get_user(1)
+    client.get_user(3)
+    assert len(decorator) == 2
+    # The least recently used value is evicted
+    client.get_user(1)
+    assert len(server.requests) == 3
+    client.get_user(2)
+    assert len(server.requests) == 4
+
+
+def test_invalidate(mocker: MockerFixture):
+    server = FakeServer()
+    mocker.patch.object(httpx.Client, "send", side_effect=server.send)
+    decorator = cache()
+    client = _client(decorator)
+    client.get_user(1)
+    client.get_user(2)
+    key = decorator.make_key(client.get_user, 1)
+    prefix = f"{__name__}._client.<locals>.Client.get_user:"
+    assert key == prefix + '{"fields": "id", "user_id": 1}'
+    assert client.invalidate(key=key) == 1
+    assert client.invalidate(key=key) == 0
+    assert client.get_user(1).id == 3
+    assert client.invalidate(prefix=prefix) == 2
+    assert client.invalidate() == 0
+
+
+def test_custom_key(mocker: MockerFixture):
+    server = FakeServer()
+    mocker.patch.object(httpx.Client, "send", side_effect=server.send)
+    decorator = cache(key=lambda arguments: str(arguments["user_id"]))
+    client = _client(decorator)
+    client.get_user(1)
+    client.get_user(1, fields="name")
+    assert len(server.requests) == 1
+    key = f"{__name__}._client.<locals>.Client.get_user:1"
+    assert decorator.invalidate(key=key) == 1
+
+
+def test_errors_are_not_cached(mocker: MockerFixture):
+    server = FakeServer(failures=2)
+    mocker.patch.object(httpx.Client, "send", side_effect=server.send)
+
+    @http("GET", "users/{user_id}", base_url="https://example.com/")
+    def get_user(user_id: int) -> User:
+        ...
+
+    # The cache wraps the retries, the recovered value is cached
+    get_user = cache()(
+        retry(max_retries=2, delay=0, exceptions=(HTTPException,))(get_user)
+    )
+    assert get_user(1).id == 3
+    assert get_user(1).id == 3
+    assert len(server.requests) == 3
+
+
+def test_same_names_do_not_collide(mocker: MockerFixture):
+    server = FakeServer()
+    mocker.patch.object(httpx.Client, "send", side_effect=server.send)
+    decorator = cache()
+
+    def users():
+        @decorator
+        @http("GET", "users/{id}", base_url="https://example.com/")
+        def get(id: int) -> User:
+            ...
+
+        return get
+
+    def orders():
+        @decorator
+        @http("GET", "orders/{id}", base_url="https://example.com/")
+        def get(id: int) -> User:
+            ...
+
+        return get
+
+    # The functions have the same name, but not the same qualified name
+    assert users()(1).id == 1
+    assert orders()(1).id == 2
+    assert len(decorator) == 2
+
+
+def test_cache_misconfigured():
+    with pytest.raises(MisconfiguredException):
+        cache(ttl=0)
+    with pytest.raises(MisconfiguredException):
+        cache(maxsize=0)
+
+
+def test_stale_while_revalidate(mocker: MockerFixture):
+    # The refresh is slower than the next calls
+    server = FakeServer(latency=[0.0, 0.05])
+    mocker.patch.object(httpx.Client, "send", side_effect=server.send)
+    client = _client(cache(ttl=0.05, stale_while_revalidate=1))
+    assert client.get_user(1).id == 1
+    time.sleep(0.06)
+    # The stale value is returned, one refresh runs in the background
+    assert client.get_user(1).id == 1
+    assert client.get_user(1).id == 1
+    time.sleep(0.1)
+    assert len(server.requests) == 2
+    assert client.get_user(1).id == 2
+
+
+@pytest.mark.asyncio
+async def test_async_stale_while_revalidate(mocker: MockerFixture):
+    server = FakeServer()
+    mocker.patch.object(httpx.AsyncClient, "send", side_effect=server.asend)
+    client = _client(cache(ttl=0.05, stale_while_revalidate=1))
+    assert (await client.async_get_user(1)).id == 1
+    await asyncio.sleep(0.06)
+    assert (await client.async_get_user(1)).id == 1
+    assert (await client.async_get_user(1)).id == 1
+    await asyncio.sleep(0.05)
+    assert len(server.requests) == 2
+    assert (await client.async_get_user(1)).id == 2
+
+
+def test_stale_value_expires_after_grace_window(mocker: MockerFixture):
+    server = FakeServer()
+    mocker.patch.object(httpx.Client, "send", side_effect=server.send)
+    client = _client(cache(ttl=0.02, stale_while_revalidate=0.02))
+    client.get_user(1)
+    time.sleep(0.05)
+    assert client.get_user(1).id == 2
+
+
+def test_stale_if_error(mocker: MockerFixture):
+    server = FakeServer()
+    mocker.patch.object(httpx.Client, "send", side_effect=server.send)
+    client = _client(cache(ttl=0.02, stale_if_error=0.1))
+    assert client.get_user(1).id == 1
+    time.sleep(0.03)
+    server.failures = 10
+    # The call fails, the last good value is returned
+    assert client.get_user(1).id == 1
+    time.sleep(0.1)
+    with pytest.raises(HTTPException):
+        client.get_user(1)
+
+
+def test_stale_misconfigured():
+    with pytest.raises(MisconfiguredException):
+        cache(stale_while_revalidate=10)
+    with pytest.raises(MisconfiguredException):
+        cache(ttl=1, stale_if_error=-1)
+
+
+def test_client_instances_do_not_share_values(mocker: MockerFixture):
+    def send(request, *args, **kwargs):
+        return httpx.Response(
+            200,
+            json={
+                "host": request.url.host,
+                "auth": request.headers["Authorization"],
+            },
+            request=request,
+        )
+
+    mocker.patch.object(httpx.Client, "send", side_effect=send)
+
+    @cache(ttl=60)
+    class Client(BaseClient):
+        @http("GET", "users/{user_id}")
+        def get_user(self, user_id: int) -> dict:
+            ...
+
+    tenant_a = Client(
+        base_url="https://tenant-a.example.com/",
+        default_headers={"Authorization": "Bearer A"},
+    )
+    tenant_b = Client(
+        base_url="https://tenant-b.example.com/",
+        default_headers={"Authorization": "Bearer B"},
+    )
+    assert tenant_a.get_user(1)["auth"] == "Bearer A"
+    assert tenant_b.get_user(1) == {
+        "host": "tenant-b.example.com",
+        "auth": "Bearer B",
+    }
+    assert tenant_a.get_user(1)["host"] == "tenant-a.example.com"
+    # Invalidation applies to the values of all instances
+    prefix = f"{__name__}.{Client.get_user.__qualname__}:"
+    assert tenant_a.invalidate(prefix=prefix) == 2
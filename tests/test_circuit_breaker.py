@@ -0,0 +1,196 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+from pytest_mock import MockerFixture
+
+from declarativex import (
+    BaseClient,
+    CircuitBreakerOpen,
+    CircuitState,
+    HTTPException,
+    MisconfiguredException,
+    circuit_breaker,
+    http,
+)
+
+
+def _responder(statuses: list):
+    def _response(request, *args, **kwargs):
+        return httpx.Response(
+            statuses.pop(0), json={"ok": True}, request=request
+        )
+
+    return _response
+
+
+breaker = circuit_breaker(
+    exceptions=(HTTPException,),
+    failure_rate_threshold=0.5,
+    window_size=4,
+    minimum_calls=4,
+    open_duration=0.1,
+    half_open_calls=2,
+)
+
+
+@breaker
+class Client(BaseClient):
+    base_url = "https://example.com/"
+
+    @http("GET", "users")
+    def get_users(self) -> dict:
+        ...
+
+    @http("GET", "users")
+    async def async_get_users(self) -> dict:
+        ...
+
+
+@pytest.fixture(autouse=True)
+def _reset():
+    breaker.reset()
+
+
+def test_circuit_opens_and_recovers(mocker: MockerFixture):
+    statuses = [200, 500, 200, 500, 200, 200]
+    send = mocker.patch.object(
+        httpx.Client, "send", side_effect=_responder(statuses)
+    )
+    client = Client()
+    for status in [200, 500, 200]:
+        if status == 200:
+            client.get_users()
+        else:
+            with pytest.raises(HTTPException):
+                client.get_users()
+        assert breaker.state is CircuitState.CLOSED
+    with pytest.raises(HTTPException):
+        client.get_users()
+    assert breaker.state is CircuitState.OPEN
+
+    # Calls fail fast without hitting the server
+    with pytest.raises(CircuitBreakerOpen):
+        client.get_users()
+    assert send.call_count == 4
+
+    time.sleep(0.1)
+    assert breaker.state is CircuitState.HALF_OPEN
+    client.get_users()
+    client.get_users()
+    assert breaker.state is CircuitState.CLOSED
+    assert send.call_count == 6
+
+
+def test_failed_trial_calls_reopen_circuit(mocker: MockerFixture):
+    mocker.patch.object(
+        httpx.Client, "send", side_effect=_responder([500] * 5 + [200])
+    )
+    client = Client()
+    for _ in range(4):
+        with pytest.raises(HTTPException):
+            client.get_users()
+    assert breaker.state is CircuitState.OPEN
+    time.sleep(0.1)
+    with pytest.raises(HTTPException):
+        client.get_users()
+    client.get_users()
+    assert breaker.state is CircuitState.OPEN
+    with pytest.raises(CircuitBreakerOpen):
+        client.get_users()
+
+
+@pytest.mark.asyncio
+async def test_async_circuit(mocker: MockerFixture):
+    mocker.patch.object(
+        httpx.AsyncClient, "send", side_effect=_responder([500] * 4)
+    )
+    client = Client()
+    for _ in range(4):
+        with pytest.raises(HTTPException):
+            await client.async_get_users()
+    with pytest.raises(CircuitBreakerOpen):
+        await client.async_get_users()
+
+
+def test_slow_calls_open_circuit():
+    calls = []
+
+    @circuit_breaker(
+        exceptions=(ValueError,),
+        slow_call_duration=0.02,
+        slow_call_rate_threshold=0.5,
+        minimum_calls=2,
+    )
+    @http("GET", "users", base_url="https://example.com/")
+    def get_users() -> dict:
+        ...
+
+    def _slow(request, *args, **kwargs):
+        calls.append(request)
+        time.sleep(0.03)
+        return httpx.Response(200, json={}, request=request)
+
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(httpx.Client, "send", _slow)
+        get_users()
+        get_users()
+        with pytest.raises(CircuitBreakerOpen):
+            get_users()
+    assert len(calls) == 2
+
+
+def test_not_listed_exceptions_are_successes(mocker: MockerFixture):
+    mocker.patch.object(
+        httpx.Client, "send", side_effect=_responder([500] * 5)
+    )
+
+    @circuit_breaker(exceptions=(ValueError,), minimum_calls=1)
+    @http("GET", "users", base_url="https://example.com/")
+    def get_users() -> dict:
+        ...
+
+    for _ in range(5):
+        with pytest.raises(HTTPException):
+            get_users()
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        {"failure_rate_threshold": 0},
+        {"slow_call_rate_threshold": 1.5},
+        {"window_size": 0},
+        {"half_open_calls": 0},
+    ],
+)
+def test_misconfigured(kwargs: dict):
+    with pytest.raises(MisconfiguredException):
+        circuit_breaker(exceptions=(HTTPException,), **kwargs)
+
+
+@pytest.mark.asyncio
+async def test_cancelled_trial_calls_return_permits(mocker: MockerFixture):
+    statuses = [500] * 4
+
+    async def send(request, *args, **kwargs):
+        if not statuses:
+            await asyncio.sleep(1)
+        return _responder(statuses)(request)
+
+    mocker.patch.object(httpx.AsyncClient, "send", side_effect=send)
+    client = Client()
+    for _ in range(4):
+        with pytest.raises(HTTPException):
+            await client.async_get_users()
+    await asyncio.sleep(0.1)
+    # The trial calls are cancelled before the server answers
+    for _ in range(4):
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(client.async_get_users(), 0.01)
+    assert breaker.state is CircuitState.HALF_OPEN
+    statuses.extend([200, 200])
+    await client.async_get_users()
+    await client.async_get_users()
+    assert breaker.state is CircuitState.CLOSED
@@ -0,0 +1,137 @@
+import json
+from typing import Annotated, List
+
+import httpx
+import pytest
+from pydantic import BaseModel
+from pytest_mock import MockerFixture
+
+from declarativex import (
+    BaseClient,
+    CustomCodec,
+    Json,
+    JsonCodec,
+    MisconfiguredException,
+    OrjsonCodec,
+    UnprocessableEntityException,
+    http,
+)
+from declarativex.models import RawRequest
+
+
+def _echo(request: httpx.Request, *args, **kwargs) -> httpx.Response:
+    return httpx.Response(
+        200,
+        content=b'[{"body": ' + (request.content or b"null") + b"}]",
+        request=request,
+    )
+
+
+def test_json_codec_matches_httpx_encoding():
+    codec = JsonCodec()
+    body = {"name": "Jöhn", "tags": [1, 2.5, None]}
+    assert codec.encode(body) == httpx.Request(
+        "POST", "https://example.com", json=body
+    ).read()
+    assert codec.decode(codec.encode(body)) == body
+
+
+def test_custom_codec():
+    codec = CustomCodec(encoder=json.dumps, decoder=json.loads)
+    assert codec.encode({"a": 1}) == b'{"a": 1}'
+    assert codec.decode(b'{"a": 1}') == {"a": 1}
+
+
+def test_request_body_is_pre_serialized():
+    request = RawRequest(
+        method="POST",
+        url_template="https://example.com/users",
+        json={"name": "John"},
+        codec=CustomCodec(encoder=lambda obj: b"encoded", decoder=json.loads),
+    ).to_httpx_request()
+    assert request.read() == b"encoded"
+    assert request.headers["content-type"] == "application/json"
+
+
+def test_codec_is_used_for_request_and_response(mocker: MockerFixture):
+    mocker.patch.object(httpx.Client, "send", side_effect=_echo)
+    calls = []
+
+    def decoder(data):
+        calls.append(data)
+        return json.loads(data)
+
+    class Client(BaseClient):
+        base_url = "https://example.com/"
+        codec = CustomCodec(encoder=json.dumps, decoder=decoder)
+
+        @http("POST", "users")
+        def create_user(self, user: Annotated[dict, Json]) -> List[dict]:
+            ...
+
+        @http("POST", "users")
+        def create_user_from_str(
+            self, user: Annotated[str, Json]
+        ) -> List[dict]:
+            ...
+
+    client = Client()
+    assert client.create_user({"name": "John"}) == [
+        {"body": {"name": "John"}}
+    ]
+    # Response body is decoded straight from bytes
+    assert calls == [b'[{"body": {"name": "John"}}]']
+    assert client.create_user_from_str('{"name": "Jane"}') == [
+        {"body": {"name": "Jane"}}
+    ]
+    assert calls[1] == '{"name": "Jane"}'
+
+
+def test_endpoint_codec(mocker: MockerFixture):
+    pytest.importorskip("orjson")
+    mocker.patch.object(httpx.Client, "send", side_effect=_echo)
+
+    @http("GET", "users", base_url="https://example.com", codec=OrjsonCodec())
+    def get_users() -> List[dict]:
+        ...
+
+    assert get_users() == [{"body": None}]
+
+    mocker.patch.object(
+        httpx.Client,
+        "send",
+        return_value=httpx.Response(
+            200,
+            content=b"not json",
+            request=httpx.Request("GET", "https://example.com/users"),
+        ),
+    )
+    with pytest.raises(UnprocessableEntityException):
+        get_users()
+
+
+def test_wrong_codec():
+    with pytest.raises(MisconfiguredException) as exc:
+
+        @http("GET", "users", codec=json)
+        def get_users() -> List[dict]:
+            ...
+
+    assert str(exc.value) == "codec must be an instance of Codec"
+
+
+def test_fast_codec_decodes_response(mocker: MockerFixture):
+    pytest.importorskip("orjson")
+    mocker.patch.object(httpx.Client, "send", side_effect=_echo)
+    decode = mocker.spy(OrjsonCodec, "decode")
+
+    class Body(BaseModel):
+        body: None
+
+    @http("GET", "users", base_url="https://example.com", codec=OrjsonCodec())
+    def get_users() -> List[Body]:
+        ...
+
+    # The configured codec is used, not the JSON parser of pydantic
+    assert get_users() == [Body(body=None)]
+    assert decode.call_count == 1
@@ -126,3 +126,58 @@ def test_parse_obj_as_version_1() -> None:
         Data, {"test": "data"}
     )
     assert isinstance(result, Data)
+
+
+def test_type_parser_is_cached():
+    from typing import List
+
+    from declarativex.compatibility import get_type_parser
+
+    @dataclasses.dataclass
+    class Data:
+        test: str
+
+    parser = get_type_parser(List[Data])
+    assert get_type_parser(List[Data]) is parser
+    assert parser.parse_json(b'[{"test": "data"}]') == [Data(test="data")]
+    assert parser.parse_obj([{"test": "data"}]) == [Data(test="data")]
+
+
+def test_response_parsing_reuses_type_parser():
+    from typing import List
+
+    import httpx
+
+    from declarativex.compatibility import _cached_type_parser
+    from declarativex.exceptions import HTTPException
+    from declarativex.models import Response
+
+    @dataclasses.dataclass
+    class Data:
+        test: str
+
+    @dataclasses.dataclass
+    class Error:
+        error: str
+
+    request = httpx.Request("GET", "https://example.com")
+    _cached_type_parser.cache_clear()
+    for _ in range(3):
+        response = httpx.Response(
+            200, content=b'[{"test": "data"}]', request=request
+        )
+        assert Response(response=response).as_type(List[Data]) == [
+            Data(test="data")
+        ]
+        response = httpx.Response(
+            400, content=b'{"error": "bad"}', request=request
+        )
+        exc = HTTPException(
+            request=request,
+            response=response,
+            raw_request=None,
+            error_mappings={400: Error},
+        )
+        assert exc.response == Error(error="bad")
+    cache_info = _cached_type_parser.cache_info()
+    assert (cache_info.misses, cache_info.hits) == (2, 4)
@@ -0,0 +1,91 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Annotated
+
+import httpx
+import pytest
+from pytest_mock import MockerFixture
+
+from declarativex import BaseClient, Header, http
+
+
+def _echo(request: httpx.Request) -> httpx.Response:
+    return httpx.Response(
+        200,
+        json={"url": str(request.url), "token": request.headers["x-token"]},
+        request=request,
+    )
+
+
+async def _async_echo(request: httpx.Request, *args, **kwargs):
+    await asyncio.sleep(0)
+    return _echo(request)
+
+
+def _sync_echo(request: httpx.Request, *args, **kwargs):
+    return _echo(request)
+
+
+class AsyncClient(BaseClient):
+    default_headers = {"x-client": "test"}
+
+    @http("GET", "users/{user_id}")
+    async def get_user(
+        self, user_id: int, token: Annotated[str, Header(name="X-Token")]
+    ) -> dict:
+        ...
+
+
+class SyncClient(BaseClient):
+    default_headers = {"x-client": "test"}
+
+    @http("GET", "users/{user_id}")
+    def get_user(
+        self, user_id: int, token: Annotated[str, Header(name="X-Token")]
+    ) -> dict:
+        ...
+
+
+@pytest.mark.asyncio
+async def test_async_concurrent_calls(mocker: MockerFixture):
+    mocker.patch.object(httpx.AsyncClient, "send", side_effect=_async_echo)
+    first = AsyncClient(base_url="https://first.example.com/")
+    second = AsyncClient(base_url="https://second.example.com/")
+
+    results = await asyncio.gather(
+        *[
+            (first if i % 2 else second).get_user(i, token=f"token-{i}")
+            for i in range(200)
+        ]
+    )
+    for i, result in enumerate(results):
+        host = "first" if i % 2 else "second"
+        assert result == {
+            "url": f"https://{host}.example.com/users/{i}",
+            "token": f"token-{i}",
+        }
+    assert AsyncClient.default_headers == {"x-client": "test"}
+    await first.aclose()
+    await second.aclose()
+
+
+def test_sync_concurrent_calls(mocker: MockerFixture):
+    mocker.patch.object(httpx.Client, "send", side_effect=_sync_echo)
+    first = SyncClient(base_url="https://first.example.com/")
+    second = SyncClient(base_url="https://second.example.com/")
+
+    def call(i):
+        return (first if i % 2 else second).get_user(i, token=f"token-{i}")
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        results = list(pool.map(call, range(200)))
+
+    for i, result in enumerate(results):
+        host = "first" if i % 2 else "second"
+        assert result == {
+            "url": f"https://{host}.example.com/users/{i}",
+            "token": f"token-{i}",
+        }
+    assert SyncClient.default_headers == {"x-client": "test"}
+    first.close()
+    second.close()
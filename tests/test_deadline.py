@@ -0,0 +1,123 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+from pytest_mock import MockerFixture
+
+from declarativex import (
+    BaseClient,
+    RateLimitExceeded,
+    TimeoutException,
+    batch,
+    deadline,
+    http,
+    rate_limiter,
+    retry,
+)
+
+
+def _timeout(request, *args, **kwargs):
+    raise httpx.ReadTimeout("Timed out", request=request)
+
+
+def _response(request, *args, **kwargs):
+    return httpx.Response(
+        200,
+        json={"timeout": request.extensions.get("timeout", {}).get("read")},
+        request=request,
+    )
+
+
+@deadline(0.25)
+@retry(max_retries=10, delay=0.1, exceptions=(TimeoutException,))
+class Client(BaseClient):
+    base_url = "https://example.com/"
+
+    @http("GET", "users")
+    def get_users(self) -> dict:
+        ...
+
+    @http("GET", "users")
+    async def get_users_async(self) -> dict:
+        ...
+
+
+def test_retries_are_bounded_by_deadline(mocker: MockerFixture):
+    send = mocker.patch.object(httpx.Client, "send", side_effect=_timeout)
+    started = time.monotonic()
+    with pytest.raises(TimeoutException):
+        Client().get_users()
+    assert time.monotonic() - started < 0.25
+    # The retry that can't start before the deadline is skipped
+    assert send.call_count <= 3
+
+
+@pytest.mark.asyncio
+async def test_async_retries_are_bounded_by_deadline(mocker: MockerFixture):
+    send = mocker.patch.object(
+        httpx.AsyncClient, "send", side_effect=_timeout
+    )
+    with pytest.raises(TimeoutException):
+        await Client().get_users_async()
+    assert send.call_count <= 3
+
+
+def test_timeout_is_limited_by_deadline(mocker: MockerFixture):
+    send = mocker.patch.object(httpx.Client, "send", side_effect=_response)
+    client = Client()
+    assert client.get_users()["timeout"] <= 0.25
+    with deadline(0.1):
+        assert deadline.remaining() <= 0.1
+        # Inner deadlines can only shorten the budget
+        with deadline(10):
+            assert deadline.remaining() <= 0.1
+            assert client.get_users()["timeout"] <= 0.1
+        assert deadline.remaining() <= 0.1
+    assert deadline.remaining() is None
+
+    with deadline(0):
+        with pytest.raises(TimeoutException):
+            client.get_users()
+    # The request is not sent after the deadline
+    assert send.call_count == 2
+
+
+def test_rate_limiter_wait_is_bounded_by_deadline(mocker: MockerFixture):
+    mocker.patch.object(httpx.Client, "send", side_effect=_response)
+
+    @rate_limiter(max_calls=1, interval=1)
+    class LimitedClient(BaseClient):
+        base_url = "https://example.com/"
+
+        @http("GET", "users")
+        def get_users(self) -> dict:
+            ...
+
+    client = LimitedClient()
+    client.get_users()
+    started = time.monotonic()
+    with deadline(0.2):
+        with pytest.raises(RateLimitExceeded):
+            client.get_users()
+    assert time.monotonic() - started < 0.1
+
+
+@pytest.mark.asyncio
+async def test_deadline_is_shared_by_tasks():
+    async def remaining():
+        return deadline.remaining()
+
+    with deadline(1):
+        results = await asyncio.gather(remaining(), remaining())
+    assert all(0 < result <= 1 for result in results)
+
+
+def test_deadline_is_shared_by_batch_threads(mocker: MockerFixture):
+    mocker.patch.object(httpx.Client, "send", side_effect=_response)
+    client = Client()
+    with deadline(0.1):
+        results = list(batch(client.get_users, [(), ()], concurrency=2))
+        remaining = list(client.map(lambda _: deadline.remaining(), [1, 2]))
+    assert all(result.result["timeout"] <= 0.1 for result in results)
+    assert all(0 < value <= 0.1 for value in remaining)
@@ -0,0 +1,84 @@
+import copy
+import dataclasses
+from typing import Dict, Generic, List, Optional, TypeVar
+
+from declarativex.decoders import compile_decoder
+from tests.fixtures.schemas.dataclass import (
+    PaginatedResponse,
+    SingleResponse,
+    User,
+)
+
+AnyModel = TypeVar("AnyModel")
+
+USER = {
+    "id": 1,
+    "email": "john@example.com",
+    "first_name": "John",
+    "last_name": "Doe",
+    "avatar": "https://example.com/avatar.png",
+}
+
+
+@dataclasses.dataclass
+class Node:
+    name: str
+    children: List["Node"] = dataclasses.field(default_factory=list)
+    parent: Optional["Node"] = None
+
+
+@dataclasses.dataclass
+class Envelope(Generic[AnyModel]):
+    items: Dict[str, AnyModel]
+    single: SingleResponse[AnyModel]
+
+
+def test_decode_generic_dataclasses():
+    data = {"data": USER, "support": {"url": "https://example.com"}}
+    assert compile_decoder(SingleResponse[User])(data) == SingleResponse(
+        data=User(**USER)
+    )
+    page = {
+        "page": 1,
+        "per_page": 2,
+        "total": 2,
+        "total_pages": 1,
+        "data": [USER, USER],
+    }
+    result = compile_decoder(PaginatedResponse[User])(page)
+    assert result.data == [User(**USER), User(**USER)]
+
+
+def test_decode_nested_generic_dataclasses():
+    data = {"items": {"first": USER}, "single": {"data": USER}}
+    result = compile_decoder(Envelope[User])(data)
+    assert result == Envelope(
+        items={"first": User(**USER)},
+        single=SingleResponse(data=User(**USER)),
+    )
+
+
+def test_decode_recursive_dataclass():
+    data = {
+        "name": "root",
+        "children": [{"name": "leaf", "parent": None}],
+        "parent": {"name": "parent"},
+    }
+    result = compile_decoder(Node)(data)
+    assert result == Node(
+        name="root", children=[Node(name="leaf")], parent=Node(name="parent")
+    )
+
+
+def test_decode_does_not_modify_data():
+    data = {"data": [USER]}
+    snapshot = copy.deepcopy(data)
+    result = compile_decoder(SingleResponse[List[User]])(data)
+    assert result.data == [User(**USER)]
+    assert data == snapshot
+
+
+def test_decoders_are_cached():
+    decoder = compile_decoder(List[SingleResponse[User]])
+    assert decoder is compile_decoder(List[SingleResponse[User]])
+    assert compile_decoder(dict)({"a": 1}) == {"a": 1}
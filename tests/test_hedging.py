@@ -0,0 +1,106 @@
+import httpx
+import pytest
+from pytest_mock import MockerFixture
+
+from declarativex import (
+    BaseClient,
+    Hedging,
+    HTTPException,
+    MisconfiguredException,
+    http,
+)
+from .fixtures import FakeServer
+
+
+def _client(hedging: Hedging):
+    class Client(BaseClient):
+        base_url = "https://example.com/"
+
+        @http("GET", "users", hedging=hedging)
+        async def get_users(self) -> dict:
+            ...
+
+    return Client()
+
+
+@pytest.mark.asyncio
+async def test_hedged_request_wins(mocker: MockerFixture):
+    server = FakeServer(latency=[0.5, 0.01])
+    mocker.patch.object(httpx.AsyncClient, "send", side_effect=server.asend)
+    hedging = Hedging(delay=0.05)
+    assert (await _client(hedging).get_users())["id"] == 2
+    assert len(server.requests) == 2
+    # The slow request is cancelled
+    assert server.cancelled == 1
+    assert hedging.tokens == 9.0
+
+
+@pytest.mark.asyncio
+async def test_fast_response_is_not_hedged(mocker: MockerFixture):
+    server = FakeServer(latency=0.01)
+    mocker.patch.object(httpx.AsyncClient, "send", side_effect=server.asend)
+    assert (await _client(Hedging(delay=0.1)).get_users())["id"] == 1
+    assert len(server.requests) == 1
+
+
+@pytest.mark.asyncio
+async def test_hedging_budget(mocker: MockerFixture):
+    server = FakeServer(latency=[0.1, 0.01] * 5)
+    mocker.patch.object(httpx.AsyncClient, "send", side_effect=server.asend)
+    client = _client(Hedging(delay=0.02, ratio=0, max_tokens=1))
+    assert (await client.get_users())["id"] == 2
+    # The budget is spent, the next call waits for the first request
+    assert (await client.get_users())["id"] == 3
+    assert len(server.requests) == 3
+
+
+@pytest.mark.asyncio
+async def test_learned_delay(mocker: MockerFixture):
+    server = FakeServer(latency=[0.01] * 4 + [0.3, 0.01])
+    mocker.patch.object(httpx.AsyncClient, "send", side_effect=server.asend)
+    hedging = Hedging(percentile=0.5, min_samples=4)
+    client = _client(hedging)
+    for _ in range(4):
+        await client.get_users()
+    # Not hedged until enough latencies are recorded
+    assert len(server.requests) == 4
+    assert hedging.get_delay() < 0.1
+    assert (await client.get_users())["id"] == 6
+
+
+@pytest.mark.asyncio
+async def test_error_responses_win_too(mocker: MockerFixture):
+    server = FakeServer(latency=[0.3, 0.01], status_code=500)
+    mocker.patch.object(httpx.AsyncClient, "send", side_effect=server.asend)
+    with pytest.raises(HTTPException) as exc:
+        await _client(Hedging(delay=0.02)).get_users()
+    assert exc.value.response.json()["id"] == 2
+
+
+@pytest.mark.asyncio
+async def test_failed_requests_are_not_hedged(mocker: MockerFixture):
+    def _fail(request, *args, **kwargs):
+        raise httpx.ConnectError("Refused", request=request)
+
+    send = mocker.patch.object(
+        httpx.AsyncClient, "send", side_effect=_fail
+    )
+    with pytest.raises(httpx.ConnectError):
+        await _client(Hedging(delay=0.02)).get_users()
+    assert send.call_count == 1
+
+
+def test_hedging_misconfigured():
+    with pytest.raises(MisconfiguredException):
+        Hedging()
+    with pytest.raises(MisconfiguredException):
+        Hedging(percentile=1.5)
+    with pytest.raises(MisconfiguredException):
+        http("POST", "users", hedging=Hedging(delay=0.1))
+
+    @http("GET", "users", base_url="https://example.com/", hedging=Hedging(0))
+    def get_users() -> dict:
+        ...
+
+    with pytest.raises(MisconfiguredException):
+        get_users()
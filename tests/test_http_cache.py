@@ -0,0 +1,299 @@
+import threading
+import time
+from email.utils import formatdate
+import httpx
+import pytest
+from pydantic import BaseModel
+from pytest_mock import MockerFixture
+
+from declarativex import (
+    BaseClient,
+    FileStorage,
+    HttpCache,
+    MemoryStorage,
+    MisconfiguredException,
+    SQLiteStorage,
+    http,
+)
+from declarativex.http_cache import CachedResponse, parse_cache_control
+from .fixtures import FakeServer
+
+
+class User(BaseModel):
+    id: int
+    name: str
+
+
+class Client(BaseClient):
+    base_url = "https://example.com/"
+
+    @http("GET", "users/{user_id}")
+    def get_user(self, user_id: int) -> User:
+        ...
+
+    @http("GET", "users/{user_id}")
+    async def async_get_user(self, user_id: int) -> User:
+        ...
+
+    @http("PUT", "users/{user_id}")
+    def update_user(self, user_id: int) -> dict:
+        ...
+
+
+def test_fresh_response_is_served_from_cache(mocker: MockerFixture):
+    server = FakeServer(headers={"Cache-Control": "max-age=60"}, etag='"v1"')
+    mocker.patch.object(httpx.Client, "send", side_effect=server.send)
+    client = Client(cache=HttpCache())
+    user = client.get_user(1)
+    assert client.get_user(1) is user
+    assert len(server.requests) == 1
+    client.get_user(2)
+    assert len(server.requests) == 2
+
+
+def test_stale_response_is_revalidated(mocker: MockerFixture):
+    server = FakeServer(headers={"Cache-Control": "no-cache"}, etag='"v1"')
+    mocker.patch.object(httpx.Client, "send", side_effect=server.send)
+    client = Client(cache=HttpCache())
+    user = client.get_user(1)
+    # 304 Not Modified returns the parsed response of the first call
+    assert client.get_user(1) is user
+    assert user.id == 1
+    assert server.requests[1].headers["if-none-match"] == '"v1"'
+
+
+@pytest.mark.asyncio
+async def test_async_revalidation(mocker: MockerFixture):
+    server = FakeServer(headers={"Cache-Control": "max-age=0"}, etag='"v1"')
+    mocker.patch.object(httpx.AsyncClient, "send", side_effect=server.asend)
+    client = Client(cache=HttpCache())
+    user = await client.async_get_user(1)
+    assert await client.async_get_user(1) is user
+    assert len(server.requests) == 2
+
+
+def test_changed_response_replaces_stored(mocker: MockerFixture):
+    server = FakeServer(headers={"Cache-Control": "no-cache"}, etag='"v1"')
+    mocker.patch.object(httpx.Client, "send", side_effect=server.send)
+    client = Client(cache=HttpCache())
+    assert client.get_user(1).id == 1
+    server.etag = '"v2"'
+    assert client.get_user(1).id == 2
+    assert client.get_user(1).id == 2
+    assert len(server.requests) == 3
+
+
+def test_last_modified_validator(mocker: MockerFixture):
+    last_modified = formatdate(time.time() - 3600, usegmt=True)
+    server = FakeServer(headers={"Last-Modified": last_modified})
+    mocker.patch.object(httpx.Client, "send", side_effect=server.send)
+    client = Client(cache=HttpCache())
+    client.get_user(1)
+    client.get_user(1)
+    assert server.requests[1].headers["if-modified-since"] == last_modified
+
+
+def test_expires(mocker: MockerFixture):
+    server = FakeServer(
+        headers={
+            "Date": formatdate(time.time(), usegmt=True),
+            "Expires": formatdate(time.time() + 60, usegmt=True),
+        },
+        etag='"v1"',
+    )
+    mocker.patch.object(httpx.Client, "send", side_effect=server.send)
+    client = Client(cache=HttpCache())
+    client.get_user(1)
+    client.get_user(1)
+    assert len(server.requests) == 1
+
+
+def test_no_store(mocker: MockerFixture):
+    server = FakeServer(
+        headers={"Cache-Control": "no-store, max-age=60"}, etag='"v1"'
+    )
+    mocker.patch.object(httpx.Client, "send", side_effect=server.send)
+    cache = HttpCache()
+    client = Client(cache=cache)
+    assert client.get_user(1).id == 1
+    assert client.get_user(1).id == 2
+    assert "if-none-match" not in server.requests[1].headers
+
+
+def test_unsafe_request_invalidates(mocker: MockerFixture):
+    server = FakeServer(headers={"Cache-Control": "max-age=60"}, etag='"v1"')
+    mocker.patch.object(httpx.Client, "send", side_effect=server.send)
+    client = Client(cache=HttpCache())
+    client.get_user(1)
+    client.update_user(1)
+    assert client.get_user(1).id == 3
+
+
+def test_endpoint_cache(mocker: MockerFixture):
+    server = FakeServer(headers={"Cache-Control": "max-age=60"}, etag='"v1"')
+    mocker.patch.object(httpx.Client, "send", side_effect=server.send)
+
+    @http(
+        "GET",
+        "users/{user_id}",
+        base_url="https://example.com/",
+        cache=HttpCache(),
+    )
+    def get_user(user_id: int) -> dict:
+        ...
+
+    assert get_user(1) == get_user(1)
+    assert len(server.requests) == 1
+
+
+def test_memory_storage_is_bounded_by_bytes():
+    def response(size: int) -> CachedResponse:
+        return CachedResponse(200, [], b"x" * size, 0.0, 0.0)
+
+    storage = MemoryStorage(max_bytes=100)
+    storage.set("a", response(40))
+    storage.set("b", response(40))
+    storage.get("a")
+    storage.set("c", response(40))
+    # The least recently used response is evicted
+    assert storage.get("b") is None
+    assert storage.get("a") is not None
+    assert storage.size == 80
+    # Too large responses are not stored
+    storage.set("d", response(200))
+    assert storage.get("d") is None
+    storage.delete("a")
+    assert storage.size == 40
+    with pytest.raises(MisconfiguredException):
+        MemoryStorage(max_bytes=0)
+
+
+def test_file_storage(tmp_path, mocker: MockerFixture):
+    storage = FileStorage(str(tmp_path))
+    response = CachedResponse(
+        200, [("ETag", '"v1"')], b'{"a": 1}', 1.0, 2.0, {"accept": None}
+    )
+    storage.set("key", response)
+    assert FileStorage(str(tmp_path)).get("key") == response
+    storage.delete("key")
+    assert storage.get("key") is None
+
+    server = FakeServer(headers={"Cache-Control": "no-cache"}, etag='"v1"')
+    mocker.patch.object(httpx.Client, "send", side_effect=server.send)
+    client = Client(cache=HttpCache(storage))
+    client.get_user(1)
+    # The parsed response isn't stored in files, the body is parsed again
+    assert client.get_user(1) == client.get_user(1)
+    assert server.requests[1].headers["if-none-match"] == '"v1"'
+
+
+def test_parse_cache_control():
+    assert parse_cache_control('max-age=60, no-cache="Set-Cookie"') == {
+        "max-age": "60",
+        "no-cache": "Set-Cookie",
+    }
+    assert parse_cache_control(None) == {}
+
+
+def test_sqlite_storage(tmp_path):
+    path = str(tmp_path / "cache.db")
+    storage = SQLiteStorage(path, max_bytes=100)
+    response = CachedResponse(
+        200, [("ETag", '"v1"')], b'{"a": 1}', 1.0, 2.0, {"accept": None}
+    )
+    storage.set("key", response)
+    # Another process, or the restarted one, opens the same database
+    assert SQLiteStorage(path).get("key") == response
+    storage.set("key", response)
+    assert storage.size == response.size
+    storage.delete("key")
+    assert storage.get("key") is None
+    storage.close()
+
+
+def test_sqlite_storage_is_bounded_by_bytes(tmp_path):
+    def response(size: int) -> CachedResponse:
+        return CachedResponse(200, [], b"x" * size, 0.0, 0.0)
+
+    storage = SQLiteStorage(str(tmp_path / "cache.db"), max_bytes=100)
+    storage.set("a", response(40))
+    time.sleep(0.01)
+    storage.set("b", response(40))
+    time.sleep(0.01)
+    storage.set("c", response(40))
+    # The least recently used response is evicted
+    assert storage.get("a") is None
+    assert storage.get("b") is not None
+    assert storage.size == 80
+    # Too large responses are not stored
+    storage.set("d", response(200))
+    assert storage.get("d") is None
+
+
+def test_sqlite_storage_survives_restarts(tmp_path, mocker: MockerFixture):
+    path = str(tmp_path / "cache.db")
+    server = FakeServer(headers={"Cache-Control": "no-cache"}, etag='"v1"')
+    mocker.patch.object(httpx.Client, "send", side_effect=server.send)
+    assert Client(cache=HttpCache(SQLiteStorage(path))).get_user(1).id == 1
+    # The restarted process revalidates the stored response, the body
+    # isn't downloaded again
+    assert Client(cache=HttpCache(SQLiteStorage(path))).get_user(1).id == 1
+    assert server.requests[1].headers["if-none-match"] == '"v1"'
+
+
+def test_credentials_are_not_shared(mocker: MockerFixture):
+    def send(request, *args, **kwargs):
+        return httpx.Response(
+            200,
+            json={"id": 1, "name": request.headers.get("Authorization", "")},
+            headers={"Cache-Control": "max-age=60"},
+            request=request,
+        )
+
+    mocker.patch.object(httpx.Client, "send", side_effect=send)
+
+    class SharedClient(BaseClient):
+        base_url = "https://example.com/"
+        cache = HttpCache()
+
+        @http("GET", "users/{user_id}")
+        def get_user(self, user_id: int) -> User:
+            ...
+
+    alice = SharedClient(default_headers={"Authorization": "Bearer alice"})
+    bob = SharedClient(default_headers={"Authorization": "Bearer bob"})
+    assert alice.get_user(1).name == "Bearer alice"
+    assert bob.get_user(1).name == "Bearer bob"
+    # httpx auth is told apart by its instance
+    carol = SharedClient(auth=httpx.BasicAuth("carol", "secret"))
+    assert carol.get_user(1).name == ""
+    assert SharedClient().get_user(1).name == ""
+    assert alice.get_user(1).name == "Bearer alice"
+    assert httpx.Client.send.call_count == 4
+
+
+@pytest.mark.asyncio
+async def test_blocking_storage_runs_off_event_loop(
+    tmp_path, mocker: MockerFixture
+):
+    server = FakeServer(headers={"Cache-Control": "max-age=60"}, etag='"v1"')
+    mocker.patch.object(httpx.AsyncClient, "send", side_effect=server.asend)
+    storage = SQLiteStorage(str(tmp_path / "cache.db"))
+    threads = []
+    get, set_ = storage.get, storage.set
+
+    def spy(method):
+        def wrapper(*args, **kwargs):
+            threads.append(threading.get_ident())
+            return method(*args, **kwargs)
+
+        return wrapper
+
+    mocker.patch.object(storage, "get", side_effect=spy(get))
+    mocker.patch.object(storage, "set", side_effect=spy(set_))
+    client = Client(cache=HttpCache(storage))
+    assert (await client.async_get_user(1)).id == 1
+    assert (await client.async_get_user(1)).id == 1
+    assert len(server.requests) == 1
+    assert len(threads) == 3
+    assert threading.get_ident() not in threads
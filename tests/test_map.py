@@ -0,0 +1,102 @@
+import threading
+import time
+
+import httpx
+import pytest
+from pytest_mock import MockerFixture
+
+from declarativex import (
+    BaseClient,
+    HTTPException,
+    MisconfiguredException,
+    TimeoutException,
+    http,
+    retry,
+)
+
+
+@retry(max_retries=1, exceptions=(TimeoutException,))
+class Client(BaseClient):
+    base_url = "https://example.com/"
+    max_workers = 4
+
+    @http("GET", "users/{user_id}")
+    def get_user(self, user_id: int) -> dict:
+        ...
+
+    @http("GET", "users/{user_id}")
+    async def get_user_async(self, user_id: int) -> dict:
+        ...
+
+
+def _response(request: httpx.Request, *args, **kwargs) -> httpx.Response:
+    user_id = int(request.url.path.rsplit("/", 1)[-1])
+    if user_id < 0:
+        return httpx.Response(404, json={}, request=request)
+    return httpx.Response(200, json={"id": user_id}, request=request)
+
+
+def test_map_results_are_ordered(mocker: MockerFixture):
+    threads = set()
+
+    def send(request, *args, **kwargs):
+        threads.add(threading.get_ident())
+        user_id = int(request.url.path.rsplit("/", 1)[-1])
+        time.sleep(0.001 * (20 - user_id))
+        return _response(request)
+
+    mocker.patch.object(httpx.Client, "send", side_effect=send)
+    with Client() as client:
+        results = list(client.map(client.get_user, range(20)))
+        executor = client._executor
+    assert results == [{"id": user_id} for user_id in range(20)]
+    assert 1 < len(threads) <= 4
+    assert threading.get_ident() not in threads
+    # The thread pool is shut down with the client
+    with pytest.raises(RuntimeError):
+        executor.submit(print)
+
+
+def test_map_honors_retry(mocker: MockerFixture):
+    failed = set()
+
+    def send(request, *args, **kwargs):
+        if request.url.path not in failed:
+            failed.add(request.url.path)
+            raise TimeoutException(timeout=1, request=request)
+        return _response(request)
+
+    mocker.patch.object(httpx.Client, "send", side_effect=send)
+    client = Client()
+    assert list(client.map(client.get_user, [1, 2, 3])) == [
+        {"id": 1},
+        {"id": 2},
+        {"id": 3},
+    ]
+    assert len(failed) == 3
+
+
+def test_map_raises_errors_in_order(mocker: MockerFixture):
+    mocker.patch.object(httpx.Client, "send", side_effect=_response)
+    client = Client()
+    results = client.map(client.get_user, [1, -1, 2])
+    assert next(results) == {"id": 1}
+    with pytest.raises(HTTPException):
+        next(results)
+
+
+def test_map_rejects_async_functions():
+    client = Client()
+    with pytest.raises(MisconfiguredException):
+        client.map(client.get_user_async, [1])
+
+
+@pytest.mark.asyncio
+async def test_aclose_shuts_down_thread_pool(mocker: MockerFixture):
+    mocker.patch.object(httpx.Client, "send", side_effect=_response)
+    async with Client() as client:
+        assert list(client.map(client.get_user, [1])) == [{"id": 1}]
+        executor = client._executor
+    assert client._executor is None
+    with pytest.raises(RuntimeError):
+        executor.submit(print)
@@ -0,0 +1,134 @@
+import inspect
+from typing import Annotated, List
+from unittest.mock import MagicMock
+
+import httpx
+from pytest_mock import MockerFixture
+
+from declarativex import BaseClient, Header, Path, Query, http
+from declarativex.dependencies import Location
+from declarativex.plan import EndpointPlan
+from declarativex.models import ClientConfiguration, EndpointConfiguration
+
+
+def _response(request, *args, **kwargs):
+    return httpx.Response(
+        200, json=[{"url": str(request.url)}], request=request
+    )
+
+
+def _plan(func, method="GET", path="/users/{user_id}") -> EndpointPlan:
+    return EndpointPlan.compile(
+        func,
+        EndpointConfiguration(
+            method=method,
+            path=path,
+            client_configuration=ClientConfiguration(
+                base_url="https://example.com"
+            ),
+        ),
+    )
+
+
+def test_plan_compilation():
+    def get_user(
+        self,
+        user_id: int,
+        token: Annotated[str, Header(name="X-Token")],
+        page: int = 1,
+    ) -> List[dict]:
+        ...
+
+    plan = _plan(get_user)
+    assert plan.error is None
+    assert plan.parameter_names == ("self", "user_id", "token", "page")
+    assert plan.url_template_variables == {"user_id"}
+    assert plan.return_type == List[dict]
+    user_id, token, page = plan.parameters
+    assert (user_id.location, user_id.type_hint) == (Location.path_params, int)
+    assert (token.location, token.dependency.field_name) == (
+        Location.headers,
+        "x-token",
+    )
+    assert (page.location, page.default) == (Location.query_params, 1)
+
+
+def test_plan_copies_shared_dependency_instances():
+    query = Query()
+
+    def search(
+        first: Annotated[int, query], second: Annotated[str, query]
+    ) -> dict:
+        ...
+
+    first, second = _plan(search, path="/search").parameters
+    assert first.dependency is not query
+    assert first.dependency is not second.dependency
+    assert first.dependency.field_name == "first"
+    assert second.dependency.type_hint is str
+
+
+def test_plan_defers_misconfiguration():
+    def get_user(user_id: Annotated[int, "path"]) -> dict:
+        ...
+
+    plan = _plan(get_user)
+    assert plan.error is not None
+    assert plan.parameters == ()
+
+
+def test_signature_is_not_inspected_per_call(mocker: MockerFixture):
+    mocker.patch.object(httpx.Client, "send", side_effect=_response)
+
+    class Client(BaseClient):
+        base_url = "https://example.com/"
+
+        @http("GET", "users/{user_id}")
+        def get_user(
+            self, user_id: Annotated[int, Path], page: int = 1
+        ) -> List[dict]:
+            ...
+
+    client = Client()
+    # Warm up the pooled client, httpx imports its transport lazily
+    client.get_user(1)
+    signature = mocker.patch(
+        "inspect.signature", MagicMock(wraps=inspect.signature)
+    )
+    result = client.get_user(1, page=2)
+    assert result == [{"url": "https://example.com/users/1?page=2"}]
+    assert signature.call_count == 0
+
+
+def test_client_base_url_variables_are_path_params(mocker: MockerFixture):
+    mocker.patch.object(httpx.Client, "send", side_effect=_response)
+
+    class Client(BaseClient):
+        base_url = "https://api.example.com/{version}/"
+
+        @http("GET", "users/{user_id}")
+        def get_user(self, version: str, user_id: int, page: int = 1) -> list:
+            ...
+
+    client = Client()
+    assert client.get_user("v2", 1) == [
+        {"url": "https://api.example.com/v2/users/1?page=1"}
+    ]
+    assert Client(base_url="https://example.com/").get_user(
+        "v2", 1
+    ) == [{"url": "https://example.com/users/1?version=v2&page=1"}]
+
+
+def test_plan_for_url_template_is_cached():
+    def get_user(self, version: str, user_id: int) -> dict:
+        ...
+
+    plan = _plan(get_user, path="users/{user_id}")
+    assert plan.for_url_template("https://example.com/users/{user_id}") is (
+        plan
+    )
+    template = "https://example.com/{version}/users/{user_id}"
+    resolved = plan.for_url_template(template)
+    assert resolved.parameters[0].location == Location.path_params
+    assert plan.parameters[0].location == Location.query_params
+    assert plan.for_url_template(template) is resolved
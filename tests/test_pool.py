@@ -0,0 +1,120 @@
+from unittest.mock import MagicMock, Mock
+
+import httpx
+import pytest
+from pytest_mock import MockerFixture
+
+from declarativex import BaseClient, http
+from declarativex.warnings import DeclarativeWarning
+
+
+def _response(*args, **kwargs):
+    return httpx.Response(
+        200,
+        json={"dummy": "data"},
+        request=httpx.Request("GET", "https://reqres.in/api/users"),
+    )
+
+
+class DummyClient(BaseClient):
+    base_url = "https://reqres.in/"
+
+    @http("GET", "api/users")
+    def get_users(self) -> dict:
+        ...
+
+    @http("GET", "api/users/{user_id}")
+    def get_user(self, user_id: int) -> dict:
+        ...
+
+
+class AsyncDummyClient(BaseClient):
+    base_url = "https://reqres.in/"
+
+    @http("GET", "api/users")
+    async def get_users(self) -> dict:
+        ...
+
+    @http("GET", "api/users/{user_id}")
+    async def get_user(self, user_id: int) -> dict:
+        ...
+
+
+def test_sync_client_is_reused(mocker: MockerFixture):
+    send = mocker.patch.object(
+        httpx.Client, "send", autospec=True, side_effect=_response
+    )
+    with DummyClient() as client:
+        assert client.get_users() == {"dummy": "data"}
+        assert client.get_user(1) == {"dummy": "data"}
+        httpx_client = send.call_args_list[0].args[0]
+        assert send.call_args_list[1].args[0] is httpx_client
+        assert not httpx_client.is_closed
+
+    assert httpx_client.is_closed
+
+
+@pytest.mark.asyncio
+async def test_async_client_is_reused(mocker: MockerFixture):
+    send = mocker.patch.object(
+        httpx.AsyncClient, "send", autospec=True, side_effect=_response
+    )
+    async with AsyncDummyClient() as client:
+        assert await client.get_users() == {"dummy": "data"}
+        assert await client.get_user(1) == {"dummy": "data"}
+        httpx_client = send.call_args_list[0].args[0]
+        assert send.call_args_list[1].args[0] is httpx_client
+        assert not httpx_client.is_closed
+
+    assert httpx_client.is_closed
+
+
+def test_clients_are_not_shared_between_instances(mocker: MockerFixture):
+    send = mocker.patch.object(
+        httpx.Client, "send", autospec=True, side_effect=_response
+    )
+    first, second = DummyClient(), DummyClient()
+    first.get_users()
+    second.get_users()
+    assert send.call_args_list[0].args[0] is not send.call_args_list[1].args[0]
+    first.close()
+    second.close()
+
+
+def test_limits(mocker: MockerFixture):
+    httpx_client_mock = mocker.patch(
+        "declarativex.executors.httpx.Client",
+        MagicMock(),
+    )
+    httpx_client_mock.return_value = Mock(send=Mock(side_effect=_response))
+    limits = httpx.Limits(max_connections=10, max_keepalive_connections=5)
+
+    @http("GET", "api/users", base_url="https://reqres.in", limits=limits)
+    def get_users() -> dict:
+        ...
+
+    get_users()
+    get_users()
+    assert httpx_client_mock.call_count == 1
+    assert httpx_client_mock.call_args_list[0][1]["limits"] == limits
+
+    client = DummyClient(limits=limits)
+    client.get_users()
+    assert httpx_client_mock.call_count == 2
+    assert httpx_client_mock.call_args_list[1][1]["limits"] == limits
+
+
+@pytest.mark.asyncio
+async def test_close_keeps_open_async_clients(mocker: MockerFixture):
+    send = mocker.patch.object(
+        httpx.AsyncClient, "send", autospec=True, side_effect=_response
+    )
+    client = AsyncDummyClient()
+    await client.get_users()
+    httpx_client = send.call_args_list[0].args[0]
+    with pytest.warns(DeclarativeWarning, match="use aclose"):
+        client.close()
+    # The async client is kept, so it can still be closed
+    assert not httpx_client.is_closed
+    await client.aclose()
+    assert httpx_client.is_closed
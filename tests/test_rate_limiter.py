@@ -1,10 +1,15 @@
 import asyncio
+import multiprocessing
 import sys
+import threading
 import time
 
+import httpx
 import pytest
+from pytest_mock import MockerFixture
 
 from declarativex import (
+    FileBackend,
     rate_limiter,
     BaseClient,
     http,
@@ -145,3 +150,281 @@ def test_unsupported_func_decorated():
         "rate_limiter decorator is ignored because "
         "not applied to endpoint declaration."
     )
+
+
+class _SlowServer:
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def send(self, request, *args, **kwargs):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(self.latency)
+        self.in_flight -= 1
+        return httpx.Response(200, json={}, request=request)
+
+
+@rate_limiter(max_calls=5, interval=1)
+@http("GET", "users", base_url="https://example.com/")
+async def get_users_limited() -> dict:
+    ...
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_runs_calls_concurrently(mocker: MockerFixture):
+    server = _SlowServer(latency=0.2)
+    mocker.patch.object(httpx.AsyncClient, "send", side_effect=server.send)
+    get_users_limited.refill()
+    start = time.monotonic()
+    await asyncio.gather(*[get_users_limited() for _ in range(5)])
+    # The network calls are not serialized by the limiter
+    assert time.monotonic() - start < 0.4
+    assert server.max_in_flight == 5
+
+    # The next calls wait for their tokens outside of the lock
+    start = time.monotonic()
+    await asyncio.gather(*[get_users_limited() for _ in range(2)])
+    assert 0.2 < time.monotonic() - start < 0.8
+
+
+def test_rate_limiter_across_event_loops(mocker: MockerFixture):
+    server = _SlowServer(latency=0)
+    mocker.patch.object(httpx.AsyncClient, "send", side_effect=server.send)
+    get_users_limited.refill()
+    # The limiter is defined at import time and used by several loops
+    results = [asyncio.run(get_users_limited()) for _ in range(2)]
+    thread = threading.Thread(
+        target=lambda: results.append(asyncio.run(get_users_limited()))
+    )
+    thread.start()
+    thread.join()
+    assert results == [{}, {}, {}]
+
+
+@rate_limiter(max_calls=5, interval=0.5)
+class MixedClient(BaseClient):
+    base_url = "https://example.com/"
+
+    @http("GET", "users")
+    def get_users(self) -> dict:
+        ...
+
+    @http("GET", "users")
+    async def async_get_users(self) -> dict:
+        ...
+
+
+def test_sync_rate_limiter_is_thread_safe(mocker: MockerFixture):
+    sent_at = []
+
+    def _response(request, *args, **kwargs):
+        sent_at.append(time.monotonic())
+        return httpx.Response(200, json={}, request=request)
+
+    mocker.patch.object(httpx.Client, "send", side_effect=_response)
+    client = MixedClient()
+    # Warm up the pooled httpx client, its creation is slow
+    client.get_users()
+    sent_at.clear()
+    MixedClient.refill()
+    start = time.monotonic()
+    threads = [threading.Thread(target=client.get_users) for _ in range(15)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # 5 calls use the full bucket, the other 10 wait for 0.1s each
+    assert len(sent_at) == 15
+    assert sum(at - start < 0.05 for at in sent_at) == 5
+    assert 0.9 < max(sent_at) - start < 1.3
+
+
+@pytest.mark.asyncio
+async def test_sync_and_async_calls_share_bucket(mocker: MockerFixture):
+    def _response(request, *args, **kwargs):
+        return httpx.Response(200, json={}, request=request)
+
+    mocker.patch.object(httpx.Client, "send", side_effect=_response)
+    mocker.patch.object(httpx.AsyncClient, "send", side_effect=_response)
+    client = MixedClient()
+    MixedClient.refill()
+    for _ in range(5):
+        client.get_users()
+    start = time.monotonic()
+    await client.async_get_users()
+    assert 0.05 < time.monotonic() - start < 0.2
+
+
+def _call():
+    ...
+
+
+def _reserve_many(path: str, calls: int, results) -> None:
+    limiter = rate_limiter(
+        max_calls=10, interval=1000, reject=True, backend=FileBackend(path)
+    )
+    for _ in range(calls):
+        try:
+            limiter._reserve(_call)
+            results.put(True)
+        except RateLimitExceeded:
+            results.put(False)
+
+
+def test_file_backend_shares_bucket_between_processes(tmp_path):
+    path = str(tmp_path / "quota")
+    context = multiprocessing.get_context("fork")
+    results = context.Queue()
+    processes = [
+        context.Process(target=_reserve_many, args=(path, 5, results))
+        for _ in range(4)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    granted = [results.get() for _ in range(20)]
+    # The processes share one quota of 10 calls
+    assert granted.count(True) == 10
+
+
+def test_file_backend_refill(tmp_path):
+    limiter = rate_limiter(
+        max_calls=1,
+        interval=1000,
+        reject=True,
+        backend=FileBackend(str(tmp_path / "quota")),
+    )
+    limiter._reserve(_call)
+    with pytest.raises(RateLimitExceeded):
+        limiter._reserve(_call)
+    limiter.refill()
+    limiter._reserve(_call)
+
+
+@rate_limiter(max_calls=1, interval=1000, reject=True, key="account_id")
+class PerAccountClient(BaseClient):
+    base_url = "https://example.com/"
+
+    @http("GET", "accounts/{account_id}/users")
+    def get_users(self, account_id: int) -> dict:
+        ...
+
+    @http("GET", "accounts/{account_id}/users")
+    async def async_get_users(self, account_id: int = 1) -> dict:
+        ...
+
+
+def _ok(request, *args, **kwargs):
+    return httpx.Response(200, json={}, request=request)
+
+
+@pytest.mark.asyncio
+async def test_per_key_rate_limiter(mocker: MockerFixture):
+    mocker.patch.object(httpx.Client, "send", side_effect=_ok)
+    mocker.patch.object(httpx.AsyncClient, "send", side_effect=_ok)
+    PerAccountClient.refill()
+    client = PerAccountClient()
+    assert client.get_users(1) == {}
+    assert client.get_users(account_id=2) == {}
+    with pytest.raises(RateLimitExceeded):
+        client.get_users(account_id=1)
+    # Defaults are bound too, the key is shared by sync and async calls
+    with pytest.raises(RateLimitExceeded):
+        await client.async_get_users()
+    assert await client.async_get_users(3) == {}
+
+
+def test_per_key_rate_limiter_with_function(mocker: MockerFixture):
+    mocker.patch.object(httpx.Client, "send", side_effect=_ok)
+
+    @rate_limiter(
+        max_calls=1,
+        interval=1000,
+        reject=True,
+        key=lambda arguments: arguments["self"].default_headers["X-Token"],
+    )
+    class Client(BaseClient):
+        base_url = "https://example.com/"
+
+        @http("GET", "users")
+        def get_users(self) -> dict:
+            ...
+
+    Client(default_headers={"X-Token": "a"}).get_users()
+    Client(default_headers={"X-Token": "b"}).get_users()
+    with pytest.raises(RateLimitExceeded):
+        Client(default_headers={"X-Token": "a"}).get_users()
+
+
+def test_per_key_buckets_are_bounded():
+    limiter = rate_limiter(
+        max_calls=1, interval=1000, reject=True, key="key", max_keys=2
+    )
+
+    def _call_with_key(key):
+        ...
+
+    for key in range(3):
+        limiter._reserve(_call_with_key, key)
+    # The least recently used bucket is evicted, the key starts over
+    limiter._reserve(_call_with_key, 0)
+    with pytest.raises(RateLimitExceeded):
+        limiter._reserve(_call_with_key, 2)
+
+    limiter = rate_limiter(max_calls=1, interval=0.05, key="key")
+    limiter._reserve(_call_with_key, 0)
+    time.sleep(0.06)
+    limiter._reserve(_call_with_key, 1)
+    # Idle buckets are full again, they are evicted
+    assert len(limiter._buckets.clear()) == 1
+
+
+def test_per_key_file_backend(tmp_path):
+    limiter = rate_limiter(
+        max_calls=1,
+        interval=1000,
+        reject=True,
+        backend=FileBackend(str(tmp_path / "quota")),
+        key="key",
+    )
+
+    def _call_with_key(key):
+        ...
+
+    limiter._reserve(_call_with_key, "a")
+    limiter._reserve(_call_with_key, "b")
+    with pytest.raises(RateLimitExceeded):
+        limiter._reserve(_call_with_key, "a")
+
+
+def test_per_key_misconfigured():
+    limiter = rate_limiter(max_calls=1, interval=1, key="missing")
+    with pytest.raises(MisconfiguredException):
+        limiter._reserve(_call)
+    with pytest.raises(MisconfiguredException):
+        rate_limiter(max_calls=1, interval=1, key="key", max_keys=0)
+
+
+def test_colliding_keys_share_file_slot(tmp_path):
+    limiter = rate_limiter(
+        max_calls=2,
+        interval=1000,
+        reject=True,
+        backend=FileBackend(str(tmp_path / "quota"), slots=1),
+        key="key",
+    )
+
+    def _call_with_key(key):
+        ...
+
+    # Both keys are hashed to the only slot, alternating them doesn't
+    # start the bucket over
+    limiter._reserve(_call_with_key, "a")
+    limiter._reserve(_call_with_key, "b")
+    with pytest.raises(RateLimitExceeded):
+        limiter._reserve(_call_with_key, "a")
+    with pytest.raises(RateLimitExceeded):
+        limiter._reserve(_call_with_key, "b")
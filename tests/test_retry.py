@@ -8,7 +8,17 @@ import httpx
 import pytest
 from pytest_mock import MockerFixture
 
-from declarativex import BaseClient, http, retry, TimeoutException, Query
+from declarativex import (
+    BaseClient,
+    HTTPException,
+    Jitter,
+    MisconfiguredException,
+    Query,
+    RetryBudget,
+    TimeoutException,
+    http,
+    retry,
+)
 
 
 @retry(max_retries=3, delay=0.1, exceptions=(TimeoutException,))
@@ -76,3 +86,158 @@ def test_sync_retry(mocker: MockerFixture):
     assert 3 == len(
         [call[0][0] for call in sleep.call_args_list if call[0][0] == 0.1]
     )
+
+
+def _status(status_code: int, headers=None):
+    def _response(request, *args, **kwargs):
+        return httpx.Response(
+            status_code, headers=headers, json={}, request=request
+        )
+
+    return _response
+
+
+@pytest.mark.parametrize(
+    "jitter,expected",
+    [
+        (Jitter.FULL, [0.5, 1.0, 2.0]),
+        ("equal", [0.75, 1.5, 3.0]),
+        (None, [1.0, 2.0, 4.0]),
+    ],
+)
+def test_retry_jitter(mocker: MockerFixture, jitter, expected):
+    mocker.patch("random.uniform", side_effect=lambda a, b: (a + b) / 2)
+    sleep = mocker.patch("time.sleep")
+    mocker.patch.object(httpx.Client, "send", side_effect=_status(500))
+
+    @retry(
+        max_retries=3,
+        exceptions=(HTTPException,),
+        delay=1.0,
+        backoff_factor=2.0,
+        jitter=jitter,
+        max_delay=4.0,
+    )
+    @http("GET", "/api/users", base_url="https://reqres.in/")
+    def get_users() -> dict:
+        ...
+
+    with pytest.raises(HTTPException):
+        get_users()
+    assert [c.args[0] for c in sleep.call_args_list] == expected
+
+
+def test_retry_decorrelated_jitter_is_capped(mocker: MockerFixture):
+    mocker.patch("random.uniform", side_effect=lambda a, b: b)
+    sleep = mocker.patch("time.sleep")
+    mocker.patch.object(httpx.Client, "send", side_effect=_status(500))
+
+    @retry(
+        max_retries=4,
+        exceptions=(HTTPException,),
+        delay=1.0,
+        jitter="decorrelated",
+        max_delay=10.0,
+    )
+    @http("GET", "/api/users", base_url="https://reqres.in/")
+    def get_users() -> dict:
+        ...
+
+    with pytest.raises(HTTPException):
+        get_users()
+    assert [c.args[0] for c in sleep.call_args_list] == [3.0, 9.0, 10.0, 10.0]
+
+
+def test_retry_invalid_jitter():
+    with pytest.raises(MisconfiguredException):
+        retry(max_retries=1, exceptions=(HTTPException,), jitter="random")
+    with pytest.raises(MisconfiguredException):
+        retry(
+            max_retries=1, exceptions=(HTTPException,), jitter="decorrelated"
+        )
+
+
+@pytest.mark.parametrize(
+    "status_code,headers,expected",
+    [
+        (429, {"Retry-After": "2"}, [2.0]),
+        (503, {"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"}, [0.0]),
+        (503, {"Retry-After": "soon"}, [0.5]),
+        (429, {"Retry-After": "nan"}, [0.5]),
+        (429, {"Retry-After": "inf"}, [0.5]),
+        (429, {"Retry-After": "-1"}, [0.5]),
+        (429, {"Retry-After": "1.5"}, [0.5]),
+        (500, {"Retry-After": "2"}, [0.5]),
+        (429, {"Retry-After": "60"}, []),
+    ],
+)
+def test_retry_after(mocker: MockerFixture, status_code, headers, expected):
+    sleep = mocker.patch("time.sleep")
+    send = mocker.patch.object(
+        httpx.Client, "send", side_effect=_status(status_code, headers)
+    )
+
+    @retry(
+        max_retries=1,
+        exceptions=(HTTPException,),
+        delay=0.5,
+        max_delay=10.0,
+    )
+    @http("GET", "/api/users", base_url="https://reqres.in/")
+    def get_users() -> dict:
+        ...
+
+    with pytest.raises(HTTPException):
+        get_users()
+    assert [c.args[0] for c in sleep.call_args_list] == expected
+    assert send.call_count == len(expected) + 1
+
+
+def test_retry_after_is_capped_without_max_delay(mocker: MockerFixture):
+    sleep = mocker.patch("time.sleep")
+    mocker.patch.object(
+        httpx.Client,
+        "send",
+        side_effect=_status(503, {"Retry-After": "3600"}),
+    )
+
+    @retry(max_retries=1, exceptions=(HTTPException,))
+    @http("GET", "/api/users", base_url="https://reqres.in/")
+    def get_users() -> dict:
+        ...
+
+    # The server can't stall the call for an hour
+    with pytest.raises(HTTPException):
+        get_users()
+    sleep.assert_not_called()
+
+
+def test_retry_budget(mocker: MockerFixture):
+    mocker.patch("time.sleep")
+    send = mocker.patch.object(
+        httpx.Client, "send", side_effect=_status(500)
+    )
+    budget = RetryBudget(ratio=0.5, max_tokens=2)
+
+    @retry(max_retries=3, exceptions=(HTTPException,), budget=budget)
+    class Client(BaseClient):
+        base_url = "https://reqres.in/"
+
+        @http("GET", "/api/users")
+        def get_users(self) -> dict:
+            ...
+
+        @http("GET", "/api/users/{user_id}")
+        def get_user(self, user_id: int) -> dict:
+            ...
+
+    client = Client()
+    with pytest.raises(HTTPException):
+        client.get_users()
+    # 2 tokens of the burst and 0.5 deposited by the call
+    assert send.call_count == 3
+    for user_id in range(4):
+        with pytest.raises(HTTPException):
+            client.get_user(user_id)
+    # Every 2 calls deposit a token for a retry
+    assert send.call_count == 3 + 4 + 2
@@ -0,0 +1,142 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Annotated
+
+import httpx
+import pytest
+from pytest_mock import MockerFixture
+
+from declarativex import (
+    BaseClient,
+    Header,
+    HTTPException,
+    MisconfiguredException,
+    SingleFlight,
+    TimeoutException,
+    deadline,
+    http,
+)
+from .fixtures import FakeServer
+
+
+class Client(BaseClient):
+    base_url = "https://example.com/"
+
+    @http("GET", "users/{user_id}")
+    async def get_user(
+        self,
+        user_id: int,
+        token: Annotated[str, Header(name="X-Token")] = "a",
+    ) -> dict:
+        ...
+
+    @http("GET", "users/{user_id}")
+    def sync_get_user(self, user_id: int) -> dict:
+        ...
+
+    @http("POST", "users")
+    async def create_user(self) -> dict:
+        ...
+
+
+@pytest.mark.asyncio
+async def test_identical_requests_are_coalesced(mocker: MockerFixture):
+    server = FakeServer(latency=0.05)
+    mocker.patch.object(httpx.AsyncClient, "send", side_effect=server.asend)
+    single_flight = SingleFlight()
+    client = Client(single_flight=single_flight)
+    results = await asyncio.gather(*[client.get_user(1) for _ in range(10)])
+    assert len(server.requests) == 1
+    # The parsed result is shared
+    assert all(result is results[0] for result in results)
+    assert single_flight.deduplicated == 9
+    # The finished request isn't shared with the next calls
+    assert (await client.get_user(1))["id"] == 2
+
+
+@pytest.mark.asyncio
+async def test_different_requests_are_not_coalesced(mocker: MockerFixture):
+    server = FakeServer(latency=0.05)
+    mocker.patch.object(httpx.AsyncClient, "send", side_effect=server.asend)
+    client = Client(single_flight=SingleFlight())
+    await asyncio.gather(
+        client.get_user(1),
+        client.get_user(2),
+        client.get_user(1, token="b"),
+        client.create_user(),
+        client.create_user(),
+    )
+    assert len(server.requests) == 5
+
+
+@pytest.mark.asyncio
+async def test_relevant_headers(mocker: MockerFixture):
+    server = FakeServer(latency=0.05)
+    mocker.patch.object(httpx.AsyncClient, "send", side_effect=server.asend)
+    client = Client(single_flight=SingleFlight(headers=["Accept"]))
+    await asyncio.gather(client.get_user(1), client.get_user(1, token="b"))
+    assert len(server.requests) == 1
+
+
+@pytest.mark.asyncio
+async def test_errors_are_shared(mocker: MockerFixture):
+    server = FakeServer(latency=0.05, status_code=500)
+    mocker.patch.object(httpx.AsyncClient, "send", side_effect=server.asend)
+    client = Client(single_flight=SingleFlight())
+    results = await asyncio.gather(
+        client.get_user(1), client.get_user(1), return_exceptions=True
+    )
+    assert all(isinstance(result, HTTPException) for result in results)
+    assert len(server.requests) == 1
+
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_does_not_fail_others(mocker: MockerFixture):
+    server = FakeServer(latency=0.05)
+    mocker.patch.object(httpx.AsyncClient, "send", side_effect=server.asend)
+    client = Client(single_flight=SingleFlight())
+    first = asyncio.ensure_future(client.get_user(1))
+    second = asyncio.ensure_future(client.get_user(1))
+    await asyncio.sleep(0.01)
+    first.cancel()
+    assert (await second)["id"] == 1
+    assert first.cancelled()
+
+
+@pytest.mark.asyncio
+async def test_follower_keeps_its_deadline(mocker: MockerFixture):
+    server = FakeServer(latency=0.2)
+    mocker.patch.object(httpx.AsyncClient, "send", side_effect=server.asend)
+    client = Client(single_flight=SingleFlight())
+
+    async def impatient():
+        with deadline(0.05):
+            return await client.get_user(1)
+
+    leader = asyncio.ensure_future(client.get_user(1))
+    await asyncio.sleep(0)
+    with pytest.raises(TimeoutException):
+        await impatient()
+    assert (await leader)["id"] == 1
+
+
+def test_sync_threads_are_coalesced(mocker: MockerFixture):
+    server = FakeServer(latency=0.2)
+    mocker.patch.object(httpx.Client, "send", side_effect=server.send)
+    single_flight = SingleFlight()
+    client = Client(single_flight=single_flight)
+    # Create the pooled client before the calls
+    client.sync_get_user(0)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(client.sync_get_user, [1] * 8))
+    assert len(server.requests) == 2
+    assert all(result is results[0] for result in results)
+    assert single_flight.deduplicated == 7
+
+
+def test_single_flight_misconfigured():
+    with pytest.raises(MisconfiguredException):
+
+        @http("GET", "users", single_flight=object())  # type: ignore
+        def get_users() -> dict:
+            ...
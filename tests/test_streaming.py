@@ -0,0 +1,309 @@
+import dataclasses
+import json
+from typing import AsyncIterator, Iterator, List
+
+import httpx
+import pytest
+from pydantic import BaseModel
+from pytest_mock import MockerFixture
+
+from declarativex import (
+    BaseClient,
+    HTTPException,
+    MisconfiguredException,
+    ServerSentEvent,
+    UnprocessableEntityException,
+    http,
+)
+from declarativex.streaming import (
+    EventStreamParser,
+    JsonArrayParser,
+    JsonLinesParser,
+)
+
+ITEMS = [
+    {"id": 1, "name": "John", "tags": ["a", "b"]},
+    {"id": 2, "name": 'quoted "]}, name\\', "tags": []},
+    {"id": 3, "name": "Jane", "tags": [{"nested": [1, 2]}]},
+]
+
+
+class Item(BaseModel):
+    id: int
+    name: str
+
+
+@dataclasses.dataclass
+class ItemDataclass:
+    id: int
+    name: str
+
+
+class Chunks(httpx.SyncByteStream, httpx.AsyncByteStream):
+    def __init__(self, body: bytes, size: int):
+        self.chunks = [body[i:i + size] for i in range(0, len(body), size)]
+        self.sent = 0
+        self.closed = False
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            self.sent += 1
+            yield chunk
+
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            self.sent += 1
+            yield chunk
+
+    def close(self):
+        self.closed = True
+
+    async def aclose(self):
+        self.closed = True
+
+
+def _streamer(
+    stream: Chunks,
+    status_code: int = 200,
+    content_type: str = "application/json",
+):
+    def _response(request, *args, **kwargs):
+        assert kwargs["stream"] is True
+        return httpx.Response(
+            status_code,
+            headers={"Content-Type": content_type},
+            stream=stream,
+            request=request,
+        )
+
+    return _response
+
+
+class StreamClient(BaseClient):
+    base_url = "https://example.com/"
+
+    @http("GET", "items")
+    def items(self) -> Iterator[Item]:
+        ...
+
+    @http("GET", "items")
+    def dataclass_items(self) -> Iterator[ItemDataclass]:
+        ...
+
+    @http("GET", "items")
+    async def async_items(self) -> AsyncIterator[Item]:
+        ...
+
+    @http("GET", "events")
+    def events(self) -> Iterator[ServerSentEvent]:
+        ...
+
+    @http("GET", "events")
+    async def async_events(self) -> AsyncIterator[Item]:
+        ...
+
+
+@pytest.mark.parametrize("size", [1, 7, 4096])
+def test_json_array_parser(size: int):
+    body = json.dumps(ITEMS + [1, "two", None, [3]]).encode()
+    parser = JsonArrayParser()
+    items: List[bytes] = []
+    for start in range(0, len(body), size):
+        items.extend(parser.feed(body[start:start + size]))
+    items.extend(parser.close())
+    assert [json.loads(item) for item in items] == ITEMS + [
+        1,
+        "two",
+        None,
+        [3],
+    ]
+
+
+@pytest.mark.parametrize(
+    "body",
+    [b'{"id": 1}', b"[1,,2]", b"[1,]", b'[{"id": 1} {"id": 2}]', b"[1] 2"],
+)
+def test_json_array_parser_malformed(body: bytes):
+    parser = JsonArrayParser()
+    with pytest.raises(ValueError):
+        parser.feed(body)
+        parser.close()
+
+
+def test_json_array_parser_incomplete():
+    parser = JsonArrayParser()
+    assert parser.feed(b'[{"id": 1}, {"id"') == [b'{"id": 1}']
+    with pytest.raises(ValueError):
+        parser.close()
+
+
+@pytest.mark.parametrize("size", [1, 5, 4096])
+def test_json_lines_parser(size: int):
+    body = b'{"id": 1}\r\n\n\x1e{"id": 2}\n  \n{"id": 3}'
+    parser = JsonLinesParser()
+    items: List[bytes] = []
+    for start in range(0, len(body), size):
+        items.extend(parser.feed(body[start:start + size]))
+    items.extend(parser.close())
+    assert [json.loads(item) for item in items] == [
+        {"id": 1},
+        {"id": 2},
+        {"id": 3},
+    ]
+
+
+@pytest.mark.parametrize("size", [1, 3, 4096])
+def test_event_stream_parser(size: int):
+    body = (
+        b": keep-alive\r\n\r\n"
+        b"event: update\r\nid: 1\r\ndata: first\r\ndata:second\r\n\r\n"
+        b"retry: 1000\rdata: {\"id\": 2}\r\r"
+        b"id\nevent: ignored\n\n"
+        b"data: incomplete\n"
+    )
+    parser = EventStreamParser()
+    events: List[ServerSentEvent] = []
+    for start in range(0, len(body), size):
+        events.extend(parser.feed(body[start:start + size]))
+    events.extend(parser.close())
+    assert events == [
+        ServerSentEvent(event="update", data="first\nsecond", id="1"),
+        ServerSentEvent(data='{"id": 2}', id="1", retry=1000),
+    ]
+
+
+def test_sync_stream(mocker: MockerFixture):
+    stream = Chunks(json.dumps(ITEMS).encode(), size=16)
+    mocker.patch.object(httpx.Client, "send", side_effect=_streamer(stream))
+    items = StreamClient().items()
+    assert stream.sent == 0
+    first = next(items)
+    # The first item is parsed before the whole body is received
+    assert first == Item(id=1, name="John")
+    assert 0 < stream.sent < len(stream.chunks)
+    assert list(items) == [Item(**item) for item in ITEMS[1:]]
+    assert stream.closed
+
+
+def test_sync_stream_dataclass(mocker: MockerFixture):
+    stream = Chunks(json.dumps(ITEMS).encode(), size=16)
+    mocker.patch.object(httpx.Client, "send", side_effect=_streamer(stream))
+    items = list(StreamClient().dataclass_items())
+    assert items[1] == ItemDataclass(id=2, name=ITEMS[1]["name"])
+
+
+def test_sync_stream_early_stop(mocker: MockerFixture):
+    stream = Chunks(json.dumps(ITEMS).encode(), size=16)
+    mocker.patch.object(httpx.Client, "send", side_effect=_streamer(stream))
+    items = StreamClient().items()
+    assert next(items).id == 1
+    items.close()
+    assert stream.closed
+    assert stream.sent < len(stream.chunks)
+
+
+def test_sync_stream_errors(mocker: MockerFixture):
+    stream = Chunks(b'{"detail": "Not found"}', size=4)
+    mocker.patch.object(
+        httpx.Client, "send", side_effect=_streamer(stream, 404)
+    )
+    with pytest.raises(HTTPException) as exc:
+        StreamClient().items()
+    assert exc.value.response.json() == {"detail": "Not found"}
+
+    stream = Chunks(b'[{"id": 1, "name": "John"}', size=4)
+    mocker.patch.object(httpx.Client, "send", side_effect=_streamer(stream))
+    items = StreamClient().items()
+    assert next(items).id == 1
+    with pytest.raises(UnprocessableEntityException):
+        next(items)
+    assert stream.closed
+
+
+@pytest.mark.asyncio
+async def test_async_stream(mocker: MockerFixture):
+    stream = Chunks(json.dumps(ITEMS).encode(), size=16)
+    mocker.patch.object(
+        httpx.AsyncClient, "send", side_effect=_streamer(stream)
+    )
+    items = await StreamClient().async_items()
+    first = await items.__anext__()
+    assert first == Item(id=1, name="John")
+    assert 0 < stream.sent < len(stream.chunks)
+    assert [item async for item in items] == [
+        Item(**item) for item in ITEMS[1:]
+    ]
+    assert stream.closed
+
+
+@pytest.mark.asyncio
+async def test_async_stream_early_stop(mocker: MockerFixture):
+    stream = Chunks(json.dumps(ITEMS).encode(), size=16)
+    mocker.patch.object(
+        httpx.AsyncClient, "send", side_effect=_streamer(stream)
+    )
+    items = await StreamClient().async_items()
+    async for item in items:
+        assert item.id == 1
+        break
+    await items.aclose()
+    assert stream.closed
+
+
+@pytest.mark.parametrize(
+    "content_type",
+    ["application/x-ndjson", "application/jsonl; charset=utf-8"],
+)
+def test_sync_json_lines_stream(mocker: MockerFixture, content_type: str):
+    body = "\n".join(json.dumps(item) for item in ITEMS).encode()
+    stream = Chunks(body, size=16)
+    mocker.patch.object(
+        httpx.Client,
+        "send",
+        side_effect=_streamer(stream, content_type=content_type),
+    )
+    items = StreamClient().items()
+    assert next(items) == Item(id=1, name="John")
+    assert stream.sent < len(stream.chunks)
+    assert [item.id for item in items] == [2, 3]
+    assert stream.closed
+
+
+def test_sync_event_stream(mocker: MockerFixture):
+    body = b"".join(
+        f"id: {item['id']}\ndata: {json.dumps(item)}\n\n".encode()
+        for item in ITEMS
+    )
+    stream = Chunks(body, size=16)
+    # Events are parsed regardless of the content type
+    mocker.patch.object(httpx.Client, "send", side_effect=_streamer(stream))
+    events = StreamClient().events()
+    assert next(events) == ServerSentEvent(data=json.dumps(ITEMS[0]), id="1")
+    events.close()
+    assert stream.closed
+    assert stream.sent < len(stream.chunks)
+
+
+@pytest.mark.asyncio
+async def test_async_event_stream(mocker: MockerFixture):
+    body = b"".join(
+        f": ping\ndata: {json.dumps(item)}\n\n".encode() for item in ITEMS
+    )
+    stream = Chunks(body, size=16)
+    mocker.patch.object(
+        httpx.AsyncClient,
+        "send",
+        side_effect=_streamer(stream, content_type="text/event-stream"),
+    )
+    events = await StreamClient().async_events()
+    assert [item.id async for item in events] == [1, 2, 3]
+    assert stream.closed
+
+
+def test_stream_type_must_match_function():
+    @http("GET", "items", base_url="https://example.com/")
+    def items() -> AsyncIterator[Item]:
+        ...
+
+    with pytest.raises(MisconfiguredException):
+        items()
@@ -297,7 +297,7 @@ def test_proxies(
         "declarativex.executors.httpx.Client",
         MagicMock(),
     )
-    httpx_client_mock.return_value.__enter__.return_value = Mock(
+    httpx_client_mock.return_value = Mock(
         send=Mock(
             return_value=Response(
                 200,
@@ -328,7 +328,7 @@ def test_files_field(mocker: MockerFixture):
         "declarativex.executors.httpx.Client",
         MagicMock(),
     )
-    send_mock = httpx_client_mock.return_value.__enter__.return_value = Mock(
+    send_mock = httpx_client_mock.return_value = Mock(
         send=Mock(
             return_value=Response(
                 200,
@@ -0,0 +1,98 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterator
+
+import httpx
+import pytest
+from pytest_mock import MockerFixture
+
+from declarativex import (
+    BaseClient,
+    TimeoutException,
+    UnprocessableEntityException,
+    http,
+)
+
+
+class SlowHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        delay = float(self.path.rsplit("/", 1)[-1])
+        if self.path.startswith(("/headers/", "/both/")):
+            time.sleep(delay)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", "10")
+        self.end_headers()
+        for char in b'{"a": 10 }':
+            # The body trickles in, every byte is within the read timeout
+            self.wfile.write(bytes([char]))
+            self.wfile.flush()
+            if self.path.startswith(("/body/", "/both/")):
+                time.sleep(delay)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def server_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SlowHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/"
+    server.shutdown()
+    server.server_close()
+
+
+def _client(base_url: str) -> BaseClient:
+    class Client(BaseClient):
+        @http("GET", "{phase}/{delay}", timeout=0.3)
+        def get(self, phase: str, delay: float) -> dict:
+            ...
+
+    return Client(base_url=base_url)
+
+
+@pytest.mark.parametrize(
+    "phase,delay", [("headers", 1.0), ("body", 0.1), ("both", 0.25)]
+)
+def test_sync_timeout_fires_on_time(server_url: str, phase: str, delay: float):
+    client = _client(server_url)
+    assert client.get("headers", 0.0) == {"a": 10}
+    started = time.monotonic()
+    with pytest.raises(TimeoutException):
+        client.get(phase, delay)
+    # The timeout is bounded by the deadline, not by the server
+    assert time.monotonic() - started < 0.45
+    client.close()
+
+
+def test_sync_timeout_is_mapped_to_httpx_timeouts(mocker: MockerFixture):
+    send = mocker.patch.object(
+        httpx.Client,
+        "send",
+        side_effect=httpx.ConnectTimeout("Timed out"),
+    )
+    client = _client("https://example.com/")
+    with pytest.raises(TimeoutException):
+        client.get("headers", 1.0)
+    timeouts = send.call_args.args[0].extensions["timeout"]
+    # Every phase gets the time left of the timeout
+    for phase in ("connect", "read", "write", "pool"):
+        assert 0 < timeouts.get(phase) <= 0.3
+
+
+def test_sync_stream_is_returned_after_headers(server_url: str):
+    class Client(BaseClient):
+        @http("GET", "body/{delay}", timeout=0.3)
+        def stream(self, delay: float) -> Iterator[dict]:
+            ...
+
+    with Client(base_url=server_url) as client:
+        started = time.monotonic()
+        items = client.stream(0.05)
+        assert time.monotonic() - started < 0.3
+        with pytest.raises(UnprocessableEntityException):
+            # The body is an object, not an array
+            list(items)